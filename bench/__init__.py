@@ -0,0 +1,7 @@
+"""Benchmarks of checkproject
+
+Generators of synthetic projects and check suites, and timing of the
+scan of the files, of the discovery and run of the checks and of the
+batch runs at several scales. Run with: C{python3 -m bench}.
+
+"""
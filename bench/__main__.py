@@ -0,0 +1,158 @@
+# -*- coding: utf-8
+"""Run the benchmarks and write the results in JSON.
+
+Usage: python3 -m bench [-s SCALE ...] [-o FILE] [-c REFERENCE]
+
+The results of two commits can be compared by running the benchmarks
+with '-o' on the first one and with '-c' on the second one.
+
+"""
+import sys
+
+# Parameters of each scale: files of a project, depth of the project
+# tree, check modules, projects of a batch run
+SCALES = {
+    'small': {'files': 100, 'depth': 2, 'modules': 5, 'projects': 4},
+    'medium': {'files': 2000, 'depth': 4, 'modules': 20, 'projects': 16},
+    'large': {'files': 20000, 'depth': 5, 'modules': 50, 'projects': 32},
+}
+
+
+def best_time(function, repeat=5):
+    """Returns the best time (in seconds) of several calls of a function."""
+    import time
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_scale(workdir, scale):
+    """Run all the benchmarks at a given scale.
+
+    @return: A dictionary mapping the names of the benchmarks to their
+    best time (in seconds).
+
+    """
+    from bench.generate import generate_project, generate_checks
+    from checkproject.batch import BatchRunner
+    from checkproject.files import Files
+    from checkproject.hashcache import HashCache
+    from checkproject.registry import CheckRegistry
+    from checkproject.runner import CheckRunner
+    import os
+
+    parameters = SCALES[scale]
+    project = os.path.join(workdir, 'project')
+    checks = os.path.join(workdir, 'checks')
+    paths = generate_project(project, parameters['files'],
+                             parameters['depth'])
+    generate_checks(checks, parameters['modules'])
+
+    files = Files(project)
+    required = [_file for _file in files.files[::3]] + \
+               [('missing%d.c' % index, 'f') for index in range(100)]
+    unwanted = [('*~', 'f'), ('.*', 'f'), ('*', 'f', 'executable'),
+                ('*.o', 'f'), ('_*', 'd'), ('*.orig', 'f'), ('*.rej', 'f'),
+                ('core', 'f'), ('*.swp', 'f'), ('*.tmp', 'f')]
+
+    results = {}
+    results['files.scan'] = best_time(lambda: Files(project))
+    results['files.required'] = best_time(lambda: files.required(required))
+    results['files.unwanted'] = best_time(lambda: files.unwanted(unwanted))
+    results['files.tree_hashes'] = best_time(
+        lambda: files.tree_hashes(HashCache()), repeat=1)
+
+    runner = CheckRunner(project, checks, registry=CheckRegistry())
+    results['runner.discover'] = best_time(runner.discover)
+    # First listing imports the modules, the next ones use the registry
+    results['runner.list.cold'] = best_time(
+        lambda: CheckRunner(project, checks, registry=CheckRegistry()).list(),
+        repeat=1)
+    results['runner.list'] = best_time(runner.list)
+    results['runner.run'] = best_time(runner.run, repeat=3)
+    results['runner.run.stages'] = best_time(lambda: runner.run(jobs=4),
+                                             repeat=3)
+
+    # Batch of copies of a small project
+    batch = os.path.join(workdir, 'batch')
+    projects = []
+    for index in range(parameters['projects']):
+        projects.append(os.path.join(batch, 'project%d' % index))
+        generate_project(projects[-1], 50, 2, seed=index)
+    results['batch.run'] = best_time(
+        lambda: list(BatchRunner(projects, checks).run()), repeat=1)
+
+    return results
+
+
+def main(args):
+    """Main function of the benchmarks"""
+    import argparse
+    import contextlib
+    import io
+    import json
+    import os
+    import platform
+    import shutil
+    import subprocess
+    import tempfile
+
+    parser = argparse.ArgumentParser(prog='python3 -m bench')
+    parser.add_argument('-s', '--scale', action='append',
+                        choices=sorted(SCALES),
+                        help='scale of the benchmarks (default: small and'
+                        ' medium)')
+    parser.add_argument('-o', '--output', metavar='FILE', default=None,
+                        help='write the results to FILE (JSON)')
+    parser.add_argument('-c', '--compare', metavar='FILE', default=None,
+                        help='compare the results with the ones of FILE')
+    args = parser.parse_args(args[1:])
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    report = {'commit': commit, 'python': platform.python_version(),
+              'results': {}}
+
+    workdir = tempfile.mkdtemp(prefix='checkproject-bench-')
+    # The hash caches of the benchmarks must not pollute the user's one
+    os.environ['CHECKPROJECT_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    try:
+        for scale in args.scale or ['small', 'medium']:
+            scale_dir = os.path.join(workdir, scale)
+            os.makedirs(scale_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                report['results'][scale] = run_scale(scale_dir, scale)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    reference = None
+    if args.compare:
+        with open(args.compare) as _file:
+            reference = json.load(_file)['results']
+
+    for scale, results in sorted(report['results'].items()):
+        print('Scale: ' + scale)
+        for name, value in sorted(results.items()):
+            line = '  %-22s %10.4fs' % (name, value)
+            if reference is not None and name in reference.get(scale, {}):
+                line += '  (x%.2f)' % (value / reference[scale][name])
+            print(line)
+
+    if args.output:
+        with open(args.output, 'w') as _file:
+            json.dump(report, _file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
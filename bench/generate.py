@@ -0,0 +1,131 @@
+# -*- coding: utf-8
+"""Generators of synthetic projects and check suites."""
+
+# Template of a generated check module
+CHECK_MODULE = '''from checkproject.case import CheckCase
+
+%s
+'''
+
+# Template of a generated check class
+CHECK_CLASS = '''class Check%s(CheckCase):
+    """Generated check class %s."""
+%s
+'''
+
+# Template of a generated check method
+CHECK_METHOD = '''
+    def check_%03d(self):
+        """Generated check method %d."""
+        files = self.files()
+        self.error(files.required([('src', 'd')]) == [])
+        self.warning(len(files.unwanted([('*~', 'f')])) < %d, hidden=%r)
+'''
+
+
+def generate_project(path, files=1000, depth=4, fanout=4, symlinks=0.05,
+                     executables=0.02, junk=0.05, seed=0):
+    """Generate a synthetic project tree.
+
+    @param path: Top directory of the project (created).
+
+    @param files: Number of files.
+
+    @param depth: Maximum depth of the directories.
+
+    @param fanout: Number of sub-directories of each directory.
+
+    @param symlinks: Proportion of symbolic links.
+
+    @param executables: Proportion of executable files.
+
+    @param junk: Proportion of junk files (back-up and hidden files).
+
+    @param seed: Seed of the random generator.
+
+    @return: The list of the paths of the generated files.
+
+    """
+    import os
+    import random
+
+    generator = random.Random(seed)
+
+    # Build the directories in breadth-first order
+    directories = ['src']
+    level = ['src']
+    for _ in range(depth - 1):
+        level = [os.path.join(parent, 'dir%d' % index)
+                 for parent in level for index in range(fanout)]
+        directories.extend(level)
+    for directory in directories + ['include']:
+        os.makedirs(os.path.join(path, directory))
+
+    with open(os.path.join(path, 'Makefile'), 'w') as _file:
+        _file.write('all:\n\t@true\n')
+
+    generated = []
+    for index in range(files):
+        directory = generator.choice(directories)
+        draw = generator.random()
+        if draw < junk:
+            name = generator.choice(['file%d.c~' % index, '.file%d' % index])
+        else:
+            name = 'file%d.%s' % (index, generator.choice(['c', 'h', 'txt']))
+        filepath = os.path.join(path, directory, name)
+
+        if generated and generator.random() < symlinks:
+            os.symlink(os.path.relpath(generator.choice(generated),
+                                       os.path.dirname(filepath)), filepath)
+        else:
+            with open(filepath, 'w') as _file:
+                _file.write('/* %s */\nint f%d(void) { return %d; }\n' %
+                            (name, index, index))
+            if generator.random() < executables:
+                os.chmod(filepath, 0o755)
+        generated.append(filepath)
+
+    return generated
+
+
+def generate_checks(path, modules=20, classes=3, methods=10, seed=0):
+    """Generate a synthetic check suite.
+
+    @param path: Top directory of the checks (created).
+
+    @param modules: Number of check modules.
+
+    @param classes: Number of check classes per module.
+
+    @param methods: Number of check methods per class.
+
+    @param seed: Seed of the random generator.
+
+    @return: The list of the paths of the generated check modules.
+
+    """
+    import os
+    import random
+
+    generator = random.Random(seed)
+    os.makedirs(path)
+
+    generated = []
+    for module in range(modules):
+        # A few modules share the same prefix (same stage)
+        prefix = module - module % 2 if generator.random() < 0.3 else module
+        module_path = os.path.join(path, 'check_%02d-generated%d.py' %
+                                   (prefix, module))
+        code = []
+        for cls in range(classes):
+            name = '%d_%d' % (module, cls)
+            body = ''.join(CHECK_METHOD % (method, method,
+                                           generator.randint(1, 100),
+                                           generator.random() < 0.2)
+                           for method in range(methods))
+            code.append(CHECK_CLASS % (name, name, body))
+        with open(module_path, 'w') as _file:
+            _file.write(CHECK_MODULE % '\n\n'.join(code))
+        generated.append(module_path)
+
+    return generated
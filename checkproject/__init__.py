@@ -5,8 +5,8 @@ applied to student's programming assignments to give feed-back on it
 to the students and partial evaluation to the teacher.
 
 """
-from checkproject.case import CheckCase
+from checkproject.case import CheckCase, check
 from checkproject.runner import CheckRunner
 
 __version__ = '0.0.1'
-__all__ = ['CheckCase', 'CheckRunner']
+__all__ = ['CheckCase', 'CheckRunner', 'check']
@@ -10,37 +10,177 @@ def main(args):
     import argparse
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('projectdir', help='path to the project top directory')
+    parser.add_argument('projectdir', help='path to the project top directory'
+                        ' or archive (or to the projects in batch mode)')
     parser.add_argument('checkdir', help='path to checks top directory')
     parser.add_argument('-l', '--list-checks', action='store_true',
                         help='list of all the checks found')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='check all the projects found in projectdir'
+                        ' (a directory of projects or a manifest file)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes in batch mode')
+    parser.add_argument('-a', '--async', dest='use_async',
+                        action='store_true',
+                        help='in batch mode, interleave the checks of all the'
+                        ' projects on an event loop (JOBS checks at once)'
+                        ' instead of a pool of processes')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='check the project again each time it changes'
+                        ' (only the checks depending on the changed files)')
+    parser.add_argument('--poll', action='store_true',
+                        help='in watch mode, poll the project instead of'
+                        ' using inotify')
+    parser.add_argument('-s', '--stage-jobs', type=int, default=None,
+                        help='number of independent checks run concurrently')
+    parser.add_argument('--stage-executor', choices=['thread', 'process'],
+                        default='thread',
+                        help='kind of pool running the independent checks'
+                        ' (the fixtures are computed for each check class'
+                        ' with processes)')
+    parser.add_argument('--store', metavar='PATH', default=None,
+                        help='record the results in PATH and replay the'
+                        ' results of the unchanged checks')
+    parser.add_argument('--report', metavar='FILE', default=None,
+                        help='write the events of the checks to FILE as'
+                        ' JSON lines (- for the standard output)')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time and memory spent by the checks'
+                        ' (not in batch or watch mode, nor with the process'
+                        ' executor, as for --profile-dump and --cprofile)')
+    parser.add_argument('--profile-dump', metavar='FILE', default=None,
+                        help='write the raw profiling samples to FILE (JSON)')
+    parser.add_argument('--cprofile', metavar='DIR', default=None,
+                        help='dump the cProfile statistics of each check'
+                        ' method in DIR')
+    parser.add_argument('-t', '--timeout', type=float, default=None,
+                        help='default time budget of a check method'
+                        ' (in seconds)')
     parser.add_argument('-v', '--verbosity', action='count', default=0,
                         help='increase output verbosity')
 
     args = parser.parse_args()
+    if args.use_async and not args.batch:
+        parser.error('-a/--async is only available in batch mode (-b)')
+    profiling = args.profile or args.profile_dump or args.cprofile
+    if profiling and (args.batch or args.watch or
+                      (args.stage_executor == 'process' and
+                       (args.stage_jobs or 1) > 1)):
+        parser.error('profiling is not available in batch mode, in watch '
+                     'mode or with the process executor')
 
     # Checking the project
     from checkproject.runner import CheckRunner
-    check_runner = CheckRunner(args.projectdir, args.checkdir)
 
-    # List all the checks found in the execution order.
+    # List all the checks found in the execution order (without executing
+    # the check modules).
     if args.list_checks:
         print('Listing all checks')
         print('------------------')
-        for check in check_runner.list():
+        for check, method in CheckRunner(args.projectdir,
+                                         args.checkdir).static_table():
             print(check + '()')
+            if args.verbosity > 0 and method.description:
+                print('    ' + method.description)
         sys.exit(0)
 
+    store = None
+    if args.store:
+        from checkproject.store import ResultStore
+        store = ResultStore(args.store)
+    report_file = None
+    reporter = None
+    if args.report:
+        from checkproject.report import JSONLinesReporter
+        if args.report == '-':
+            reporter = JSONLinesReporter(sys.stdout)
+        else:
+            report_file = open(args.report, 'w')
+            reporter = JSONLinesReporter(report_file)
+    profiler = None
+    if profiling:
+        from checkproject.profiling import Profiler
+        profiler = Profiler(cprofile_dir=args.cprofile)
+
     if args.verbosity > 0:
         print("Running the checks...")
 
-    result = check_runner.run()
+    try:
+        _run(args, store, reporter, profiler)
+    finally:
+        if report_file is not None:
+            report_file.close()
+
+
+def _run(args, store, reporter, profiler):
+    """Run the checks in the mode given by the command line."""
+    from checkproject.runner import CheckRunner
+
+    # Checking a whole set of projects
+    if args.batch:
+        from checkproject.batch import BatchRunner, find_projects
+
+        def print_summary(project, result):
+            print('')
+            print('Results summary: ' + project)
+            print('-----------------' + '-' * len(project))
+            print(result.summary())
+
+        if args.use_async:
+            from checkproject.aiorunner import AsyncRunner
+
+            async_runner = AsyncRunner(find_projects(args.projectdir),
+                                       args.checkdir, args.jobs, store,
+                                       reporter, args.timeout)
+            for project, result in async_runner.run():
+                print_summary(project, result)
+            return
+
+        batch_runner = BatchRunner(find_projects(args.projectdir),
+                                   args.checkdir, args.jobs, store,
+                                   args.timeout, reporter)
+        for project, result in batch_runner.run():
+            print_summary(project, result)
+        return
+
+    # Checking the project again after each change
+    if args.watch:
+        from checkproject.watch import WatchRunner
+
+        watch_runner = WatchRunner(args.projectdir, args.checkdir, store,
+                                   reporter, args.timeout, poll=args.poll)
+        try:
+            for changed, result, run in watch_runner.run():
+                print('')
+                print('Results summary (%d checks run)' % len(run))
+                print('---------------')
+                print(result.summary())
+                print('')
+                print('Watching %s for changes...' % args.projectdir)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    check_runner = CheckRunner(args.projectdir, args.checkdir, store=store,
+                               reporter=reporter, profiler=profiler,
+                               timeout=args.timeout)
+    result = check_runner.run(jobs=args.stage_jobs,
+                              executor=args.stage_executor)
 
     print('')
     print('Results summary')
     print('---------------')
     print(result.summary())
 
+    if profiler is not None:
+        if args.profile:
+            print('')
+            print('Profiling')
+            print('---------')
+            print(profiler.table())
+        if args.profile_dump:
+            profiler.dump(args.profile_dump)
+
 
 # Main function
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+# -*- coding: utf-8
+"""Runner interleaving the checks of many projects on an event loop.
+
+Most of the time of the checks is spent waiting for commands (builds,
+programs of the students, memcheck, ...). The asynchronous runner
+checks all the projects concurrently in a single process: the checks of
+each project run in order, and the asynchronous check methods (see
+L{checkproject.case}) of all the projects are interleaved on one event
+loop while they await their commands. The synchronous check methods
+(CPU bound ones, for example) run in an executor. A semaphore shared by
+all the projects bounds the number of check methods running at once
+(default to the number of processors).
+
+"""
+
+
+class AsyncRunner(object):
+    """Runner checking a set of projects on an event loop."""
+
+    def __init__(self, projects, checks_dir, jobs=None, store=None,
+                 reporter=None, timeout=None, executor=None):
+        """Constructor of the runner.
+
+        @param projects: The paths of the projects to check.
+
+        @param checks_dir: Root directory of the check modules.
+
+        @param jobs: Maximum number of check methods run concurrently
+        (default to the number of processors).
+
+        @param store: The L{checkproject.store.ResultStore} used to
+        replay the results of the unchanged checks.
+
+        @param reporter: The L{checkproject.report.Reporter} receiving the
+        events of the checks of all the projects.
+
+        @param timeout: Default time budget of the check methods (in
+        seconds, no limit if None).
+
+        @param executor: The C{concurrent.futures} executor running the
+        synchronous methods (default to a pool of C{jobs} threads). The
+        methods share the state of their check case: a process pool is
+        rejected.
+
+        @raise TypeError: The executor is a process pool.
+
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        import os
+
+        if isinstance(executor, ProcessPoolExecutor):
+            raise TypeError('the check methods cannot run in a process '
+                            'pool: use a thread pool')
+
+        self.projects = projects
+        self.checks_dir = checks_dir
+        self.jobs = jobs or os.cpu_count() or 1
+        self.store = store
+        self.reporter = reporter
+        self.timeout = timeout
+        self.executor = executor
+
+    async def _check_project(self, project, classes, semaphore, executor):
+        """Run the check classes on a project, one after the other.
+
+        @return: A tuple C{(project, result)}.
+
+        """
+        from checkproject.files import FileSnapshot
+        from checkproject.fixtures import FixtureManager
+        from checkproject.result import CheckResult
+        from checkproject.runner import _instantiate_check, _prepare_check
+        import asyncio
+        import sys
+
+        loop = asyncio.get_running_loop()
+        reporter = None
+        if self.reporter is not None:
+            reporter = self.reporter.for_project(project)
+            reporter.run_start(project)
+        result = CheckResult()
+        snapshot = FileSnapshot(project)
+        fixtures = FixtureManager(project)
+
+        try:
+            for module_name, module_path, cls in classes:
+                check = _instantiate_check(cls, project, module_name)
+                _prepare_check(check, module_name, module_path,
+                               snapshot=snapshot, store=self.store,
+                               reporter=reporter, timeout=self.timeout,
+                               fixtures=fixtures)
+                await check.run_async(result, semaphore=semaphore,
+                                      executor=executor)
+                if result.has_failed():
+                    break
+        except Exception as exception:
+            result.add_failure('checks crashed: %r' % exception)
+        finally:
+            errors = await loop.run_in_executor(executor, fixtures.teardown)
+            for error in errors:
+                sys.stderr.write('warning: fixture teardown failed: %r\n' %
+                                 error)
+            snapshot.close()
+
+        if reporter is not None:
+            reporter.run_end(project, result)
+        return project, result
+
+    async def run_async(self, pattern='Check*'):
+        """Execute the checks on all the projects on the running loop.
+
+        @return: An asynchronous iterator over C{(project_dir, result)}
+        tuples, in the order the projects complete.
+
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from checkproject.runner import CheckRunner
+        import asyncio
+
+        # Discover the checks once for all the projects
+        classes = list(CheckRunner(None, self.checks_dir).classes(pattern))
+        semaphore = asyncio.Semaphore(self.jobs)
+
+        executor = self.executor
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.jobs)
+        tasks = []
+        try:
+            tasks = [asyncio.ensure_future(
+                self._check_project(project, classes, semaphore, executor))
+                     for project in self.projects]
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The projects not checked yet if the caller stopped early
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.executor is None:
+                executor.shutdown(wait=False)
+
+    def run(self, pattern='Check*'):
+        """Execute the checks on all the projects on a new event loop.
+
+        @return: An iterator over the C{(project_dir, result)} tuples, in
+        the order the projects complete (the checks are suspended while
+        the caller handles a result).
+
+        """
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        results = self.run_async(pattern)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
@@ -0,0 +1,458 @@
+# -*- coding: utf-8
+"""Static analysis of the files of the projects.
+
+An analyzer is a subclass of L{Analyzer} declared with the L{analyzer}
+decorator. It gives the globbing expressions of the files it analyzes
+and analyzes one file at a time, returning its L{Finding} list. The
+files of a project are analyzed by the worker processes shared by the
+checks (see L{checkproject.utils.process_pool}; the analyzers declared
+in a check module run in the current process), and the findings of each
+file are cached by the identifier and the version of the analyzer, the
+hash of the content of the file and the fingerprint of the files it
+depends on (the headers included by a C file, for example): when a
+project is submitted again, only the files which changed are analyzed.
+For example, in a check method::
+
+    self.analyze(['gcc', 'unsafe_functions'])
+
+A new analyzer only has to implement C{analyze()}::
+
+    @analyzer
+    class TodoAnalyzer(Analyzer):
+        name = 'todo'
+        version = '1'
+        globs = ('*.c', '*.h')
+
+        def analyze(self, path, content, directory=None):
+            return [Finding(self.name, path, number, 'warning', 'TODO')
+                    for number, line in enumerate(content.split(b'\\n'), 1)
+                    if b'TODO' in line]
+
+"""
+import re
+
+# Analyzers declared in the process: name -> class
+_ANALYZERS = {}
+
+# Number of files from which the files are analyzed by worker processes
+PARALLEL_THRESHOLD = 8
+
+
+def analyzer(cls):
+    """Class decorator declaring an analyzer under its C{name}."""
+    _ANALYZERS[cls.name] = cls
+    return cls
+
+
+class Finding(object):
+    """Finding of an analyzer in a file.
+
+    Attributes:
+      - C{analyzer}: the name of the analyzer.
+      - C{path}: the path of the file in the project.
+      - C{line}: the line of the finding (None for the whole file).
+      - C{severity}: either C{'error'} or C{'warning'}.
+      - C{message}: the description of the finding.
+
+    """
+
+    __slots__ = ('analyzer', 'path', 'line', 'severity', 'message')
+
+    def __init__(self, analyzer, path, line, severity, message):
+        self.analyzer = analyzer
+        self.path = path
+        self.line = line
+        self.severity = severity
+        self.message = message
+
+    def __reduce__(self):
+        return (Finding, (self.analyzer, self.path, self.line, self.severity,
+                          self.message))
+
+    def __repr__(self):
+        return 'Finding(%r, %r, %r)' % (self.analyzer, self.path, self.line)
+
+    def describe(self):
+        """Describe the finding in one line ('path:line: message')."""
+        location = self.path
+        if self.line is not None:
+            location += ':%d' % self.line
+        return '%s: %s [%s]' % (location, self.message, self.analyzer)
+
+
+class Analyzer(object):
+    """Base class of the analyzers.
+
+    An analyzer is instantiated with its options (keyword arguments)
+    and sent to the worker processes, so it must be picklable.
+
+    """
+
+    # Name of the analyzer
+    name = None
+
+    # Version of the analyzer (to change when its findings change)
+    version = '1'
+
+    # Globbing expressions of the files analyzed (matched against their
+    # path in the project)
+    globs = ('*.c', '*.h')
+
+    # Globbing expressions of the other files of the project which the
+    # findings of a file depend on (the headers it includes, for
+    # example): a change of one of them invalidates the cached findings
+    depends = ()
+
+    # Tell if the analyzer needs a real directory holding the project
+    # (see L{checkproject.source.ProjectSource.directory})
+    needs_directory = False
+
+    def signature(self):
+        """Get the signature of the analyzer identifying its findings in
+        the cache (its name, its version and its options)."""
+        return '%s/%s/%r' % (self.name, self.version,
+                             sorted(self.__dict__.items()))
+
+    def analyze(self, path, content, directory=None):
+        """Analyze a file (to implement).
+
+        @param path: The path of the file in the project.
+
+        @param content: The content of the file (bytes).
+
+        @param directory: A real directory holding the project if the
+        analyzer needs it, None otherwise.
+
+        @return: The list of the L{Finding} of the file.
+
+        """
+        raise NotImplementedError
+
+    def cacheable(self, findings):
+        """Tell if the findings of a file can be cached (findings due to
+        a transient failure of the analyzer should not be)."""
+        return True
+
+
+@analyzer
+class UnsafeFunctions(Analyzer):
+    """Calls of the functions of the C library which cannot be used
+    safely (no bound on the size of their output)."""
+
+    name = 'unsafe_functions'
+    version = '1'
+    globs = ('*.c', '*.h')
+
+    # Unsafe functions and their replacements
+    FUNCTIONS = {
+        'gets': 'fgets',
+        'strcpy': 'strncpy or strlcpy',
+        'strcat': 'strncat or strlcat',
+        'sprintf': 'snprintf',
+        'vsprintf': 'vsnprintf',
+        'tmpnam': 'mkstemp',
+        'mktemp': 'mkstemp',
+    }
+
+    def __init__(self, severity='warning'):
+        self.severity = severity
+
+    def analyze(self, path, content, directory=None):
+        from checkproject.ctokens import tokenize
+
+        findings = []
+        previous = None
+        for token in tokenize(content.decode('utf-8', 'replace')):
+            if previous is not None and previous.kind == 'identifier' and \
+               previous.text in self.FUNCTIONS and token.text == '(':
+                findings.append(Finding(
+                    self.name, path, previous.line, self.severity,
+                    'call of %s(), use %s instead'
+                    % (previous.text, self.FUNCTIONS[previous.text])))
+            if token.kind != 'comment':
+                previous = token
+        return findings
+
+
+@analyzer
+class GccAnalyzer(Analyzer):
+    """Diagnostics of the compiler (with its static analyzer by default)
+    on each C file, compiled alone from the top directory of the
+    project."""
+
+    name = 'gcc'
+    globs = ('*.c',)
+    depends = ('*.h',)
+    needs_directory = True
+
+    # Diagnostic of the compiler ('file:line:column: kind: message')
+    DIAGNOSTIC = re.compile(r'^(?P<file>[^:\n]+):(?P<line>\d+):(?:\d+:)?'
+                            r' (?P<kind>warning|error): (?P<message>.*)$',
+                            re.M)
+
+    # Message of the finding of a file whose analysis timed out
+    TIMED_OUT = 'analysis timed out'
+
+    def __init__(self, compiler='gcc', options=('-Wall', '-Wextra',
+                                                '-fanalyzer'),
+                 include_dirs=('include',), timeout=60):
+        from checkproject.build import toolchain_version
+
+        self.compiler = compiler
+        self.options = tuple(options)
+        self.include_dirs = tuple(include_dirs)
+        self.timeout = timeout
+        # New versions of the compiler give new findings
+        self.version = toolchain_version([(compiler, '--version')])[0]
+
+    def analyze(self, path, content, directory=None):
+        from checkproject.command import run_command
+        import os
+
+        # The static analyzer does not run with '-fsyntax-only'
+        args = [self.compiler, '-c', '-o', os.devnull] + list(self.options)
+        for include_dir in self.include_dirs:
+            args += ['-I', include_dir]
+        result = run_command(args + [path], cwd=directory,
+                             timeout=self.timeout)
+        if result.timed_out:
+            return [Finding(self.name, path, None, 'warning',
+                            self.TIMED_OUT)]
+
+        findings = []
+        for match in self.DIAGNOSTIC.finditer(result.stderr.decode('utf-8',
+                                                                   'replace')):
+            # Diagnostics of the included files are reported with them
+            if os.path.normpath(match.group('file')) != \
+               os.path.normpath(path):
+                continue
+            findings.append(Finding(self.name, path, int(match.group('line')),
+                                    match.group('kind'),
+                                    match.group('message')))
+        return findings
+
+    def cacheable(self, findings):
+        return not any(finding.message == self.TIMED_OUT
+                       for finding in findings)
+
+
+class AnalysisCache(object):
+    """Persistent cache of the findings of the analyzers, by signature of
+    the analyzer and by hash of the content of the file."""
+
+    def __init__(self, path=None):
+        """Open (or create) an analysis cache.
+
+        @param path: Path to the SQLite database (default to
+        C{analysis.sqlite} in L{checkproject.utils.cache_dir}).
+
+        """
+        import os
+        import sqlite3
+        import threading
+        from checkproject.utils import cache_dir
+
+        if path is None:
+            path = os.path.join(cache_dir(), 'analysis.sqlite')
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS findings '
+                         '(analyzer TEXT, hash TEXT, findings BLOB, '
+                         'PRIMARY KEY (analyzer, hash))')
+        self._db.commit()
+
+    def get(self, signature, content_hash):
+        """Get the cached findings of a file.
+
+        @return: A list of C{(line, severity, message)} tuples or None.
+
+        """
+        import pickle
+
+        with self._lock:
+            row = self._db.execute('SELECT findings FROM findings WHERE '
+                                   'analyzer = ? AND hash = ?',
+                                   (signature, content_hash)).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return None
+
+    def put(self, signature, content_hash, findings):
+        """Cache the findings of a file (C{(line, severity, message)}
+        tuples, the path of the file being known by the caller)."""
+        import pickle
+        import sqlite3
+
+        blob = pickle.dumps(findings, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO findings VALUES '
+                             '(?, ?, ?)', (signature, content_hash,
+                                           sqlite3.Binary(blob)))
+            self._db.commit()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+
+def _resolve_analyzers(analyzers):
+    """Turn a list of analyzer names, instances or C{(name, options)}
+    tuples into a list of L{Analyzer} instances."""
+    resolved = []
+    for item in analyzers:
+        if isinstance(item, Analyzer):
+            resolved.append(item)
+            continue
+        options = {}
+        if isinstance(item, tuple):
+            item, options = item
+        try:
+            resolved.append(_ANALYZERS[item](**options))
+        except KeyError:
+            raise LookupError('unknown analyzer: %s' % item)
+    return resolved
+
+
+def _analyze_file(analyzer, path, source, directory):
+    """Analyze a file of a project (executed by the workers)."""
+    return analyzer.analyze(path, source.read(path), directory)
+
+
+class AnalysisRunner(object):
+    """Runner of the analyzers over the files of a project."""
+
+    def __init__(self, analyzers=None, jobs=None, cache=None):
+        """Constructor of the runner.
+
+        @param analyzers: The analyzers to run: a list of analyzer
+        names, L{Analyzer} instances or C{(name, options)} tuples
+        (default to all the declared analyzers).
+
+        @param jobs: Number of worker processes (default to the number
+        of processors, 1 to analyze the files in the current process).
+
+        @param cache: The L{AnalysisCache} (default to the persistent
+        one).
+
+        """
+        self.analyzers = _resolve_analyzers(sorted(_ANALYZERS)
+                                            if analyzers is None
+                                            else analyzers)
+        self.jobs = jobs
+        self.cache = cache
+
+    def run_files(self, files, hash_cache=None):
+        """Analyze the files of a project (a directory or an archive).
+
+        @param files: The L{checkproject.files.Files} of the project.
+
+        @param hash_cache: The L{checkproject.hashcache.HashCache} used to
+        get the hashes of the files (default to the persistent cache).
+
+        @return: A dictionary mapping the path of each analyzed file to
+        the list of its L{Finding}, sorted by line.
+
+        """
+        from checkproject.files import _compile_globs
+
+        if hash_cache is None:
+            from checkproject.hashcache import default_cache
+            hash_cache = default_cache()
+        if self.cache is None:
+            self.cache = AnalysisCache()
+
+        source = files.source
+        results = {}
+        # Files to analyze: (analyzer, path, hash, signature)
+        pending = []
+
+        for plugin in self.analyzers:
+            pattern = _compile_globs(plugin.globs)
+            signature = plugin.signature()
+            if plugin.depends:
+                signature += '/' + files.fingerprint(plugin.depends,
+                                                     hash_cache)
+            for _file in files.files:
+                if _file[1] != 'f' or not pattern.match(_file[0]):
+                    continue
+                path = _file[0]
+                content_hash = source.hash_file(path, hash_cache)
+                cached = self.cache.get(signature, content_hash)
+                findings = results.setdefault(path, [])
+                if cached is None:
+                    pending.append((plugin, path, content_hash, signature))
+                else:
+                    findings.extend(Finding(plugin.name, path, *finding)
+                                    for finding in cached)
+        hash_cache.flush()
+
+        # The project is extracted only if an analyzer needs it
+        directory = None
+        if any(item[0].needs_directory for item in pending):
+            directory = source.directory()
+
+        for (plugin, path, content_hash, signature), findings in \
+                zip(pending, self._analyze(pending, source, directory)):
+            if plugin.cacheable(findings):
+                self.cache.put(signature, content_hash,
+                               [(finding.line, finding.severity,
+                                 finding.message) for finding in findings])
+            results[path].extend(findings)
+
+        for findings in results.values():
+            findings.sort(key=lambda finding: (finding.line or 0,
+                                               finding.analyzer))
+        return results
+
+    def _analyze(self, pending, source, directory):
+        """Analyze the pending files, in worker processes if there are
+        enough of them.
+
+        @return: The lists of findings, in the order of the files.
+
+        """
+        from checkproject.utils import picklable, process_pool
+
+        # The analyzers declared in a check module cannot be sent to the
+        # workers, they run in the current process
+        if self.jobs == 1 or len(pending) < PARALLEL_THRESHOLD or \
+           not picklable((self.analyzers, source)):
+            return [_analyze_file(plugin, path, source,
+                                  directory if plugin.needs_directory
+                                  else None)
+                    for plugin, path, _, _ in pending]
+
+        return list(process_pool(self.jobs).map(
+            _analyze_file,
+            [item[0] for item in pending], [item[1] for item in pending],
+            [source] * len(pending),
+            [directory if item[0].needs_directory else None
+             for item in pending],
+            chunksize=max(len(pending) // 64, 1)))
+
+
+def report(check, findings, hidden=False):
+    """Record findings as errors or warnings of a check.
+
+    @param check: The running L{checkproject.case.CheckCase}.
+
+    @param findings: A dictionary mapping the paths to their findings
+    (see L{AnalysisRunner.run_files}) or a list of L{Finding}.
+
+    @param hidden: Tell if the records are hidden to the student.
+
+    @return: True if no finding was recorded.
+
+    """
+    if isinstance(findings, dict):
+        findings = [finding for path in sorted(findings)
+                    for finding in findings[path]]
+    for finding in findings:
+        getattr(check, finding.severity)(False, finding.describe(),
+                                         hidden=hidden)
+    return not findings
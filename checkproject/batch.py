@@ -0,0 +1,190 @@
+# -*- coding: utf-8
+"""Batch runner to check a whole set of projects with a pool of processes.
+
+The checks are discovered once, then each project is checked in a
+worker process of the pool. Results are returned in completion order,
+so that a slow project does not stall the others.
+
+"""
+
+# Check settings shared by all the projects run by a worker process.
+_CHECKS_DIR = None
+_CHECKS = None
+_OPTIONS = None
+_EVENTS = None
+
+
+def read_manifest(manifest_path):
+    """Read a manifest file listing the projects to check.
+
+    The manifest holds one project path per line. Empty lines and
+    lines starting with a '#' are ignored. Relative paths are
+    relative to the directory of the manifest.
+
+    @param manifest_path: Path to the manifest file.
+
+    @return: The list of the project paths found in the manifest.
+
+    """
+    import os
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    projects = []
+
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            projects.append(os.path.join(base_dir, line))
+
+    return projects
+
+
+def find_projects(path):
+    """Get the projects to check from a directory or a manifest file.
+
+    @param path: Either a directory whose (non hidden) sub-directories
+    and archives are the projects, or a manifest file (see
+    L{read_manifest}).
+
+    @return: The list of the project paths.
+
+    """
+    from checkproject.source import is_archive
+    import os
+
+    if not os.path.isdir(path):
+        return read_manifest(path)
+
+    projects = []
+    for name in sorted(os.listdir(path)):
+        project = os.path.join(path, name)
+        if not name.startswith('.') and \
+           (os.path.isdir(project) or is_archive(project)):
+            projects.append(project)
+    return projects
+
+
+def _init_worker(checks_dir, checks, options, events=None):
+    """Store the discovered checks (and the queue of the events of the
+    checks, if any) in the worker process."""
+    global _CHECKS_DIR, _CHECKS, _OPTIONS, _EVENTS
+    _CHECKS_DIR = checks_dir
+    _CHECKS = checks
+    _OPTIONS = options
+    _EVENTS = events
+
+
+def _check_project(project_dir, pattern):
+    """Run all the checks on a project from inside a worker process."""
+    from checkproject.runner import CheckRunner
+    from checkproject.result import CheckResult
+
+    reporter = None
+    if _EVENTS is not None:
+        from checkproject.report import QueueReporter
+        reporter = QueueReporter(_EVENTS, project_dir)
+
+    check_runner = CheckRunner(project_dir, _CHECKS_DIR, reporter=reporter,
+                               **_OPTIONS)
+    check_runner.checks = list(_CHECKS)
+
+    result = check_runner.run(pattern)
+    if result is None:
+        result = CheckResult()
+
+    return result
+
+
+class BatchRunner(object):
+    """A class to run the same checks over several projects at once."""
+
+    def __init__(self, projects, checks_dir, jobs=None, store=None,
+                 timeout=None, reporter=None):
+        """Initialize the batch runner.
+
+        @param projects: List of the root directories of the projects
+        to check.
+
+        @param checks_dir: Root directory where to find all the checks.
+
+        @param jobs: Number of worker processes (default to the number
+        of CPUs).
+
+        @param store: The L{checkproject.store.ResultStore} used to
+        replay the results of the unchanged checks.
+
+        @param timeout: Default time budget of the check methods (in
+        seconds, no limit if None).
+
+        @param reporter: The L{checkproject.report.Reporter} receiving the
+        events of the checks of all the projects as they happen (the
+        events are sent by the workers through a queue).
+
+        """
+        self.projects = projects
+        self.checks_dir = checks_dir
+        self.jobs = jobs
+        self.store = store
+        self.timeout = timeout
+        self.reporter = reporter
+
+    def run(self, pattern='Check*'):
+        """Execute the checks on all the projects.
+
+        Each project gets its own result. When a project crashes the
+        checks (unexpected exception), a failure is recorded for it.
+
+        @return: An iterator over C{(project_dir, result)} tuples, in
+        the order the projects complete.
+
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from checkproject.runner import CheckRunner
+        from checkproject.result import CheckResult
+        import multiprocessing
+        import threading
+
+        # Discover the checks once for all the projects
+        check_runner = CheckRunner(None, self.checks_dir)
+        check_runner.discover()
+
+        # Forward the events of the workers to the reporter
+        events = forwarder = None
+        if self.reporter is not None:
+            from checkproject.report import forward
+            events = multiprocessing.Queue()
+            forwarder = threading.Thread(target=forward,
+                                         args=(events, self.reporter))
+            forwarder.daemon = True
+            forwarder.start()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.jobs,
+                                     initializer=_init_worker,
+                                     initargs=(self.checks_dir,
+                                               check_runner.checks,
+                                               {'store': self.store,
+                                                'timeout': self.timeout},
+                                               events)) as pool:
+                futures = dict((pool.submit(_check_project, project,
+                                            pattern), project)
+                               for project in self.projects)
+
+                for future in as_completed(futures):
+                    project = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as exception:
+                        result = CheckResult()
+                        result.add_failure('checks crashed: %r' % exception)
+                        if events is not None:
+                            events.put((project, 'run_end',
+                                        (project, result)))
+                    yield project, result
+        finally:
+            if forwarder is not None:
+                # The workers are done, send the end of the events
+                events.put(None)
+                forwarder.join()
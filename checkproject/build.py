@@ -0,0 +1,357 @@
+# -*- coding: utf-8
+"""Build the projects with a cache of the build results.
+
+A build is identified by a key computed from the content of the source
+files of the project, the build command, its options (timeout, limits,
+...) and the version of the toolchain. The files produced by the build
+(artefacts) and the outputs of the command are stored in a cache
+directory. When a project with the same key is built again, the
+artefacts are restored into the project instead of running the build
+command.
+
+The cache is bounded in size, the least recently used builds are
+evicted first.
+
+"""
+
+# Globbing expressions of the source files (matched against the names
+# and the paths of the files of the project)
+SOURCES = ('*.c', '*.h', '*.cc', '*.cpp', '*.hh', '*.hpp', '*.s', '*.S',
+           'Makefile', 'makefile', 'GNUmakefile', '*.mk')
+
+# Commands giving the version of the toolchain
+TOOLCHAIN = (('cc', '--version'), ('make', '--version'))
+
+# Default maximum size of the cache (in bytes)
+MAX_SIZE = 1024 * 1024 * 1024
+
+# Versions of the toolchain already computed in this process
+_TOOLCHAIN_VERSIONS = {}
+
+
+def toolchain_version(commands=TOOLCHAIN):
+    """Get the version of the toolchain (the first line of the output of
+    each command, or an empty string if the command is not available).
+
+    @param commands: The commands giving the versions of the tools.
+
+    @return: A tuple of the versions of the tools.
+
+    """
+    import subprocess
+
+    versions = []
+    for command in commands:
+        command = tuple(command)
+        if command not in _TOOLCHAIN_VERSIONS:
+            try:
+                output = subprocess.check_output(command,
+                                                 stderr=subprocess.STDOUT)
+                version = output.decode('utf-8', 'replace').split('\n')[0]
+            except (OSError, subprocess.CalledProcessError):
+                version = ''
+            _TOOLCHAIN_VERSIONS[command] = version
+        versions.append(_TOOLCHAIN_VERSIONS[command])
+
+    return tuple(versions)
+
+
+def _scan(project_path):
+    """Scan the files of a project (the directories of the version
+    control systems being skipped).
+
+    @return: A L{checkproject.files.Files} object.
+
+    """
+    from checkproject.files import Files, VCS_DIRECTORIES
+
+    return Files(project_path, ignore=VCS_DIRECTORIES)
+
+
+def _file_states(project_path, files):
+    """Get the size and modification time of all the files of a scan."""
+    import os
+
+    states = {}
+    for _file in files.files:
+        if _file[1] == 'f':
+            try:
+                status = os.stat(os.path.join(project_path, _file[0]))
+            except OSError:
+                continue
+            states[_file[0]] = (status.st_size, status.st_mtime_ns)
+    return states
+
+
+def _options_key(project_path, options):
+    """Get the part of the key of a build given by the options of the
+    build command (the working directory relative to the project)."""
+    import os
+
+    options = dict(options)
+    cwd = options.pop('cwd', None)
+    if cwd is not None:
+        cwd = os.path.relpath(cwd, project_path)
+    return (cwd,) + tuple(sorted((name, value if name != 'env' else
+                                  sorted(value.items()))
+                                 for name, value in options.items()))
+
+
+class BuildResult(object):
+    """Result of a build.
+
+    Attributes:
+      - C{key}: the key of the build in the cache.
+      - C{cached}: True if the build has been restored from the cache.
+      - C{command}: the L{checkproject.command.CommandResult} of the
+        build command (recorded when the build was run).
+      - C{artefacts}: the list of the paths of the files produced by
+        the build.
+
+    """
+
+    def __init__(self, key, cached, command, artefacts):
+        self.key = key
+        self.cached = cached
+        self.command = command
+        self.artefacts = artefacts
+
+    def succeeded(self):
+        """Returns True if the build command succeeded."""
+        return self.command.succeeded()
+
+    def describe(self):
+        """Returns a one-line description of the build."""
+        description = self.command.describe()
+        if self.cached:
+            description += ' (cached)'
+        return description
+
+
+class BuildCache(object):
+    """Cache of the builds, stored in a directory with one sub-directory
+    per build: C{<key>/files/} holds the artefacts and C{<key>/build}
+    the pickled L{BuildResult}."""
+
+    def __init__(self, path=None, max_size=MAX_SIZE):
+        """Open a build cache.
+
+        @param path: The directory of the cache (default to the
+        C{builds} directory in L{checkproject.utils.cache_dir}).
+
+        @param max_size: Maximum size of the cache (in bytes).
+
+        """
+        from checkproject.utils import cache_dir
+        import os
+
+        if path is None:
+            path = cache_dir('builds')
+        elif not os.path.isdir(path):
+            os.makedirs(path)
+
+        self.path = path
+        self.max_size = max_size
+
+    def key(self, project_path, command, sources=SOURCES,
+            toolchain=TOOLCHAIN, files=None, options=None):
+        """Compute the key of a build.
+
+        @param project_path: The top directory of the project.
+
+        @param command: The build command.
+
+        @param sources: Globbing expressions of the source files.
+
+        @param toolchain: The commands giving the version of the
+        toolchain.
+
+        @param files: The L{checkproject.files.Files} of the project
+        (scanned if None).
+
+        @param options: Options of L{checkproject.command.run_command}
+        given to the build command (timeout, limits, environment, ...).
+
+        @return: The key of the build (hexadecimal digest).
+
+        """
+        from checkproject.files import _compile_globs
+        from checkproject.hashcache import default_cache
+        import hashlib
+        import os
+
+        pattern = _compile_globs(sources)
+        cache = default_cache()
+        if files is None:
+            files = _scan(project_path)
+
+        digest = hashlib.sha1()
+        digest.update(repr((tuple(command), toolchain_version(toolchain),
+                            _options_key(project_path, options or {}))
+                           ).encode('utf-8'))
+
+        for _file in files.files:
+            if _file[1] == 'f' and (pattern.match(_file[0]) or
+                                    pattern.match(os.path.basename(_file[0]))):
+                content = cache.hash_file(os.path.join(project_path, _file[0]))
+                digest.update(repr((_file, content)).encode('utf-8'))
+        cache.flush()
+
+        return digest.hexdigest()
+
+    def restore(self, key, project_path):
+        """Restore a build from the cache into a project.
+
+        @return: The L{BuildResult} of the build, or None if the build
+        is not in the cache.
+
+        """
+        import os
+        import pickle
+        import shutil
+
+        entry = os.path.join(self.path, key)
+        try:
+            with open(os.path.join(entry, 'build'), 'rb') as _file:
+                result = pickle.load(_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        try:
+            for artefact in result.artefacts:
+                target = os.path.join(project_path, artefact)
+                if not os.path.isdir(os.path.dirname(target)):
+                    os.makedirs(os.path.dirname(target))
+                shutil.copy(os.path.join(entry, 'files', artefact), target)
+
+            # Mark the build as recently used
+            os.utime(entry, None)
+        except (IOError, OSError):
+            # Evicted by another process in the meantime (or damaged):
+            # drop what is left and build again
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        result.cached = True
+        return result
+
+    def store(self, result, project_path):
+        """Store a build into the cache and evict the oldest builds if the
+        cache is too large.
+
+        @param result: The L{BuildResult} of the build.
+
+        @param project_path: The top directory of the built project.
+
+        """
+        import os
+        import pickle
+        import shutil
+        import tempfile
+
+        tmp_entry = tempfile.mkdtemp(dir=self.path, prefix='.tmp-')
+        try:
+            size = 0
+            for artefact in result.artefacts:
+                target = os.path.join(tmp_entry, 'files', artefact)
+                if not os.path.isdir(os.path.dirname(target)):
+                    os.makedirs(os.path.dirname(target))
+                shutil.copy(os.path.join(project_path, artefact), target)
+                size += os.path.getsize(target)
+
+            with open(os.path.join(tmp_entry, 'build'), 'wb') as _file:
+                pickle.dump(result, _file, pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp_entry, 'size'), 'w') as _file:
+                _file.write(str(size))
+
+            os.rename(tmp_entry, os.path.join(self.path, result.key))
+        except OSError:
+            # Already stored by another process
+            pass
+        finally:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used builds until the cache fits in
+        its maximum size."""
+        import os
+        import shutil
+
+        entries = []
+        total = 0
+        for key in os.listdir(self.path):
+            entry = os.path.join(self.path, key)
+            if key.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(entry, 'size')) as _file:
+                    size = int(_file.read())
+                entries.append((os.stat(entry).st_mtime, size, entry))
+            except (IOError, OSError, ValueError):
+                continue
+            total += size
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def build(self, project_path, command=('make',), sources=SOURCES,
+              toolchain=TOOLCHAIN, artefacts=None, **options):
+        """Build a project, restoring the build from the cache if possible.
+
+        The artefacts are the files matching the given globbing
+        expressions after the build or, by default, the files created
+        or modified by the build command (so, a project already built
+        before its first build through the cache stores no artefact).
+        Builds that timed out are not cached.
+
+        @param project_path: The top directory of the project.
+
+        @param command: The build command.
+
+        @param sources: Globbing expressions of the source files.
+
+        @param toolchain: The commands giving the version of the
+        toolchain.
+
+        @param artefacts: Globbing expressions of the artefacts.
+
+        @param options: Options of L{checkproject.command.run_command}.
+
+        @return: A L{BuildResult} object.
+
+        """
+        from checkproject.command import run_command
+
+        files = _scan(project_path)
+        key = self.key(project_path, command, sources, toolchain, files,
+                       options)
+        result = self.restore(key, project_path)
+        if result is not None:
+            return result
+
+        before = _file_states(project_path, files)
+        options.setdefault('cwd', project_path)
+        command_result = run_command(list(command), **options)
+        after = _file_states(project_path, _scan(project_path))
+
+        if artefacts is None:
+            produced = sorted(path for path, state in after.items()
+                              if before.get(path) != state)
+        else:
+            from checkproject.files import _compile_globs
+            import os
+            pattern = _compile_globs(artefacts)
+            produced = sorted(path for path in after
+                              if pattern.match(path) or
+                              pattern.match(os.path.basename(path)))
+        result = BuildResult(key, False, command_result, produced)
+
+        if not command_result.timed_out:
+            self.store(result, project_path)
+
+        return result
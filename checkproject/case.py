@@ -8,19 +8,104 @@ There is three kinds of ways to fail a check:
  - Error: Generate an error message and count as an error.
  - Failure: Generate a failure message and stop the run of the checks.
 
+A check method running longer than its time budget is interrupted and
+recorded as an error (or a failure, see C{CheckCase.on_timeout}).
+
+A check method may be a coroutine ('async def'), awaiting for example
+the commands run with C{CheckCase.run_command_async()}: the checks of
+many projects are then interleaved on a single event loop by
+L{checkproject.aiorunner.AsyncRunner}.
+
 """
 
 class Failure(Exception):
     """Failure exception is used to stop the execution of the checks."""
 
 
+def check(weight=1, tags=(), hidden=False, timeout=None):
+    """Decorator attaching metadata to a check method.
+
+    @param weight: Weight of the check in the final mark.
+
+    @param tags: Tags used to select or group the checks.
+
+    @param hidden: Tell if the results of the check are hidden to the
+    student by default.
+
+    @param timeout: Time budget of the check method (in seconds).
+
+    """
+    def decorate(method):
+        method.check_metadata = {'weight': weight, 'tags': tuple(tags),
+                                 'hidden': hidden, 'timeout': timeout}
+        return method
+    return decorate
+
+
+class _Unbounded(object):
+    """Asynchronous context manager doing nothing (no semaphore)."""
+
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def _advance(steps, outcome=None):
+    """Run the steps of the checks of a class up to the next check method
+    (see C{CheckCase._steps}).
+
+    @param outcome: The outcome of the previous check method (None to
+    start).
+
+    @return: A tuple C{(done, value)}: the next check method, or the
+    result of all the checks when done.
+
+    """
+    try:
+        if outcome is None:
+            return False, next(steps)
+        return False, steps.send(outcome)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+class CheckMethod(object):
+    """Entry of the table of the check methods of a check class."""
+
+    __slots__ = ('name', 'description', 'weight', 'tags', 'hidden',
+                 'timeout')
+
+    def __init__(self, name, description=None, weight=1, tags=(),
+                 hidden=False, timeout=None):
+        self.name = name
+        self.description = description
+        self.weight = weight
+        self.tags = tags
+        self.hidden = hidden
+        self.timeout = timeout
+
+    def __repr__(self):
+        return 'CheckMethod(%r)' % self.name
+
+
 class CheckCase(object):
     """A class whose instance are single check cases.
 
     By default the code of the checks should be placed in methods
     starting with 'check_' in order to be executed. If required, the
     user can override a 'setup()' and a 'teardown()' method that are
-    executed, respectively, before and after each checking method.
+    executed, respectively, before and after each checking method, and
+    a 'setup_class()' and a 'teardown_class()' method executed once
+    before the first checking method and after the last one.
+
+    When the checks are run with a result store (see
+    L{checkproject.store.ResultStore}), a check method is executed only
+    if the check module or the inputs of the check changed since its
+    result was stored. The inputs are given by the C{inputs} attribute
+    of the class: globbing expressions of the files of the project the
+    checks depend on (None means the whole project).
 
     Checks are conducted through three types of check methods, namely:
 
@@ -36,9 +121,74 @@ class CheckCase(object):
 
     """
 
-    def __init__(self, project_path):
+    # Globbing expressions of the files the checks depend on
+    inputs = None
+
+    # Time budget of each check method of the class (in seconds) and the
+    # way an overrun is recorded ('error' or 'failure')
+    timeout = None
+    on_timeout = 'error'
+
+    def __init__(self, project_path, snapshot=None):
         self.project_path = project_path
+        self.snapshot = snapshot
         self.result = None
+        self.current = None
+        self._started = None
+        # Name of the check class (qualified by the runner)
+        self.check_id = self.__class__.__name__
+        # Path of the check module (set by the runner)
+        self.module_path = None
+        # Result store and fingerprint of the check module
+        self.store = None
+        self.fingerprint = None
+        # Reporter of the events of the checks
+        from checkproject.report import Reporter
+        self.reporter = Reporter()
+        # Profiler of the time and memory spent by the checks
+        self.profiler = None
+        # Time budget of the check methods without their own budget
+        self.default_timeout = None
+        # Fixtures shared by the checks of the run
+        self.fixtures = None
+
+    @classmethod
+    def method_table(cls, pattern='check_.*'):
+        """Get the table of the check methods of the class, in the order
+        of execution. The table is computed once per class and pattern.
+
+        @param pattern: Regular expression searched in the name of the
+        methods.
+
+        @return: A list of L{CheckMethod} entries.
+
+        """
+        import re
+
+        # Tables are stored in the class itself (not inherited)
+        tables = cls.__dict__.get('_method_tables')
+        if tables is None:
+            tables = {}
+            cls._method_tables = tables
+
+        table = tables.get(pattern)
+        if table is None:
+            regexp = re.compile(pattern)
+            table = []
+            for name in dir(cls):
+                if not regexp.search(name):
+                    continue
+                method = getattr(cls, name)
+                if not callable(method):
+                    continue
+                doc = getattr(method, '__doc__', None)
+                metadata = getattr(method, 'check_metadata', {})
+                table.append(CheckMethod(
+                    name, doc and doc.strip().split("\n")[0].strip() or None,
+                    **metadata))
+            tables[pattern] = table
+
+        return table
 
     def description(self):
         """Returns a one-line description of the check, or None if no
@@ -51,6 +201,199 @@ class CheckCase(object):
         doc = self.__doc__
         return doc and doc.split("\n")[0].strip() or None
 
+    def files(self):
+        """Get the files of the project from the snapshot shared by all
+        the checks of the run (the project is scanned again only if it
+        has been modified since the last scan).
+
+        @return: A L{checkproject.files.Files} object.
+
+        """
+        if self.snapshot is None:
+            from checkproject.files import FileSnapshot
+            self.snapshot = FileSnapshot(self.project_path)
+        return self.snapshot.get()
+
+    def directory(self):
+        """Get a real directory holding the files of the project. When the
+        project is an archive, it is extracted (once per run) into a
+        temporary directory, so this should be called only by the checks
+        which need a real directory.
+
+        @return: The path of the directory.
+
+        """
+        if self.snapshot is None:
+            from checkproject.files import FileSnapshot
+            self.snapshot = FileSnapshot(self.project_path)
+        return self.snapshot.source.directory()
+
+    def run_command(self, args, **options):
+        """Run a command in a sandbox, from the top directory of the
+        project by default (see L{directory}). The result can be checked
+        with, for example: C{self.error(result.succeeded(),
+        result.describe())}.
+
+        @param args: The command line (a list of arguments).
+
+        @param options: Options of L{checkproject.command.run_command}
+        (C{timeout}, C{cpu_time}, C{memory}, C{processes}, ...).
+
+        @return: A L{checkproject.command.CommandResult} object.
+
+        """
+        from checkproject.command import run_command
+
+        if 'cwd' not in options:
+            options['cwd'] = self.directory()
+        return run_command(args, **options)
+
+    async def run_command_async(self, args, **options):
+        """Run a command in a sandbox like L{run_command}, without blocking
+        the event loop (to be awaited in an asynchronous check method).
+
+        @return: A L{checkproject.command.CommandResult} object.
+
+        """
+        from checkproject.command import run_command_async
+
+        if 'cwd' not in options:
+            options['cwd'] = self.directory()
+        return await run_command_async(args, **options)
+
+    def build(self, command=('make',), **options):
+        """Build the project, restoring the build from the build cache if
+        the sources did not change since a previous build.
+
+        @param command: The build command.
+
+        @param options: Options of L{checkproject.build.BuildCache.build}
+        and of L{checkproject.command.run_command}.
+
+        @return: A L{checkproject.build.BuildResult} object.
+
+        """
+        from checkproject.build import BuildCache
+
+        return BuildCache().build(self.directory(), command, **options)
+
+    def memcheck(self, args, tests, hidden=False, severities=None,
+                 **options):
+        """Run tests of a program under valgrind memcheck, from the top
+        directory of the project by default, and record the memory
+        errors found (each error once, with the names of its tests).
+
+        @param args: The command line of the program.
+
+        @param tests: An iterable of C{(name, args, input)} tuples.
+
+        @param hidden: Tell if the records are hidden to the student.
+
+        @param severities: Severity of each kind of error (see
+        L{checkproject.memcheck.report}).
+
+        @param options: Options of L{checkproject.memcheck.Memcheck}
+        (C{jobs}, C{recorded}, C{timeout}, ...).
+
+        @return: The list of the L{checkproject.memcheck.MemcheckResult}.
+
+        """
+        from checkproject.memcheck import Memcheck, merge_errors, report
+
+        if 'cwd' not in options:
+            options['cwd'] = self.directory()
+        results = Memcheck(args, **options).run(tests)
+        report(self, merge_errors(results), hidden, severities)
+        return results
+
+    def analyze(self, analyzers=None, hidden=False, **options):
+        """Run static analyzers over the files of the project and record
+        their findings (the findings of the files which did not change
+        since a previous analysis are taken from the cache).
+
+        @param analyzers: The analyzers to run (see
+        L{checkproject.analysis.AnalysisRunner}).
+
+        @param hidden: Tell if the records are hidden to the student.
+
+        @param options: Options of L{checkproject.analysis.AnalysisRunner}
+        (C{jobs}, C{cache}).
+
+        @return: A dictionary mapping the path of each analyzed file to
+        the list of its L{checkproject.analysis.Finding}.
+
+        """
+        from checkproject.analysis import AnalysisRunner, report
+
+        findings = AnalysisRunner(analyzers, **options).run_files(
+            self.files())
+        report(self, findings, hidden)
+        return findings
+
+    def similar_projects(self, index=None, name=None, hidden=True,
+                         **options):
+        """Add the project to a similarity index and record its most
+        similar peers (copied or nearly copied projects) as warnings,
+        hidden to the student by default.
+
+        @param index: The L{checkproject.similarity.SimilarityIndex}, or
+        the path to its database (default to the index of the directory
+        of the check module, see L{checkproject.similarity.index_path}).
+
+        @param name: The name of the project in the index (default to
+        the path of the project).
+
+        @param hidden: Tell if the records are hidden to the student.
+
+        @param options: Options of
+        L{checkproject.similarity.SimilarityIndex.add} (C{top},
+        C{threshold}).
+
+        @return: The list of the L{checkproject.similarity.Peer} found.
+
+        """
+        from checkproject.similarity import (SimilarityIndex, index_path,
+                                             report)
+        import os
+
+        own_index = not isinstance(index, SimilarityIndex)
+        if own_index:
+            if index is None:
+                if self.module_path is None:
+                    raise ValueError('no similarity index given')
+                index = index_path(os.path.dirname(self.module_path))
+            index = SimilarityIndex(index)
+        try:
+            if name is None:
+                name = os.path.abspath(self.project_path)
+            peers = index.add(name, self.files(), **options)
+        finally:
+            if own_index:
+                index.close()
+        report(self, peers, hidden)
+        return peers
+
+    def fixture(self, name):
+        """Get the value of a fixture shared by all the checks of the run
+        (see L{checkproject.fixtures}).
+
+        @param name: The name of the fixture.
+
+        @return: The value of the fixture.
+
+        """
+        return self.fixtures.get(name)
+
+    def setup_class(self):
+        """Hook method for setting up the class fixture before running the
+        first check method of the class."""
+        pass
+
+    def teardown_class(self):
+        """Hook method for deconstructing the class fixture after running
+        the last check method of the class (even if a check failed)."""
+        pass
+
     def setup(self):
         "Hook method for setting up the check fixture before starting it."
         pass
@@ -59,6 +402,20 @@ class CheckCase(object):
         "Hook method for deconstructing the check fixture after finishing it."
         pass
 
+    def _hidden(self):
+        """Tell if the results of the running check are hidden by default."""
+        return self.current is not None and self.current.hidden
+
+    def _record(self):
+        """Get the name of the running check method and the time elapsed
+        since its start, to be recorded with its outcomes."""
+        import time
+
+        if self.current is None:
+            return {'check': self.check_id, 'duration': None}
+        return {'check': self.check_id + '.' + self.current.name,
+                'duration': time.time() - self._started}
+
     # The three types of checks: Warning, Error and Failure.
     # A Failure will immediately stop the checks and return.
     def warning(self, expr, result=None, hidden=False):
@@ -76,13 +433,15 @@ class CheckCase(object):
         check fail.
 
         @param hidden: Tell if the result of the check will be
-        available for the student or for his supervisor only.
+        available for the student or for his supervisor only (always
+        hidden if the check method is declared as hidden).
 
         """
+        hidden = hidden or self._hidden()
         if not expr:
-            self.result.add_warning(result, hidden)
+            self.result.add_warning(result, hidden, **self._record())
         else:
-            self.result.add_success(hidden)
+            self.result.add_success(hidden, **self._record())
 
     def error(self, expr, result=None, hidden=False):
         """An error is something that is bad with no doubt, it may be reported
@@ -96,13 +455,15 @@ class CheckCase(object):
         check fail.
 
         @param hidden: Tell if the result of the check will be
-        available for the student or for his supervisor only.
+        available for the student or for his supervisor only (always
+        hidden if the check method is declared as hidden).
 
         """
+        hidden = hidden or self._hidden()
         if not expr:
-            self.result.add_error(result, hidden)
+            self.result.add_error(result, hidden, **self._record())
         else:
-            self.result.add_success(hidden)
+            self.result.add_success(hidden, **self._record())
 
     def failure(self, expr, result=None):
         """A failure is something that breaks enough the software to stop the
@@ -120,10 +481,10 @@ class CheckCase(object):
 
         """
         if not expr:
-            self.result.add_failure(result)
+            self.result.add_failure(result, **self._record())
             raise Failure('warning: check failed!')
         else:
-            self.result.add_success()
+            self.result.add_success(**self._record())
 
     def list(self, pattern='check_.*'):
         """List all the checks discovered in the order of execution.
@@ -131,10 +492,214 @@ class CheckCase(object):
         @return: A list of all the checks ordered as for executing it.
 
         """
-        # Get all the methods starting with 'pattern'
-        import re
-        return [check for check in dir(self)
-                if re.compile(pattern).search(check)]
+        return [method.name for method in self.method_table(pattern)]
+
+    def _measure(self, kind, name):
+        """Measure a step of the checks with the profiler, if any."""
+        import contextlib
+
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.measure(kind, name)
+
+    def _method_timeout(self, method):
+        """Get the time budget of a check method (or None)."""
+        if method.timeout is not None:
+            return method.timeout
+        if self.timeout is not None:
+            return self.timeout
+        return self.default_timeout
+
+    def _start_method(self, method):
+        """Set up a check method with a new result."""
+        from checkproject.result import CheckResult
+        import time
+
+        self.result = CheckResult()
+        self.current = method
+        self._started = time.time()
+        with self._measure('setup', self.check_id + '.' + method.name):
+            self.setup()
+
+    def _end_method(self, method):
+        """Tear down a check method."""
+        try:
+            with self._measure('teardown', self.check_id + '.' + method.name):
+                self.teardown()
+        finally:
+            self.current = None
+
+    def _timed_out(self, method, timeout):
+        """Record the overrun of a check method.
+
+        @return: True if the overrun is a failure.
+
+        """
+        message = '%s() timed out after %gs' % (method.name, timeout)
+        if self.on_timeout == 'failure':
+            self.result.add_failure(message, **self._record())
+            return True
+        self.result.add_error(message, self._hidden(), **self._record())
+        return False
+
+    def _call_method(self, method, timeout):
+        """Call a check method with its time budget (an asynchronous check
+        method is run on its own event loop).
+
+        @return: True if the method raised a failure.
+
+        """
+        from checkproject.watchdog import deadline, Timeout
+        import asyncio
+        import inspect
+
+        try:
+            with self._measure('check', self.check_id + '.' + method.name):
+                with deadline(timeout):
+                    value = getattr(self, method.name)()
+                    if inspect.iscoroutine(value):
+                        asyncio.run(value)
+        except Failure:
+            return True
+        except Timeout:
+            return self._timed_out(method, timeout)
+        return False
+
+    def _run_method(self, method):
+        """Run a check method between the 'setup()' and the 'teardown()'
+        methods, with a new result.
+
+        @return: A tuple C{(result, failed)} where C{failed} tells if the
+        method raised a failure.
+
+        """
+        self._start_method(method)
+        try:
+            failed = self._call_method(method, self._method_timeout(method))
+        finally:
+            self._end_method(method)
+
+        return self.result, failed
+
+    async def _run_method_async(self, method, executor=None):
+        """Run a check method between the 'setup()' and the 'teardown()'
+        methods, with a new result, on the running event loop. An
+        asynchronous check method runs on the loop, and the other ones
+        run in the executor.
+
+        @param executor: The C{concurrent.futures} executor running the
+        synchronous check methods (default to the one of the loop).
+
+        @return: A tuple C{(result, failed)} where C{failed} tells if the
+        method raised a failure.
+
+        """
+        import asyncio
+        import inspect
+
+        loop = asyncio.get_running_loop()
+        timeout = self._method_timeout(method)
+
+        await loop.run_in_executor(executor, self._start_method, method)
+        try:
+            function = getattr(self, method.name)
+            if not inspect.iscoroutinefunction(function):
+                failed = await loop.run_in_executor(
+                    executor, self._call_method, method, timeout)
+            else:
+                try:
+                    with self._measure('check',
+                                       self.check_id + '.' + method.name):
+                        await asyncio.wait_for(function(), timeout)
+                    failed = False
+                except Failure:
+                    failed = True
+                except asyncio.TimeoutError:
+                    failed = self._timed_out(method, timeout)
+        finally:
+            await loop.run_in_executor(executor, self._end_method, method)
+
+        return self.result, failed
+
+    def _steps(self, result, pattern):
+        """Generator running the checks of the class, but for the check
+        methods themselves: it yields each method to run and receives
+        the tuple C{(result, failed)} of its run. Its return value is
+        the result of all the checks.
+
+        """
+        from checkproject.report import outcome
+        import time
+
+        # Fingerprint of the inputs when using a result store
+        inputs_hash = None
+        if self.store is not None:
+            inputs_hash = self.files().fingerprint(self.inputs)
+
+        # Fixtures of the run or, if run alone, of this check class only
+        own_fixtures = self.fixtures is None
+        if own_fixtures:
+            from checkproject.fixtures import FixtureManager
+            self.fixtures = FixtureManager(self.project_path)
+
+        self.reporter.class_start(self.check_id)
+        class_setup = False
+        try:
+            # Scanning all the checks in this CheckCase
+            for method in self.method_table(pattern):
+                check_id = self.check_id + '.' + method.name
+                self.reporter.method_start(check_id)
+                start = time.time()
+
+                # Replay the stored result if the check is unchanged
+                method_result = None
+                if inputs_hash is not None:
+                    method_result = self.store.get(self.project_path, check_id,
+                                                   self.fingerprint,
+                                                   inputs_hash)
+                replayed = method_result is not None
+
+                if replayed:
+                    failed = method_result.has_failed()
+                else:
+                    # Set up the class before running its first method
+                    if not class_setup:
+                        class_setup = True
+                        self.result = result
+                        try:
+                            with self._measure('setup_class', self.check_id):
+                                self.setup_class()
+                        except Failure:
+                            self.reporter.failure(self.check_id)
+                            break
+
+                    method_result, failed = yield method
+                    if inputs_hash is not None:
+                        self.store.put(self.project_path, check_id,
+                                       self.fingerprint, inputs_hash,
+                                       method_result)
+
+                result.merge(method_result)
+                self.reporter.method_end(check_id,
+                                         outcome(method_result.records),
+                                         time.time() - start,
+                                         method_result.records, replayed)
+                if failed:
+                    self.reporter.failure(check_id)
+                    break
+        finally:
+            self.result = result
+            try:
+                if class_setup:
+                    with self._measure('teardown_class', self.check_id):
+                        self.teardown_class()
+            finally:
+                if own_fixtures:
+                    self.fixtures.teardown()
+                    self.fixtures = None
+                self.reporter.class_end(self.check_id)
+
+        return self.result
 
     def run(self, result=None, pattern='check_.*'):
         """Run all the methods of the class starting with 'check_*'.
@@ -146,24 +711,54 @@ class CheckCase(object):
         # Initialize the 'result' object
         from checkproject.result import CheckResult
         if result is None:
-            self.result = CheckResult()
-        else:
-            self.result = result
+            result = CheckResult()
+
+        steps = self._steps(result, pattern)
+        try:
+            method = next(steps)
+            while True:
+                method = steps.send(self._run_method(method))
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            steps.close()
+
+    async def run_async(self, result=None, pattern='check_.*',
+                        semaphore=None, executor=None):
+        """Run all the methods of the class like L{run}, on the running
+        event loop, so that the checks of several classes (or projects)
+        waiting for commands are interleaved.
 
-        # Get all the methods starting with 'pattern'
-        import re
-        checks = [check for check in dir(self.__class__)
-                  if re.compile(pattern).search(check)]
+        @param result: Data-structure to store the result of all the checks.
 
-        # Scanning all the checks in this CheckCase
-        for method in checks:
-            check_method = getattr(self, method)
-            self.setup()
-            try:
-                check_method()
-            except Failure:
-                break
-            finally:
-                self.teardown()
+        @param semaphore: An C{asyncio.Semaphore} bounding the number of
+        check methods run concurrently (shared by all the checks run on
+        the loop).
 
-        return self.result
+        @param executor: The C{concurrent.futures} executor running the
+        synchronous methods and the steps between the methods (setting
+        up the class, replaying the stored results, ...), default to the
+        one of the loop.
+
+        """
+        from checkproject.result import CheckResult
+        import asyncio
+
+        if result is None:
+            result = CheckResult()
+        if semaphore is None:
+            semaphore = _Unbounded()
+
+        loop = asyncio.get_running_loop()
+        steps = self._steps(result, pattern)
+        outcome = None
+        try:
+            while True:
+                async with semaphore:
+                    done, value = await loop.run_in_executor(
+                        executor, _advance, steps, outcome)
+                    if done:
+                        return value
+                    outcome = await self._run_method_async(value, executor)
+        finally:
+            await loop.run_in_executor(executor, steps.close)
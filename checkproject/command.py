@@ -0,0 +1,433 @@
+# -*- coding: utf-8
+"""Run commands of the students in a sandbox.
+
+Commands are run in their own process group (so that all the processes
+they spawn can be killed at once) with a wall-clock timeout and with
+resource limits (CPU time, memory, number of processes, file size).
+The limits are set by a small interpreter started in place of the
+command, which then executes it (setting them in a 'preexec_fn' could
+deadlock the child of a process running threads). The outputs are
+captured in bounded buffers keeping only their end, so a program
+printing in an infinite loop cannot exhaust the memory.
+
+"""
+
+# Default maximum size of the captured outputs (in bytes)
+OUTPUT_LIMIT = 64 * 1024
+
+
+class RingBuffer(object):
+    """Bounded buffer keeping only the last bytes written into it."""
+
+    def __init__(self, size=OUTPUT_LIMIT):
+        self.size = size
+        self.total = 0
+        self._data = bytearray()
+
+    def write(self, chunk):
+        """Append a chunk of bytes, dropping the oldest ones if needed."""
+        self.total += len(chunk)
+        self._data += chunk
+        if len(self._data) > self.size:
+            del self._data[:len(self._data) - self.size]
+
+    def getvalue(self):
+        """Returns the bytes kept in the buffer."""
+        return bytes(self._data)
+
+    def truncated(self):
+        """Returns True if some bytes have been dropped."""
+        return self.total > self.size
+
+
+class CommandResult(object):
+    """Result of a command run by L{run_command}.
+
+    Attributes:
+      - C{args}: the command line.
+      - C{returncode}: the exit status (negative signal number if the
+        process has been killed by a signal).
+      - C{signal}: the number of the signal which killed the process or
+        None.
+      - C{timed_out}: True if the command has been killed on timeout.
+      - C{wall_time}: the elapsed time (in seconds).
+      - C{cpu_time}: the CPU time used by the process (user and system).
+      - C{stdout}, C{stderr}: the end of the outputs (bytes).
+      - C{stdout_truncated}, C{stderr_truncated}: True if the beginning
+        of the output has been dropped.
+
+    """
+
+    def __init__(self, args, returncode, signal, timed_out, wall_time,
+                 cpu_time, stdout, stderr, stdout_truncated=False,
+                 stderr_truncated=False):
+        self.args = args
+        self.returncode = returncode
+        self.signal = signal
+        self.timed_out = timed_out
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.stdout = stdout
+        self.stderr = stderr
+        self.stdout_truncated = stdout_truncated
+        self.stderr_truncated = stderr_truncated
+
+    def succeeded(self):
+        """Returns True if the command exited normally with a zero status."""
+        return self.returncode == 0 and not self.timed_out
+
+    def describe(self):
+        """Returns a one-line description of the termination of the command
+        (to be used as the result of a check)."""
+        command = ' '.join(str(arg) for arg in self.args)
+        if self.timed_out:
+            status = 'timed out after %.1fs' % self.wall_time
+        elif self.signal is not None:
+            status = 'killed by signal %d' % self.signal
+        else:
+            status = 'exited with status %d' % self.returncode
+        return "'%s' %s" % (command, status)
+
+    def __repr__(self):
+        return '<CommandResult %s>' % self.describe()
+
+
+# Program of the interpreter started in place of a command to set its
+# resource limits, then executing it (a 'preexec_fn' is not safe in a
+# process running threads). The errors are written to the pipe given
+# as first argument, closed on a successful execution.
+_LIMITS_PROGRAM = """
+import os, resource, sys
+pipe = int(sys.argv[1])
+os.set_inheritable(pipe, False)
+try:
+    for limit in sys.argv[2].split(','):
+        name, soft, hard = limit.split(':')
+        resource.setrlimit(getattr(resource, name), (int(soft), int(hard)))
+    os.execvp(sys.argv[3], sys.argv[3:])
+except BaseException as error:
+    os.write(pipe, ('%d:%s' % (getattr(error, 'errno', None) or 0,
+                               getattr(error, 'strerror', None) or error)
+                    ).encode('utf-8', 'replace'))
+    os._exit(127)
+"""
+
+
+def _limits(cpu_time, memory, processes, file_size):
+    """Get the resource limits of a command.
+
+    @return: A string of C{name:soft:hard} limits separated by commas
+    (see L{_LIMITS_PROGRAM}).
+
+    """
+    limits = ['RLIMIT_CORE:0:0']
+    if cpu_time is not None:
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        limits.append('RLIMIT_CPU:%d:%d' % (cpu_time, cpu_time + 1))
+    if memory is not None:
+        limits.append('RLIMIT_AS:%d:%d' % (memory, memory))
+    if processes is not None:
+        limits.append('RLIMIT_NPROC:%d:%d' % (processes, processes))
+    if file_size is not None:
+        limits.append('RLIMIT_FSIZE:%d:%d' % (file_size, file_size))
+    return ','.join(limits)
+
+
+def _spawn(args, cwd, env, input, cpu_time, memory, processes, file_size):
+    """Start a command in a new session with resource limits, through an
+    interpreter setting the limits before executing the command.
+
+    @raise OSError: If the limits cannot be set or the command cannot
+    be executed.
+
+    @return: The C{subprocess.Popen} object of the command.
+
+    """
+    import os
+    import subprocess
+    import sys
+
+    read_end, write_end = os.pipe()
+    try:
+        process = subprocess.Popen(
+            [sys.executable, '-I', '-S', '-c', _LIMITS_PROGRAM,
+             str(write_end), _limits(cpu_time, memory, processes,
+                                     file_size)] + [str(arg) for arg in args],
+            cwd=cwd, env=env, start_new_session=True, pass_fds=(write_end,),
+            stdin=subprocess.PIPE if input is not None else
+            subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        os.close(write_end)
+
+    # Wait for the execution of the command (end of file) or an error
+    try:
+        error = b''.join(iter(lambda: os.read(read_end, 4096), b''))
+    finally:
+        os.close(read_end)
+    if error:
+        process.wait()
+        for stream in (process.stdin, process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+        errno, _, message = error.decode('utf-8', 'replace').partition(':')
+        raise OSError(int(errno) or 22, message, args[0])
+    return process
+
+
+def _read(stream, buffer):
+    """Copy a stream into a buffer until the end of the stream."""
+    try:
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            buffer.write(chunk)
+    except (ValueError, IOError, OSError):
+        # The stream has been closed by the caller
+        pass
+
+
+def _write(stream, data):
+    """Write data to a stream and close it (the reader may exit early)."""
+    try:
+        stream.write(data)
+        stream.close()
+    except (IOError, OSError):
+        pass
+
+
+def _kill_group(pgid):
+    """Kill all the processes of a process group."""
+    import os
+    import signal
+
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def run_command(args, cwd=None, input=None, env=None, timeout=None,
+                cpu_time=None, memory=None, processes=None, file_size=None,
+                output_limit=OUTPUT_LIMIT):
+    """Run a command in a sandbox and wait for its termination.
+
+    @param args: The command line (a list of arguments).
+
+    @param cwd: Working directory of the command.
+
+    @param input: Bytes sent to the standard input of the command.
+
+    @param env: Environment of the command (default to the current one).
+
+    @param timeout: Wall-clock timeout (in seconds). Inside a check
+    method with a time budget, the timeout is at most the time left
+    before its deadline (see L{checkproject.watchdog.remaining}).
+
+    @param cpu_time: Limit of CPU time (in seconds).
+
+    @param memory: Limit of the address space (in bytes).
+
+    @param processes: Limit of the number of processes (RLIMIT_NPROC,
+    which counts all the processes of the user running the command, not
+    only the ones of the command: the sandbox is only effective against
+    a fork bomb when the commands run as a dedicated user).
+
+    @param file_size: Limit of the size of the written files (in bytes).
+
+    @param output_limit: Maximum size of each captured output (in bytes).
+
+    @return: A L{CommandResult} object.
+
+    """
+    from checkproject.watchdog import remaining
+    import os
+    import threading
+    import time
+
+    # A blocking wait is not interrupted by the deadline of a thread
+    left = remaining()
+    if left is not None and (timeout is None or left < timeout):
+        timeout = left
+
+    stdout = RingBuffer(output_limit)
+    stderr = RingBuffer(output_limit)
+    timed_out = []
+
+    start = time.time()
+    process = _spawn(args, cwd, env, input, cpu_time, memory, processes,
+                     file_size)
+
+    threads = [threading.Thread(target=_read, args=(process.stdout, stdout)),
+               threading.Thread(target=_read, args=(process.stderr, stderr))]
+    if input is not None:
+        threads.append(threading.Thread(target=_write,
+                                        args=(process.stdin, input)))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    timer = None
+    if timeout is not None:
+        def expire():
+            timed_out.append(True)
+            _kill_group(process.pid)
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+
+    status = None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        # Kill the processes left behind by the command
+        _kill_group(process.pid)
+        if status is None:
+            # Interrupted (by the watchdog): reap the killed command
+            try:
+                _, status = os.waitpid(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                pass
+            process.stdout.close()
+            process.stderr.close()
+
+    wall_time = time.time() - start
+
+    for thread in threads:
+        thread.join(1)
+    process.stdout.close()
+    process.stderr.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return _command_result(args, status, usage, bool(timed_out), wall_time,
+                           stdout, stderr)
+
+
+def _command_result(args, status, usage, timed_out, wall_time, stdout,
+                    stderr):
+    """Build the result of a command from its exit status."""
+    import os
+
+    if os.WIFSIGNALED(status):
+        signal = os.WTERMSIG(status)
+        returncode = -signal
+    else:
+        signal = None
+        returncode = os.WEXITSTATUS(status)
+
+    return CommandResult(args, returncode, signal, timed_out, wall_time,
+                         usage.ru_utime + usage.ru_stime,
+                         stdout.getvalue(), stderr.getvalue(),
+                         stdout.truncated(), stderr.truncated())
+
+
+async def _read_async(loop, stream, buffer):
+    """Copy a pipe into a buffer until its end, on the event loop."""
+    import asyncio
+
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), stream)
+    try:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            buffer.write(chunk)
+    finally:
+        transport.close()
+
+
+async def _wait_async(loop, pid):
+    """Wait for the termination of a process without blocking the event
+    loop (notified through a pidfd when available, polled otherwise).
+
+    @return: A tuple C{(status, usage)} as returned by C{os.wait4()}.
+
+    """
+    import asyncio
+    import os
+
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    delay = 0.001
+    try:
+        while True:
+            waited, status, usage = os.wait4(pid, os.WNOHANG)
+            if waited:
+                return status, usage
+            if pidfd is None:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                continue
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or
+                            exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+async def run_command_async(args, cwd=None, input=None, env=None,
+                            timeout=None, cpu_time=None, memory=None,
+                            processes=None, file_size=None,
+                            output_limit=OUTPUT_LIMIT):
+    """Run a command in a sandbox and wait for its termination on the
+    running event loop, so that the commands of many checks can run
+    concurrently in a single thread. The options and the result are the
+    ones of L{run_command}.
+
+    @return: A L{CommandResult} object.
+
+    """
+    import asyncio
+    import os
+    import time
+
+    loop = asyncio.get_running_loop()
+    stdout = RingBuffer(output_limit)
+    stderr = RingBuffer(output_limit)
+    timed_out = False
+
+    start = time.time()
+    process = await loop.run_in_executor(None, _spawn, args, cwd, env, input,
+                                         cpu_time, memory, processes,
+                                         file_size)
+
+    tasks = [loop.create_task(_read_async(loop, process.stdout, stdout)),
+             loop.create_task(_read_async(loop, process.stderr, stderr))]
+    if input is not None:
+        # Small inputs fit in the pipe, larger ones are written by a thread
+        tasks.append(loop.run_in_executor(None, _write, process.stdin, input))
+
+    try:
+        try:
+            status, usage = await asyncio.wait_for(
+                _wait_async(loop, process.pid), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill_group(process.pid)
+            status, usage = await _wait_async(loop, process.pid)
+    finally:
+        # Kill the processes left behind by the command
+        _kill_group(process.pid)
+
+    wall_time = time.time() - start
+
+    await asyncio.wait(tasks, timeout=1)
+    for task in tasks:
+        task.cancel()
+    process.stdout.close()
+    process.stderr.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return _command_result(args, status, usage, timed_out, wall_time,
+                           stdout, stderr)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8
+"""Tokenizer of C source files.
+
+A C file is read and split into tokens once. The tokens are cached by
+the hash of the content of the file, in memory and on disk, so that all
+the checks reading the same file (or an identical copy of it in
+another project) share the same token stream.
+
+"""
+import re
+
+# C keywords (C11)
+KEYWORDS = frozenset([
+    'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do',
+    'double', 'else', 'enum', 'extern', 'float', 'for', 'goto', 'if',
+    'inline', 'int', 'long', 'register', 'restrict', 'return', 'short',
+    'signed', 'sizeof', 'static', 'struct', 'switch', 'typedef', 'union',
+    'unsigned', 'void', 'volatile', 'while', '_Alignas', '_Alignof',
+    '_Atomic', '_Bool', '_Complex', '_Generic', '_Imaginary', '_Noreturn',
+    '_Static_assert', '_Thread_local'])
+
+# Regular expression matching one token at a time
+TOKEN_RE = re.compile(r'''
+    (?P<comment>/\*.*?\*/|//[^\n]*)
+  | (?P<preprocessor>^[ \t]*\#(?:[^\n\\]|\\.)*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<char>'(?:[^'\\\n]|\\.)*')
+  | (?P<number>\.?[0-9](?:[eEpP][+-]|[0-9A-Za-z_.])*)
+  | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<operator>\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\|
+                 |[-+*/%&|^]=|[{}()\[\];,.?:~!%^&*+\-/<>=\#])
+  | (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<other>.)
+''', re.S | re.M | re.X)
+
+# Maximum number of token streams kept in memory
+MEMORY_CACHE_SIZE = 512
+
+
+class Token(object):
+    """Token of a C source file.
+
+    Attributes:
+      - C{kind}: one of C{'comment'}, C{'preprocessor'}, C{'string'},
+        C{'char'}, C{'number'}, C{'identifier'}, C{'keyword'},
+        C{'operator'} or C{'other'}.
+      - C{text}: the text of the token.
+      - C{line}: the line of the start of the token (from 1).
+      - C{column}: the column of the start of the token (from 0).
+
+    """
+
+    __slots__ = ('kind', 'text', 'line', 'column')
+
+    def __init__(self, kind, text, line, column):
+        self.kind = kind
+        self.text = text
+        self.line = line
+        self.column = column
+
+    def __reduce__(self):
+        return (Token, (self.kind, self.text, self.line, self.column))
+
+    def __repr__(self):
+        return 'Token(%r, %r, %d, %d)' % (self.kind, self.text, self.line,
+                                          self.column)
+
+
+class SourceFile(object):
+    """A tokenized C source file.
+
+    Attributes:
+      - C{path}: the path of the file.
+      - C{digest}: the hash of the content of the file.
+      - C{lines}: the lines of the file (without the end of lines).
+      - C{tokens}: the tokens of the file (without spaces and newlines).
+
+    """
+
+    __slots__ = ('path', 'digest', 'lines', 'tokens')
+
+    def __init__(self, path, digest, lines, tokens):
+        self.path = path
+        self.digest = digest
+        self.lines = lines
+        self.tokens = tokens
+
+    def __reduce__(self):
+        return (SourceFile, (self.path, self.digest, self.lines, self.tokens))
+
+
+def tokenize(text):
+    """Split a C source code into tokens.
+
+    @param text: The source code.
+
+    @return: The list of the L{Token} (spaces and newlines excluded).
+
+    """
+    tokens = []
+    line = 1
+    line_start = 0
+
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'newline':
+            line += 1
+            line_start = match.end()
+            continue
+        if kind != 'space':
+            if kind == 'identifier' and value in KEYWORDS:
+                kind = 'keyword'
+            tokens.append(Token(kind, value, line,
+                                match.start() - line_start))
+        newlines = value.count('\n')
+        if newlines:
+            line += newlines
+            line_start = match.start() + value.rindex('\n') + 1
+
+    return tokens
+
+
+# Token streams in memory: digest -> (lines, tokens)
+_MEMORY_CACHE = {}
+
+
+def _disk_cache_path(digest):
+    """Get the path of a token stream in the disk cache."""
+    import os
+    from checkproject.utils import cache_dir
+
+    return os.path.join(cache_dir('tokens', digest[:2]), digest)
+
+
+def read_source(path, disk_cache=True, source=None):
+    """Read and tokenize a C source file, using the token stream cached
+    for the same content if any.
+
+    @param path: The path of the file.
+
+    @param disk_cache: Cache the token streams on disk as well.
+
+    @param source: The L{checkproject.source.ProjectSource} holding the
+    file (the path is then relative to the project), or None to read
+    the file from the file system.
+
+    @return: A L{SourceFile} object.
+
+    """
+    import hashlib
+    import os
+    import pickle
+
+    if source is not None:
+        content = source.read(path)
+    else:
+        with open(path, 'rb') as _file:
+            content = _file.read()
+    digest = hashlib.sha1(content).hexdigest()
+
+    entry = _MEMORY_CACHE.get(digest)
+    if entry is None and disk_cache:
+        try:
+            with open(_disk_cache_path(digest), 'rb') as _file:
+                entry = pickle.load(_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            entry = None
+
+    if entry is None:
+        text = content.decode('utf-8', 'replace')
+        entry = (text.split('\n'), tokenize(text))
+        if disk_cache:
+            cache_path = _disk_cache_path(digest)
+            tmp_path = '%s.%d' % (cache_path, os.getpid())
+            try:
+                with open(tmp_path, 'wb') as _file:
+                    pickle.dump(entry, _file, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp_path, cache_path)
+            except (IOError, OSError):
+                pass
+
+    if len(_MEMORY_CACHE) >= MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.pop(next(iter(_MEMORY_CACHE)))
+    _MEMORY_CACHE[digest] = entry
+
+    return SourceFile(path, digest, entry[0], entry[1])
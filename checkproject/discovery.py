@@ -0,0 +1,202 @@
+# -*- coding: utf-8
+"""Static discovery of the checks, without executing the check modules.
+
+The check modules are parsed into an abstract syntax tree to find the
+check classes, their check methods, their docstrings and the metadata
+given with the L{checkproject.case.check} decorator (only literal
+arguments are understood). The tables of the modules are cached on
+disk (see L{save_cache}) and recomputed only when the source file of a
+module changes.
+
+The static discovery only knows about the classes defined in the module
+itself: a check class is a class matching the pattern which derives
+from C{CheckCase}, directly or through other check classes of the same
+module, and it inherits the check methods of its base classes defined
+in the same module.
+
+"""
+
+# Tables of the modules already parsed: path -> (signature, classes)
+_TABLES = {}
+
+# Tables loaded from (or to write to) the disk cache
+_DISK_CACHE = None
+_DISK_CACHE_CHANGED = False
+
+
+def _load_disk_cache():
+    """Load the tables cached on disk."""
+    global _DISK_CACHE
+    import json
+    import os
+    from checkproject.utils import cache_dir
+
+    if _DISK_CACHE is None:
+        try:
+            with open(os.path.join(cache_dir(), 'discovery.json')) as _file:
+                _DISK_CACHE = json.load(_file)
+        except (IOError, OSError, ValueError):
+            _DISK_CACHE = {}
+    return _DISK_CACHE
+
+
+def save_cache():
+    """Write the tables parsed since the last call to the disk cache."""
+    global _DISK_CACHE_CHANGED
+    import json
+    import os
+    import tempfile
+    from checkproject.utils import cache_dir
+
+    if not _DISK_CACHE_CHANGED:
+        return
+    _DISK_CACHE_CHANGED = False
+
+    path = os.path.join(cache_dir(), 'discovery.json')
+    try:
+        descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, 'w') as _file:
+            json.dump(_DISK_CACHE, _file)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def _decorator_metadata(function):
+    """Get the literal arguments of the 'check' decorator of a method."""
+    import ast
+
+    for decorator in function.decorator_list:
+        if not isinstance(decorator, ast.Call):
+            continue
+        func = decorator.func
+        name = getattr(func, 'id', None) or getattr(func, 'attr', None)
+        if name != 'check':
+            continue
+        metadata = {}
+        for keyword in decorator.keywords:
+            try:
+                metadata[keyword.arg] = ast.literal_eval(keyword.value)
+            except (ValueError, TypeError, SyntaxError):
+                pass
+        return metadata
+    return {}
+
+
+def parse_module(module_path):
+    """Parse a check module and list its classes and methods.
+
+    @param module_path: Path to the Python file of the module.
+
+    @return: A dictionary mapping the name of each class with base
+    classes to a tuple C{(bases, methods)}, where C{methods} maps the
+    names of the methods to C{(description, metadata)}.
+
+    """
+    import ast
+
+    with open(module_path, 'rb') as _file:
+        tree = ast.parse(_file.read(), module_path)
+
+    classes = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or not node.bases:
+            continue
+        bases = [getattr(base, 'id', None) or getattr(base, 'attr', None)
+                 for base in node.bases]
+        methods = {}
+        for item in node.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                doc = ast.get_docstring(item)
+                methods[item.name] = (
+                    doc and doc.strip().split('\n')[0].strip() or None,
+                    _decorator_metadata(item))
+        classes[node.name] = (bases, methods)
+
+    return classes
+
+
+def _classes(module_path):
+    """Get the parsed classes of a module, from the caches if possible."""
+    global _DISK_CACHE_CHANGED
+    import os
+
+    module_path = os.path.abspath(module_path)
+    status = os.stat(module_path)
+    signature = [status.st_mtime_ns, status.st_size]
+
+    entry = _TABLES.get(module_path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    disk_cache = _load_disk_cache()
+    entry = disk_cache.get(module_path)
+    if entry is None or entry[0] != signature:
+        entry = [signature, parse_module(module_path)]
+        disk_cache[module_path] = entry
+        _DISK_CACHE_CHANGED = True
+
+    _TABLES[module_path] = entry
+    return entry[1]
+
+
+def static_table(module_path, pattern='Check*', method_pattern='check_.*'):
+    """List the check classes and methods of a module without executing it.
+
+    @param module_path: Path to the Python file of the module.
+
+    @param pattern: Regular expression searched in the name of the
+    classes.
+
+    @param method_pattern: Regular expression searched in the name of
+    the methods.
+
+    @return: A list of C{(class_name, methods)} tuples sorted by class
+    name, where C{methods} is a list of L{checkproject.case.CheckMethod}
+    in the order of execution.
+
+    """
+    from checkproject.case import CheckMethod
+    import re
+
+    classes = _classes(module_path)
+    class_regexp = re.compile(pattern)
+    method_regexp = re.compile(method_pattern)
+
+    def methods(name, seen):
+        """Collect the methods of a class and of its bases in the module."""
+        if name in seen or name not in classes:
+            return {}
+        seen.add(name)
+        bases, own_methods = classes[name]
+        collected = {}
+        for base in reversed(bases):
+            collected.update(methods(base, seen))
+        collected.update(own_methods)
+        return collected
+
+    def is_check(name, seen):
+        """Tell if a class derives from CheckCase in the module."""
+        if name in seen or name not in classes:
+            return False
+        seen.add(name)
+        return any(base == 'CheckCase' or is_check(base, seen)
+                   for base in classes[name][0])
+
+    table = []
+    for name in sorted(classes):
+        if name == 'CheckCase' or not class_regexp.search(name) or \
+           not is_check(name, set()):
+            continue
+        entries = []
+        for method, (description, metadata) in \
+                sorted(methods(name, set()).items()):
+            if method_regexp.search(method):
+                metadata = dict((key, value) for key, value in metadata.items()
+                                if key in CheckMethod.__slots__)
+                if 'tags' in metadata:
+                    metadata['tags'] = tuple(metadata['tags'])
+                entries.append(CheckMethod(method, description, **metadata))
+        table.append((name, entries))
+
+    return table
@@ -1,6 +1,35 @@
 # -*- coding: utf-8 -*-
 """Handling file checking inside a project"""
 
+# Compiled regular expressions of the globbing expressions already seen
+_GLOBS_CACHE = {}
+
+
+def _compile_globs(globs):
+    """Compile a set of globbing expressions into a single regular
+    expression matching any of them (compiled expressions are cached).
+
+    @param globs: A tuple of globbing expressions.
+
+    @return: The compiled regular expression.
+
+    """
+    import fnmatch
+    import re
+
+    key = tuple(globs)
+    pattern = _GLOBS_CACHE.get(key)
+    if pattern is None:
+        pattern = re.compile('|'.join('(?:%s)' % fnmatch.translate(glob)
+                                      for glob in key))
+        _GLOBS_CACHE[key] = pattern
+    return pattern
+
+
+# Directories of the version control systems, usually ignored in a scan
+VCS_DIRECTORIES = ('.git', '.svn', '.hg', 'CVS')
+
+
 class Files(object):
     """Class to scan, store and search in the files and directories found in the
     project.
@@ -22,39 +51,135 @@ class Files(object):
       - C{('include/module.h', 'l', 'src/module.h')} is a symbolic
         link pointing to 'src/module.h'.
 
+    The scan can be pruned while walking through the project tree:
+      - C{ignore}: globbing expressions of the files and directories to
+        skip (matched against the name or the path of the item). The
+        content of an ignored directory is never read.
+      - C{max_depth}: maximum depth of the scanned directories (C{0}
+        only lists the top directory of the project).
+      - C{max_entries}: directories with more entries than this are
+        listed but their content is skipped.
+
+    The project is either a directory or an archive (see
+    L{checkproject.source}): the scans, the searches and the comparisons
+    work the same on both, and the content of the files is read with
+    L{open} or L{read}.
+
     """
 
-    def __init__(self, project_path):
-        self.root = project_path
-        self.files = self.scan()
+    def __init__(self, project_path, ignore=None, max_depth=None,
+                 max_entries=None):
+        from checkproject.source import open_source
 
-    def scan(self):
-        """Scan all the files and directories present in the project
+        self.source = open_source(project_path)
+        self.root = self.source.root
+        self.ignore = ignore
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.files = self.scan()
+        self.index()
 
-        @return: A list of all the files and directories found in the
-        project.
+    def index(self):
+        """Build the indexes of the last scan used to speed up the
+        searches: a set of all the items, a mapping from C{(path, type)}
+        to the item, the items grouped by type and the tree of the
+        directories (mapping a directory path to its children, the top
+        directory of the project being C{''}).
 
         """
-        from checkproject.utils import remove_prefix
         import os
 
-        files = []
+        self._items = set(self.files)
+        self._by_path = {}
+        self._by_type = {}
+        self._tree = {'': []}
+
+        for _file in self.files:
+            self._by_path[_file[:2]] = _file
+            self._by_type.setdefault(_file[1], []).append(_file)
+            self._tree.setdefault(os.path.dirname(_file[0]), []).append(_file)
+            if _file[1] == 'd':
+                self._tree.setdefault(_file[0], [])
+
+    def lookup(self, path, _type):
+        """Find an item of the last scan from its path and its type.
+
+        @param path: Path of the item in the project.
+
+        @param _type: Type of the item (C{'f'}, C{'d'} or C{'l'}).
+
+        @return: The item C{(path, type[, extra])} or None if not found.
+
+        """
+        return self._by_path.get((path, _type))
+
+    def by_type(self, _type):
+        """Get all the items of the last scan with the given type.
+
+        @param _type: Type of the items (C{'f'}, C{'d'} or C{'l'}).
+
+        @return: The sorted list of the items of this type.
+
+        """
+        return list(self._by_type.get(_type, []))
 
-        for root, dirnames, filenames, in os.walk(self.root):
-            for _file in [os.path.join(root, _f) for _f in filenames]:
-                if os.access(_file, os.X_OK):
-                    files.append((remove_prefix(_file, self.root), 'f',
-                                  'executable'))
-                elif os.path.islink(_file):
-                    files.append((remove_prefix(_file, self.root), 'l',
-                                  os.path.realpath(_file)))
-                else:
-                    files.append((remove_prefix(_file, self.root), 'f'))
+    def children(self, path=''):
+        """Get the items directly enclosed in a directory of the project.
 
-            for _dir in [os.path.join(root, _d) for _d in dirnames]:
-                files.append((remove_prefix(_dir, self.root), 'd'))
+        @param path: Path of the directory (default to the top directory).
 
-        return sorted(files)
+        @return: The sorted list of the items of the directory, or None
+        if the directory was not found.
+
+        """
+        children = self._tree.get(path)
+        if children is None:
+            return None
+        return list(children)
+
+    def open(self, path):
+        """Open a file of the project for reading (binary mode).
+
+        @param path: Path of the file in the project.
+
+        @return: A file object.
+
+        """
+        return self.source.open(path)
+
+    def read(self, path):
+        """Read the content of a file of the project.
+
+        @param path: Path of the file in the project.
+
+        @return: The content of the file (bytes).
+
+        """
+        return self.source.read(path)
+
+    def iterscan(self):
+        """Walk through the project and yield the files and directories as
+        they are found (not sorted). The pruning rules are applied
+        during the walk.
+
+        @return: An iterator over all the files and directories found
+        in the project.
+
+        """
+        ignore = None
+        if self.ignore:
+            ignore = _compile_globs(self.ignore)
+
+        return self.source.iterscan(ignore, self.max_depth, self.max_entries)
+
+    def scan(self):
+        """Scan all the files and directories present in the project
+
+        @return: A sorted list of all the files and directories found
+        in the project.
+
+        """
+        return sorted(self.iterscan())
 
     def required(self, required_files):
         """Check if all the required files are present in the last scan.
@@ -65,16 +190,8 @@ class Files(object):
 
         @return: A list of the missing files.
         """
-        missing_files = []
-
-        for required_file in required_files:
-            for _file in self.files:
-                if _file == required_file:
-                    break
-            else:
-                missing_files.append(required_file)
-
-        return missing_files
+        return [required_file for required_file in required_files
+                if tuple(required_file) not in self._items]
 
     def unwanted(self, unwanted_files):
         """Check if given globbing expressions match any file of the last scan.
@@ -83,19 +200,236 @@ class Files(object):
         in the project. Each item of the list must be specified in the
         specific format of this module: '(path, type, extra)'.
 
-        """
-        import fnmatch
-        import re
-        unwanted = []
+        @return: A sorted list of the files matching at least one of the
+        expressions (each file is reported only once).
 
+        """
+        # Merge all the expressions sharing the same '(type, extra)'
+        globs = {}
         for unwanted_file in unwanted_files:
-            pattern = re.compile(fnmatch.translate(unwanted_file[0]))
-            for _file in self.files:
-                if re.match(pattern, _file[0]) and (unwanted_file[1:] == _file[1:]):
-                    unwanted.append(_file)
+            globs.setdefault(tuple(unwanted_file[1:]), []).append(unwanted_file[0])
+        patterns = dict((key, _compile_globs(value))
+                        for key, value in globs.items())
+
+        # Match all the files in a single pass
+        unwanted = []
+        for _file in self.files:
+            pattern = patterns.get(_file[1:])
+            if pattern is not None and pattern.match(_file[0]):
+                unwanted.append(_file)
 
         return unwanted
 
-    def diff(self, path=None):
-        """Check the content of the project against the one """
-        pass
+    def subtree(self, item):
+        """Get an item and, for a directory, all the items it encloses.
+
+        @param item: An item of the last scan.
+
+        @return: The list of the items of the subtree.
+
+        """
+        items = [item]
+        if item[1] == 'd':
+            for child in self._tree.get(item[0], []):
+                items.extend(self.subtree(child))
+        return items
+
+    def tree_hashes(self, cache=None):
+        """Compute the hashes of all the items of the last scan.
+
+        Files are hashed from their content, links from their target
+        and directories from the names, types and hashes of their
+        children (so, two directories with the same hash have identical
+        subtrees). The top directory of the project is C{''}.
+
+        @param cache: The L{checkproject.hashcache.HashCache} used to
+        get the hashes of the files (default to the persistent cache).
+
+        @return: A dictionary mapping the paths to the hashes.
+
+        """
+        import hashlib
+        import os
+
+        if cache is None:
+            from checkproject.hashcache import default_cache
+            cache = default_cache()
+
+        hashes = {}
+        for _file in self.files:
+            if _file[1] == 'f':
+                try:
+                    hashes[_file[0]] = self.source.hash_file(_file[0], cache)
+                except (IOError, OSError):
+                    hashes[_file[0]] = ''
+            elif _file[1] == 'l':
+                try:
+                    target = self.source.readlink(_file[0])
+                except OSError:
+                    target = ''
+                hashes[_file[0]] = hashlib.sha1(
+                    target.encode('utf-8', 'surrogateescape')).hexdigest()
+        cache.flush()
+
+        # Hash the directories, the deepest first
+        directories = [''] + [_dir[0] for _dir in self._by_type.get('d', [])]
+        directories.sort(key=lambda _dir: _dir.count('/') + bool(_dir),
+                         reverse=True)
+        for directory in directories:
+            digest = hashlib.sha1()
+            for child in self._tree.get(directory, []):
+                extra = child[2:] if child[1] == 'f' else ()
+                digest.update(repr((os.path.basename(child[0]), child[1],
+                                    extra, hashes[child[0]])).encode('utf-8'))
+            hashes[directory] = digest.hexdigest()
+
+        return hashes
+
+    def fingerprint(self, globs=None, cache=None):
+        """Compute a fingerprint of (a part of) the project.
+
+        @param globs: Globbing expressions of the files to take into
+        account (matched against their path), or None for the whole
+        project.
+
+        @param cache: The L{checkproject.hashcache.HashCache} used to
+        get the hashes of the files (default to the persistent cache).
+
+        @return: The fingerprint (hexadecimal digest).
+
+        """
+        import hashlib
+
+        hashes = self.tree_hashes(cache)
+        if globs is None:
+            return hashes['']
+
+        pattern = _compile_globs(globs)
+        digest = hashlib.sha1()
+        for _file in self.files:
+            if _file[1] != 'd' and pattern.match(_file[0]):
+                digest.update(repr((_file[:2], hashes[_file[0]])).encode('utf-8'))
+        return digest.hexdigest()
+
+    def diff(self, reference, cache=None):
+        """Check the content of the project against a reference tree (a
+        skeleton of the project or a previous version of it).
+
+        Identical subtrees are detected from their hash and skipped.
+
+        @param reference: Path to the top directory of the reference
+        tree or a L{Files} object of it.
+
+        @param cache: The L{checkproject.hashcache.HashCache} used to
+        get the hashes of the files (default to the persistent cache).
+
+        @return: A tuple C{(added, removed, modified)} of sorted lists
+        of the items added to the project, removed from it (items of
+        the reference) and modified.
+
+        """
+        if not isinstance(reference, Files):
+            reference = Files(reference)
+
+        hashes = self.tree_hashes(cache)
+        reference_hashes = reference.tree_hashes(cache)
+
+        added = []
+        removed = []
+        modified = []
+
+        directories = ['']
+        while directories:
+            directory = directories.pop()
+            if hashes[directory] == reference_hashes[directory]:
+                continue
+
+            items = dict((item[0], item) for item in self._tree[directory])
+            reference_items = dict((item[0], item)
+                                   for item in reference._tree[directory])
+
+            for path, item in items.items():
+                reference_item = reference_items.get(path)
+                if reference_item is None:
+                    added.extend(self.subtree(item))
+                elif item[1] != reference_item[1]:
+                    added.extend(self.subtree(item))
+                    removed.extend(reference.subtree(reference_item))
+                elif item[1] == 'd':
+                    directories.append(path)
+                elif hashes[path] != reference_hashes[path] or \
+                     (item[1] == 'f' and item[2:] != reference_item[2:]):
+                    modified.append(item)
+
+            for path, reference_item in reference_items.items():
+                if path not in items:
+                    removed.extend(reference.subtree(reference_item))
+
+        return sorted(added), sorted(removed), sorted(modified)
+
+
+class FileSnapshot(object):
+    """Snapshot of the files of a project shared by several checks.
+
+    The project is scanned only once and the resulting L{Files} object
+    is returned as long as the project tree does not change. A change
+    is detected through the modification time of the directories seen
+    during the last scan (adding, removing or renaming an entry updates
+    the modification time of its parent directory), or of the archive
+    of the project. A new scan can also be forced with L{refresh}. The
+    options are passed to L{Files} for each scan.
+
+    """
+
+    def __init__(self, project_path, **options):
+        from checkproject.source import open_source
+        import threading
+
+        self.source = open_source(project_path)
+        self.root = self.source.root
+        self.options = options
+        self._files = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _directories_signature(self, files):
+        """Compute the signature of the directories of a scan.
+
+        @return: The signature (see L{checkproject.source.ProjectSource}),
+        or None if the project cannot be reached anymore.
+
+        """
+        return self.source.signature(_file[0] for _file in files.files
+                                     if _file[1] == 'd')
+
+    def refresh(self):
+        """Force a new scan of the project.
+
+        @return: The L{Files} object of the new scan.
+
+        """
+        with self._lock:
+            files = Files(self.source, **self.options)
+            self._signature = self._directories_signature(files)
+            self._files = files
+            return files
+
+    def get(self):
+        """Get the files of the project, scanning it again only if it
+        changed since the last scan.
+
+        @return: A L{Files} object up-to-date with the project tree.
+
+        """
+        with self._lock:
+            files = self._files
+            if files is not None and \
+               self._signature is not None and \
+               self._signature == self._directories_signature(files):
+                return files
+        return self.refresh()
+
+    def close(self):
+        """Release the resources of the source of the project (the files
+        extracted from an archive)."""
+        self.source.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8
+"""Fixtures shared by all the checks of a run.
+
+A fixture is a function of the project path declared with the
+L{fixture} decorator (usually in a check module). It is computed once
+per run, the first time a check asks for it with
+C{CheckCase.fixture(name)}, and the same value is given to all the
+checks of the run. A fixture written as a generator yields its value,
+and the code after the 'yield' is executed at the end of the run, even
+if the checks failed. The check classes run in worker processes (see
+L{checkproject.runner.CheckRunner}) cannot share the fixtures of the
+run: the fixtures are then computed and finalized for each class, and a
+warning is written the first time. For example::
+
+    @fixture
+    def scratch(project_path):
+        path = tempfile.mkdtemp()
+        shutil.copytree(project_path, os.path.join(path, 'project'))
+        yield os.path.join(path, 'project')
+        shutil.rmtree(path)
+
+"""
+
+# Fixtures declared in the process: name -> function
+_FIXTURES = {}
+
+# Fixtures whose downgrade to a single check class was already reported
+_DOWNGRADED = set()
+
+
+def fixture(function=None, name=None):
+    """Decorator declaring a fixture.
+
+    @param function: The function computing the fixture from the path
+    of the project.
+
+    @param name: The name of the fixture (default to the name of the
+    function).
+
+    """
+    def declare(function):
+        _FIXTURES[name or function.__name__] = function
+        return function
+
+    if function is None:
+        return declare
+    return declare(function)
+
+
+class FixtureManager(object):
+    """Holder of the fixtures computed for a run on a project."""
+
+    def __init__(self, project_path, reason=None):
+        """Constructor of the holder.
+
+        @param project_path: The path of the project.
+
+        @param reason: Why the fixtures are held for a single check class
+        instead of the whole run (reported on the standard error the
+        first time each fixture is computed), None for a run.
+
+        """
+        import threading
+
+        self.project_path = project_path
+        self.reason = reason
+        self._values = {}
+        self._generators = []
+        self._lock = threading.RLock()
+
+    def get(self, name):
+        """Get the value of a fixture, computing it if needed.
+
+        @param name: The name of the fixture.
+
+        @return: The value of the fixture.
+
+        """
+        import sys
+        import types
+
+        with self._lock:
+            if name not in self._values:
+                try:
+                    function = _FIXTURES[name]
+                except KeyError:
+                    raise LookupError('unknown fixture: ' + name)
+                if self.reason is not None and name not in _DOWNGRADED:
+                    _DOWNGRADED.add(name)
+                    sys.stderr.write('warning: fixture %s computed for each '
+                                     'check class (%s)\n' % (name,
+                                                             self.reason))
+                value = function(self.project_path)
+                if isinstance(value, types.GeneratorType):
+                    generator = value
+                    value = next(generator)
+                    self._generators.append(generator)
+                self._values[name] = value
+            return self._values[name]
+
+    def teardown(self):
+        """Finalize all the fixtures computed, in the reverse order.
+
+        @return: The list of the exceptions raised while finalizing the
+        fixtures.
+
+        """
+        errors = []
+        with self._lock:
+            while self._generators:
+                generator = self._generators.pop()
+                try:
+                    next(generator)
+                except StopIteration:
+                    pass
+                except Exception as exception:
+                    errors.append(exception)
+            self._values.clear()
+        return errors
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Persistent cache of the hashes of the content of files.
+
+The hashes are stored in a SQLite database and are keyed by the path,
+the size and the modification time of the file. So, hashing a file
+which did not change since the last time reads nothing but its status.
+
+"""
+
+# Cache used by default in the current process: (pid, cache)
+_DEFAULT_CACHE = (None, None)
+
+
+def default_cache():
+    """Get the hash cache used by default, stored in the cache directory
+    (see L{checkproject.utils.cache_dir}). A new connection is opened in
+    each process.
+
+    @return: A L{HashCache} object.
+
+    """
+    global _DEFAULT_CACHE
+    import os
+    from checkproject.utils import cache_dir
+
+    pid, cache = _DEFAULT_CACHE
+    if pid != os.getpid():
+        cache = HashCache(os.path.join(cache_dir(), 'hashes.sqlite'))
+        _DEFAULT_CACHE = (os.getpid(), cache)
+
+    return cache
+
+
+class HashCache(object):
+    """Cache of the content hashes of files (SHA-1 hexadecimal digests)."""
+
+    # Number of new hashes to wait for before committing them
+    commit_interval = 256
+
+    def __init__(self, path=':memory:'):
+        """Open (or create) a hash cache.
+
+        @param path: Path to the SQLite database (default to a cache
+        in memory).
+
+        """
+        import sqlite3
+        import threading
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS hashes '
+                         '(path TEXT PRIMARY KEY, size INTEGER, '
+                         'mtime INTEGER, hash TEXT)')
+        self._db.commit()
+
+    def hash_file(self, path):
+        """Get the hash of the content of a file, reading it only if it
+        is not known for its current size and modification time.
+
+        @param path: Path to the file.
+
+        @return: The hexadecimal digest of the content of the file.
+
+        """
+        import os
+
+        path = os.path.abspath(path)
+        status = os.stat(path)
+        return self.hash_entry(path, status.st_size, status.st_mtime_ns,
+                               lambda: hash_content(path))
+
+    def hash_entry(self, key, size, mtime, compute):
+        """Get the hash of some content identified by a key (a path, or
+        the path of an archive and of one of its members), computing it
+        only if it is not known for the given size and modification time.
+
+        @param key: The key of the content.
+
+        @param size: The size of the content.
+
+        @param mtime: The modification time of the content (in ns).
+
+        @param compute: Function computing the hash of the content.
+
+        @return: The hexadecimal digest of the content.
+
+        """
+        with self._lock:
+            row = self._db.execute('SELECT size, mtime, hash FROM hashes '
+                                   'WHERE path = ?', (key,)).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime:
+            return row[2]
+
+        digest = compute()
+
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO hashes VALUES '
+                             '(?, ?, ?, ?)', (key, size, mtime, digest))
+            self._pending += 1
+            if self._pending >= self.commit_interval:
+                self._db.commit()
+                self._pending = 0
+
+        return digest
+
+    def flush(self):
+        """Write the new hashes to the database."""
+        with self._lock:
+            if self._pending:
+                self._db.commit()
+                self._pending = 0
+
+    def close(self):
+        """Write the new hashes and close the database."""
+        self.flush()
+        self._db.close()
+
+
+def hash_stream(stream):
+    """Compute the hash of the content of an open binary file.
+
+    @param stream: The file object, read until its end.
+
+    @return: The hexadecimal SHA-1 digest of the content.
+
+    """
+    import hashlib
+
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: stream.read(65536), b''):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def hash_content(path):
+    """Compute the hash of the content of a file.
+
+    @param path: Path to the file.
+
+    @return: The hexadecimal SHA-1 digest of the content of the file.
+
+    """
+    with open(path, 'rb') as _file:
+        return hash_stream(_file)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8
+"""Running programs under valgrind memcheck and gathering its errors.
+
+Each test of a program (its arguments and its standard input) is run
+under valgrind writing its report in XML, the tests being run
+concurrently by a pool of workers. The reports are parsed incrementally
+(in constant memory, whatever the number of errors) into
+L{MemcheckError} records, and the same error found by several tests is
+reported once with the names of these tests. For example, in a check method::
+
+    memcheck = Memcheck(['./project'], cwd=self.directory())
+    results = memcheck.run([('one', ['1'], None), ('eof', ['-i'], b'')])
+    report(self, merge_errors(results))
+
+When valgrind is not installed, the reports recorded in a directory
+(C{<name>.xml} for each test) can be parsed instead, so that the checks
+can be written and tested without valgrind.
+
+"""
+
+# Command of valgrind
+VALGRIND = 'valgrind'
+
+# Default options of valgrind
+OPTIONS = ('--leak-check=full',
+           '--show-leak-kinds=definite,indirect,possible',
+           '--child-silent-after-fork=yes', '--num-callers=12')
+
+# Severity of each kind of error ('error', 'warning' or None to ignore
+# it); the kinds not listed here are errors
+SEVERITIES = {
+    'Leak_DefinitelyLost': 'error',
+    'Leak_IndirectlyLost': 'warning',
+    'Leak_PossiblyLost': 'warning',
+    'Leak_StillReachable': None,
+}
+
+# Number of frames of the stack identifying an error
+KEY_FRAMES = 4
+
+
+class MemcheckError(object):
+    """Error found by memcheck.
+
+    Attributes:
+      - C{kind}: the kind of the error (C{'InvalidRead'},
+        C{'UninitCondition'}, C{'Leak_DefinitelyLost'}, ...).
+      - C{what}: the description of the error by valgrind.
+      - C{frames}: the stack of the error, a tuple of C{(function, file,
+        line, object)} tuples (the missing fields are None).
+      - C{count}: the number of times the error was found.
+      - C{leaked}: the number of bytes leaked (for the leaks).
+      - C{tests}: the names of the tests finding the error.
+
+    """
+
+    __slots__ = ('kind', 'what', 'frames', 'count', 'leaked', 'tests')
+
+    def __init__(self, kind, what, frames, count=1, leaked=0, tests=()):
+        self.kind = kind
+        self.what = what
+        self.frames = frames
+        self.count = count
+        self.leaked = leaked
+        self.tests = list(tests)
+
+    def __reduce__(self):
+        return (MemcheckError, (self.kind, self.what, self.frames,
+                                self.count, self.leaked, self.tests))
+
+    def __repr__(self):
+        return 'MemcheckError(%r, %r)' % (self.kind, self.location())
+
+    def is_leak(self):
+        """Tell if the error is a memory leak."""
+        return self.kind.startswith('Leak_')
+
+    def key(self):
+        """Key identifying the same error in several reports (the leaked
+        sizes are ignored)."""
+        return (self.kind,) + tuple(frame[:3]
+                                    for frame in self.frames[:KEY_FRAMES])
+
+    def location(self):
+        """Get the location of the error in the code of the program: the
+        first frame with a source file outside of a shared library.
+
+        @return: A string 'file:line (function)', or None.
+
+        """
+        frames = [frame for frame in self.frames if frame[1] is not None]
+        for frame in frames:
+            if frame[3] is None or '.so' not in frame[3]:
+                break
+        else:
+            if not frames:
+                return None
+            frame = frames[0]
+        return '%s:%s (%s)' % (frame[1], frame[2], frame[0])
+
+    def describe(self):
+        """Describe the error in one line."""
+        what = self.what
+        if self.is_leak():
+            what = '%s: %d bytes' % (self.kind[5:], self.leaked)
+        description = what
+        location = self.location()
+        if location is not None:
+            description += ' at ' + location
+        if self.tests:
+            description += ' [tests: %s]' % ', '.join(self.tests)
+        return description
+
+
+def _frames(error):
+    """Get the frames of the (first) stack of an error element."""
+    stack = error.find('stack')
+    if stack is None:
+        return ()
+    frames = []
+    for frame in stack.iterfind('frame'):
+        line = frame.findtext('line')
+        frames.append((frame.findtext('fn'), frame.findtext('file'),
+                       int(line) if line else None, frame.findtext('obj')))
+    return tuple(frames)
+
+
+def parse_xml(source, test=None):
+    """Parse an XML report of memcheck incrementally.
+
+    A truncated report (the program was killed) gives the errors found
+    before its end.
+
+    @param source: The path of the report or a binary file object.
+
+    @param test: The name of the test of the report.
+
+    @return: An iterator over the L{MemcheckError} of the report.
+
+    """
+    import xml.etree.ElementTree as ElementTree
+
+    tests = (test,) if test is not None else ()
+    root = None
+    try:
+        for event, element in ElementTree.iterparse(source,
+                                                    events=('start', 'end')):
+            if root is None:
+                root = element
+            if event != 'end' or element.tag != 'error':
+                continue
+
+            leaked = element.findtext('xwhat/leakedbytes')
+            yield MemcheckError(element.findtext('kind') or 'Unknown',
+                                element.findtext('what') or
+                                element.findtext('xwhat/text') or '',
+                                _frames(element),
+                                leaked=int(leaked) if leaked else 0,
+                                tests=tests)
+            # Drop the parsed errors to parse in constant memory
+            root.clear()
+    except ElementTree.ParseError:
+        pass
+
+
+def merge_errors(errors):
+    """Merge the same errors found by several tests (or several times).
+
+    @param errors: An iterable of L{MemcheckError}, or of
+    L{MemcheckResult} whose errors are merged.
+
+    @return: The list of the merged errors, in the order they were first
+    found.
+
+    """
+    merged = {}
+    for error in errors:
+        if isinstance(error, MemcheckResult):
+            for record in merge_errors(error.errors):
+                _merge(merged, record)
+        else:
+            _merge(merged, error)
+    return list(merged.values())
+
+
+def _merge(merged, error):
+    """Merge an error into a dictionary of errors by key."""
+    key = error.key()
+    known = merged.get(key)
+    if known is None:
+        merged[key] = MemcheckError(error.kind, error.what, error.frames,
+                                    error.count, error.leaked, error.tests)
+        return
+    known.count += error.count
+    known.leaked = max(known.leaked, error.leaked)
+    for test in error.tests:
+        if test not in known.tests:
+            known.tests.append(test)
+
+
+class MemcheckResult(object):
+    """Result of a test run under memcheck.
+
+    Attributes:
+      - C{name}: the name of the test.
+      - C{command}: the L{checkproject.command.CommandResult} of the run
+        (None if the report was recorded).
+      - C{errors}: the list of the L{MemcheckError} found.
+
+    """
+
+    def __init__(self, name, command, errors):
+        self.name = name
+        self.command = command
+        self.errors = errors
+
+    def __repr__(self):
+        return '<MemcheckResult %s: %d errors>' % (self.name,
+                                                   len(self.errors))
+
+
+class Memcheck(object):
+    """Runner of the tests of a program under memcheck."""
+
+    def __init__(self, args, cwd=None, jobs=None, valgrind=VALGRIND,
+                 options=OPTIONS, recorded=None, **command_options):
+        """Constructor of the runner.
+
+        @param args: The command line of the program.
+
+        @param cwd: Working directory of the program.
+
+        @param jobs: Number of tests run concurrently (default to the
+        number of processors).
+
+        @param valgrind: The command of valgrind.
+
+        @param options: Options of valgrind.
+
+        @param recorded: Directory of recorded reports used when
+        valgrind is not installed (C{<name>.xml} for each test).
+
+        @param command_options: Options of
+        L{checkproject.command.run_command} (C{timeout}, C{memory}, ...).
+
+        """
+        import os
+
+        self.args = list(args)
+        self.cwd = cwd
+        self.jobs = jobs or os.cpu_count() or 1
+        self.valgrind = valgrind
+        self.options = list(options)
+        self.recorded = recorded
+        self.command_options = command_options
+
+    def available(self):
+        """Tell if valgrind is installed."""
+        import shutil
+
+        return shutil.which(self.valgrind) is not None
+
+    def run_test(self, name, args=(), input=None, timeout=None):
+        """Run a test of the program under memcheck.
+
+        @param name: The name of the test.
+
+        @param args: The arguments added to the command line.
+
+        @param input: Bytes sent to the standard input of the program.
+
+        @param timeout: Time budget of the test (in seconds), if shorter
+        than the C{timeout} of the command options.
+
+        @return: A L{MemcheckResult} object.
+
+        """
+        from checkproject.command import run_command
+        import os
+        import tempfile
+
+        if self.recorded is not None and not self.available():
+            path = os.path.join(self.recorded, name + '.xml')
+            return MemcheckResult(name, None, list(parse_xml(path, name)))
+
+        options = dict(self.command_options)
+        if timeout is not None:
+            options['timeout'] = min(timeout, options.get('timeout') or
+                                     timeout)
+
+        descriptor, path = tempfile.mkstemp(prefix='memcheck-',
+                                            suffix='.xml')
+        os.close(descriptor)
+        try:
+            command = run_command([self.valgrind, '--xml=yes',
+                                   '--xml-file=' + path] + self.options +
+                                  self.args + list(args),
+                                  cwd=self.cwd, input=input, **options)
+            errors = list(parse_xml(path, name))
+        finally:
+            os.remove(path)
+
+        return MemcheckResult(name, command, errors)
+
+    def run(self, tests):
+        """Run tests of the program under memcheck concurrently.
+
+        @param tests: An iterable of C{(name, args, input)} tuples (see
+        L{run_test}).
+
+        The tests run by the worker threads are bounded by the deadline of
+        the calling thread (see L{checkproject.watchdog}), and the tests
+        not started yet are cancelled when the check is interrupted.
+
+        @return: The list of the L{MemcheckResult}, in the order of the
+        tests.
+
+        """
+        from checkproject.watchdog import remaining
+        from concurrent.futures import ThreadPoolExecutor
+        import time
+
+        tests = list(tests)
+        if len(tests) <= 1 or self.jobs == 1:
+            return [self.run_test(*test) for test in tests]
+
+        deadline = remaining()
+        if deadline is not None:
+            deadline += time.monotonic()
+
+        def run_test(name, args=(), input=None):
+            if deadline is None:
+                return self.run_test(name, args, input)
+            return self.run_test(name, args, input,
+                                 max(deadline - time.monotonic(), 0))
+
+        pool = ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            futures = [pool.submit(run_test, *test) for test in tests]
+            results = [future.result() for future in futures]
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return results
+
+
+def report(check, errors, hidden=False, severities=None):
+    """Record memory errors as errors or warnings of a check.
+
+    @param check: The running L{checkproject.case.CheckCase}.
+
+    @param errors: The L{MemcheckError} to record (see L{merge_errors}).
+
+    @param hidden: Tell if the records are hidden to the student.
+
+    @param severities: Severity of each kind of error, overriding the
+    default ones (see L{SEVERITIES}).
+
+    @return: True if no error or warning was recorded.
+
+    """
+    table = dict(SEVERITIES, **(severities or {}))
+    clean = True
+    for error in errors:
+        severity = table.get(error.kind, 'error')
+        if severity is None:
+            continue
+        clean = False
+        getattr(check, severity)(False, error.describe(), hidden=hidden)
+    return clean
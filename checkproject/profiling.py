@@ -0,0 +1,157 @@
+# -*- coding: utf-8
+"""Profiling of the time and memory spent by the checks.
+
+The runner and the check cases record a sample for each step of the
+run: import of the check modules, instantiation of the check classes,
+and 'setup()', check method and 'teardown()' of each check. Each sample
+holds the wall-clock time, the CPU time of the process and the peak of
+memory allocated by Python during the step (with tracemalloc).
+
+"""
+
+
+class Sample(object):
+    """Measure of a step of the run.
+
+    Attributes:
+      - C{kind}: the kind of step (C{'import'}, C{'instantiate'},
+        C{'setup'}, C{'check'} or C{'teardown'}).
+      - C{name}: the name of the module, class or method.
+      - C{wall}: the wall-clock time (in seconds).
+      - C{cpu}: the CPU time of the process (in seconds).
+      - C{memory}: the peak of memory allocated during the step, above
+        the memory allocated at its start (in bytes, or None).
+
+    """
+
+    __slots__ = ('kind', 'name', 'wall', 'cpu', 'memory')
+
+    def __init__(self, kind, name, wall, cpu, memory=None):
+        self.kind = kind
+        self.name = name
+        self.wall = wall
+        self.cpu = cpu
+        self.memory = memory
+
+    def as_dict(self):
+        """Returns the fields of the sample as a dictionary."""
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+
+class Profiler(object):
+    """Collector of the samples of a run.
+
+    Note that the CPU time and the memory are measured for the whole
+    process, so steps run concurrently in threads are mixed up.
+
+    """
+
+    def __init__(self, memory=True, cprofile_dir=None):
+        """Initialize the profiler.
+
+        @param memory: Trace the memory allocations (slows down the
+        checks).
+
+        @param cprofile_dir: Directory where to dump the statistics of
+        cProfile for each check method (no cProfile capture if None).
+
+        """
+        import os
+        import threading
+
+        self.memory = memory
+        self.cprofile_dir = cprofile_dir
+        self.samples = []
+        self._lock = threading.Lock()
+
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if cprofile_dir is not None and not os.path.isdir(cprofile_dir):
+            os.makedirs(cprofile_dir)
+
+    def measure(self, kind, name):
+        """Measure a step of the run (to be used in a 'with' statement).
+
+        @param kind: The kind of step.
+
+        @param name: The name of the module, class or method.
+
+        """
+        import contextlib
+
+        @contextlib.contextmanager
+        def measure():
+            import os
+            import time
+
+            profile = None
+            if self.cprofile_dir is not None and kind == 'check':
+                import cProfile
+                profile = cProfile.Profile()
+
+            if self.memory:
+                import tracemalloc
+                start_memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            if profile is not None:
+                profile.enable()
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+                wall = time.perf_counter() - start_wall
+                cpu = time.process_time() - start_cpu
+                memory = None
+                if self.memory:
+                    memory = max(0, tracemalloc.get_traced_memory()[1] -
+                                 start_memory)
+                if profile is not None:
+                    profile.dump_stats(os.path.join(self.cprofile_dir,
+                                                    name + '.prof'))
+                with self._lock:
+                    self.samples.append(Sample(kind, name, wall, cpu, memory))
+
+        return measure()
+
+    def table(self, limit=None):
+        """Build a table of the samples ranked by decreasing wall-clock
+        time.
+
+        @param limit: Maximum number of samples in the table.
+
+        @return: The table as a string.
+
+        """
+        samples = sorted(self.samples, key=lambda sample: -sample.wall)
+        if limit is not None:
+            samples = samples[:limit]
+
+        lines = ['%10s %10s %12s  %-11s %s' % ('wall (s)', 'cpu (s)',
+                                               'memory (kB)', 'kind', 'name')]
+        for sample in samples:
+            memory = '-'
+            if sample.memory is not None:
+                memory = '%.1f' % (sample.memory / 1024.0)
+            lines.append('%10.4f %10.4f %12s  %-11s %s' %
+                         (sample.wall, sample.cpu, memory, sample.kind,
+                          sample.name))
+
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """Write the raw samples to a file in JSON.
+
+        @param path: Path to the file.
+
+        """
+        import json
+
+        with open(path, 'w') as _file:
+            json.dump([sample.as_dict() for sample in self.samples], _file,
+                      indent=1)
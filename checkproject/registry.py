@@ -0,0 +1,107 @@
+# -*- coding: utf-8
+"""Registry of the check modules loaded in the current process.
+
+Each check module is loaded only once per process and reloaded only if
+its source file changed. The check classes found in each module are
+cached as well (the check methods are cached by the classes themselves,
+see L{checkproject.case.CheckCase.method_table}).
+
+"""
+
+# Registry used by default in the current process
+_DEFAULT_REGISTRY = None
+
+
+def default_registry():
+    """Get the registry shared by all the runners of the process.
+
+    @return: A L{CheckRegistry} object.
+
+    """
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = CheckRegistry()
+    return _DEFAULT_REGISTRY
+
+
+class CheckRegistry(object):
+    """A cache of the check modules, classes and methods."""
+
+    def __init__(self):
+        import threading
+
+        # Loaded modules: path -> (signature, module, {pattern: classes})
+        self._modules = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _signature(module_path):
+        """Get the signature of the source file of a module."""
+        import os
+
+        status = os.stat(module_path)
+        return (status.st_mtime_ns, status.st_size)
+
+    def _entry(self, module_path):
+        """Get the cache entry of a module, loading it if needed."""
+        from checkproject.runner import import_module
+        import os
+
+        module_path = os.path.abspath(module_path)
+        signature = self._signature(module_path)
+
+        with self._lock:
+            entry = self._modules.get(module_path)
+            if entry is None or entry[0] != signature:
+                entry = (signature, import_module(module_path), {})
+                self._modules[module_path] = entry
+            return entry
+
+    def module(self, module_path):
+        """Get a check module, loading it only if it is not loaded yet or
+        if its source file changed since it was loaded.
+
+        @param module_path: Path to the Python file of the module.
+
+        @return: The module.
+
+        """
+        return self._entry(module_path)[1]
+
+    def classes(self, module_path, pattern='Check*'):
+        """Get the check classes defined in a check module.
+
+        @param module_path: Path to the Python file of the module.
+
+        @param pattern: Regular expression searched in the name of the
+        classes.
+
+        @return: The list of the check classes sorted by name.
+
+        """
+        from checkproject.case import CheckCase
+        import re
+
+        _, module, classes = self._entry(module_path)
+
+        with self._lock:
+            if pattern not in classes:
+                regexp = re.compile(pattern)
+                classes[pattern] = [
+                    obj for name, obj in sorted(vars(module).items())
+                    if isinstance(obj, type) and issubclass(obj, CheckCase)
+                    and obj is not CheckCase and regexp.search(name)]
+            return list(classes[pattern])
+
+    def methods(self, cls, pattern='check_.*'):
+        """Get the check methods of a check class in execution order.
+
+        @param cls: The check class.
+
+        @param pattern: Regular expression searched in the name of the
+        methods.
+
+        @return: The list of the names of the check methods.
+
+        """
+        return [method.name for method in cls.method_table(pattern)]
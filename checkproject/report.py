@@ -0,0 +1,201 @@
+# -*- coding: utf-8
+"""Reporters receiving the events of the checks as they happen.
+
+The events are sent by the runner and the check cases in this order:
+C{run_start}, then for each check class C{class_start}, C{method_start}
+and C{method_end} for each check method (with C{failure} if the method
+raised a failure), C{class_end}, and finally C{run_end}.
+
+"""
+
+
+# Outcomes of a check method, from the best to the worst
+OUTCOMES = ('success', 'warning', 'error', 'failure')
+
+
+def outcome(records):
+    """Get the outcome of a check method from its records (the severity
+    of its worst record, C{'success'} if it has no record).
+
+    @param records: The L{checkproject.result.CheckRecord} of the method.
+
+    @return: One of the L{OUTCOMES}.
+
+    """
+    worst = 0
+    for record in records:
+        worst = max(worst, OUTCOMES.index(record.severity))
+    return OUTCOMES[worst]
+
+
+class Reporter(object):
+    """Base class of the reporters, ignoring all the events."""
+
+    def for_project(self, project):
+        """Get the reporter receiving the events of a project when the
+        events of several projects are interleaved (batch mode).
+
+        @return: A reporter (this one by default).
+
+        """
+        return self
+
+    def run_start(self, project):
+        """Called before running the checks on a project."""
+        pass
+
+    def class_start(self, check):
+        """Called before running the check methods of a check class."""
+        pass
+
+    def method_start(self, check):
+        """Called before running a check method."""
+        pass
+
+    def method_end(self, check, outcome, duration, records, replayed=False):
+        """Called after running a check method.
+
+        @param check: Name of the check method.
+
+        @param outcome: Outcome of the method (see L{OUTCOMES}).
+
+        @param duration: Time spent in the method (in seconds).
+
+        @param records: The L{checkproject.result.CheckRecord} of the
+        method.
+
+        @param replayed: True if the method has not been run but its
+        stored result replayed.
+
+        """
+        pass
+
+    def failure(self, check):
+        """Called when a check method raised a failure stopping the checks."""
+        pass
+
+    def class_end(self, check):
+        """Called after running the check methods of a check class."""
+        pass
+
+    def run_end(self, project, result):
+        """Called after running the checks on a project.
+
+        @param result: The L{checkproject.result.CheckResult} of the run.
+
+        """
+        pass
+
+
+class JSONLinesReporter(Reporter):
+    """Reporter writing each event as a JSON object on its own line.
+
+    Each object holds the name of the event (C{'event'}), its time stamp
+    (C{'time'}) and the arguments of the event. The stream is flushed
+    after each event so that the report can be read while it is written.
+    In batch mode, the events of each project also hold the path of the
+    project (C{'project'}).
+
+    """
+
+    def __init__(self, stream, project=None, lock=None):
+        import threading
+
+        self.stream = stream
+        self.project = project
+        self._lock = lock or threading.Lock()
+
+    def for_project(self, project):
+        return JSONLinesReporter(self.stream, project, self._lock)
+
+    def write(self, event, **data):
+        """Write an event to the stream."""
+        import json
+        import time
+
+        data['event'] = event
+        data['time'] = time.time()
+        if self.project is not None:
+            data.setdefault('project', self.project)
+        line = json.dumps(data, sort_keys=True, default=repr)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def run_start(self, project):
+        self.write('run_start', project=project)
+
+    def class_start(self, check):
+        self.write('class_start', check=check)
+
+    def method_start(self, check):
+        self.write('method_start', check=check)
+
+    def method_end(self, check, outcome, duration, records, replayed=False):
+        self.write('method_end', check=check, outcome=outcome,
+                   duration=duration, replayed=replayed,
+                   records=[record.as_dict() for record in records])
+
+    def failure(self, check):
+        self.write('failure', check=check)
+
+    def class_end(self, check):
+        self.write('class_end', check=check)
+
+    def run_end(self, project, result):
+        self.write('run_end', project=project, scores=result.scores)
+
+
+class QueueReporter(Reporter):
+    """Reporter of a worker process sending the events to a queue, to be
+    forwarded by the main process to its reporter (see L{forward}).
+
+    Each item of the queue is a tuple C{(project, event, arguments)}.
+
+    """
+
+    def __init__(self, queue, project):
+        self.queue = queue
+        self.project = project
+
+    def _send(self, event, *arguments):
+        self.queue.put((self.project, event, arguments))
+
+    def run_start(self, project):
+        self._send('run_start', project)
+
+    def class_start(self, check):
+        self._send('class_start', check)
+
+    def method_start(self, check):
+        self._send('method_start', check)
+
+    def method_end(self, check, outcome, duration, records, replayed=False):
+        self._send('method_end', check, outcome, duration, list(records),
+                   replayed)
+
+    def failure(self, check):
+        self._send('failure', check)
+
+    def class_end(self, check):
+        self._send('class_end', check)
+
+    def run_end(self, project, result):
+        self._send('run_end', project, result)
+
+
+def forward(queue, reporter):
+    """Forward the events of a queue filled by L{QueueReporter} objects to
+    a reporter, until a None item is received.
+
+    @param queue: The queue of the events.
+
+    @param reporter: The L{Reporter} receiving the events.
+
+    """
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        project, event, arguments = item
+        getattr(reporter.for_project(project), event)(*arguments)
@@ -3,41 +3,158 @@
 """Check result object used to transfert the results of the checks
 from one check to another all along the checks."""
 
+# Severities of the records
+SUCCESS = 'success'
+WARNING = 'warning'
+ERROR = 'error'
+FAILURE = 'failure'
+
+
+class CheckRecord(object):
+    """Record of a single outcome of a check.
+
+    Attributes:
+      - C{check}: name of the check method which produced the outcome
+        (or None if unknown).
+      - C{severity}: one of C{SUCCESS}, C{WARNING}, C{ERROR} or
+        C{FAILURE}.
+      - C{hidden}: True if the outcome is hidden to the student.
+      - C{message}: explanation of the fail (or None).
+      - C{duration}: time elapsed since the start of the check method
+        (in seconds, or None).
+      - C{index}: rank of the outcome among the ones of the same check.
+
+    """
+
+    __slots__ = ('check', 'severity', 'hidden', 'message', 'duration',
+                 'index')
+
+    def __init__(self, check, severity, hidden=False, message=None,
+                 duration=None, index=0):
+        self.check = check
+        self.severity = severity
+        self.hidden = hidden
+        self.message = message
+        self.duration = duration
+        self.index = index
+
+    def __reduce__(self):
+        return (CheckRecord, self.as_tuple())
+
+    def __eq__(self, other):
+        return isinstance(other, CheckRecord) and \
+            self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return 'CheckRecord%r' % (self.as_tuple(),)
+
+    def key(self):
+        """Returns the key ordering the records of merged results."""
+        return (self.check or '', self.index)
+
+    def as_tuple(self):
+        """Returns the fields of the record as a tuple."""
+        return (self.check, self.severity, self.hidden, self.message,
+                self.duration, self.index)
+
+    def as_dict(self):
+        """Returns the fields of the record as a dictionary."""
+        return dict(zip(self.__slots__, self.as_tuple()))
+
+
 class CheckResult(object):
     """Holder for check result information.
 
     Check results are automatically managed by the CheckCase class,
     and do not need to be explicitely manipulated by check writers.
 
-    Each instance of CheckResult holds the total number of checks that
-    have been run, and collections of errors, warnings and failures
-    that occurred among these checks.
+    Each instance of CheckResult holds the records (see L{CheckRecord})
+    of all the outcomes of the checks that have been run, from which
+    are computed the scores and the collections of errors, warnings
+    and failures that occurred among these checks.
+
+    Results computed separately (in different threads or processes)
+    are combined with L{merge}, which keeps the records grouped by
+    check.
     """
 
-    def __init__(self):
-        self.scores = {'successes': 0, 'hidden_successes': 0,
-                       'warnings': 0, 'hidden_warnings': 0,
-                       'errors': 0, 'hidden_errors': 0,
-                       'failed': False}
+    def __init__(self, records=None):
+        # Records grouped by check, in the order the checks were first
+        # recorded (or merged)
+        self._checks = {}
+        # Number of records of each check
+        self._counts = {}
+        # Number of records of each (severity, hidden) pair
+        self._scores = {}
+        # Flattened list of the records (built when read)
+        self._records = None
+        self._failed = False
+        for record in records or []:
+            self._append(record)
+
+    def _append(self, record):
+        """Append a record to the bucket of its check."""
+        self._checks.setdefault(record.check, []).append(record)
+        self._counts[record.check] = max(self._counts.get(record.check, 0),
+                                         record.index + 1)
+        score = (record.severity, record.hidden)
+        self._scores[score] = self._scores.get(score, 0) + 1
+        if record.severity == FAILURE:
+            self._failed = True
+        self._records = None
+
+    @property
+    def records(self):
+        """The list of all the L{CheckRecord}, grouped by check."""
+        if self._records is None:
+            self._records = [record for bucket in self._checks.values()
+                             for record in bucket]
+        return self._records
+
+    def __getstate__(self):
+        return [record.as_tuple() for record in self.records]
+
+    def __setstate__(self, state):
+        self.__init__([CheckRecord(*fields) for fields in state])
+
+    def add(self, severity, result=None, hidden=False, check=None,
+            duration=None):
+        """Add a record to the results.
+
+        @param severity: Severity of the record.
 
-        self.warning_results = []
-        self.hidden_warning_results = []
-        self.error_results = []
-        self.hidden_error_results = []
-        self.failure_results = []
+        @param result: Explanation of the fail.
+
+        @param hidden: Hide the result if True, show it otherwise.
+
+        @param check: Name of the check method.
+
+        @param duration: Time elapsed since the start of the check.
+
+        @return: The new L{CheckRecord}.
+
+        """
+        record = CheckRecord(check, severity, hidden, result, duration,
+                             self._counts.get(check, 0))
+        self._append(record)
+        return record
 
-    def add_success(self, hidden=False):
+    def add_success(self, hidden=False, check=None, duration=None):
         """Record a successful score to the results.
 
         @param hidden: Hide the result if True, show it otherwise.
 
         """
-        if not hidden:
-            self.scores['successes'] += 1
-        else:
-            self.scores['hidden_successes'] += 1
+        self.add(SUCCESS, None, hidden, check, duration)
 
-    def add_warning(self, result=None, hidden=False):
+    def add_warning(self, result=None, hidden=False, check=None,
+                    duration=None):
         """Add a warning score and its data to the results.
 
         @param result: Explanation of the fail.
@@ -45,16 +162,9 @@ class CheckResult(object):
         @param hidden: Hide the result if True, show it otherwise.
 
         """
-        if not hidden:
-            self.scores['warnings'] += 1
-            if result is not None:
-                self.warning_results.append(result)
-        else:
-            self.scores['hidden_warnings'] += 1
-            if result is not None:
-                self.hidden_warning_results.append(result)
-
-    def add_error(self, result=None, hidden=False):
+        self.add(WARNING, result, hidden, check, duration)
+
+    def add_error(self, result=None, hidden=False, check=None, duration=None):
         """Add an error score and its data to the results.
 
         @param result: Explanation of the fail.
@@ -62,64 +172,128 @@ class CheckResult(object):
         @param hidden: Hide the result if True, show it otherwise.
 
         """
-        if not hidden:
-            self.scores['errors'] += 1
-            if result is not None:
-                self.error_results.append(result)
-        else:
-            self.scores['hidden_errors'] += 1
-            if result is not None:
-                self.hidden_error_results.append(result)
-
-    def add_failure(self, result=None):
+        self.add(ERROR, result, hidden, check, duration)
+
+    def add_failure(self, result=None, check=None, duration=None):
         """Add a failure score and its data to the results.
 
         @param result: Explanation of the fail.
 
         """
-        self.scores['failed'] = True
-        if result is not None:
-            self.failure_results.append(result)
+        self.add(FAILURE, result, False, check, duration)
+
+    def merge(self, other):
+        """Add the records of another result to this one, in time
+        proportional to the size of the other result. The merge
+        preserves the order of execution: the records stay grouped by
+        check, the records of each check ordered by their rank, and the
+        checks in the order they were first recorded (or merged). So the
+        merge is associative but not commutative: the results are to be
+        merged in the order their checks ran. The records are not
+        deduplicated: a result merged twice counts twice.
+
+        @param other: The CheckResult to merge into this one.
+
+        @return: This result.
+
+        """
+        for check, records in other._checks.items():
+            bucket = self._checks.get(check)
+            unordered = bool(bucket) and records and \
+                bucket[-1].index > records[0].index
+            for record in records:
+                self._append(record)
+            if unordered:
+                self._checks[check].sort(key=CheckRecord.key)
+
+        return self
+
+    def _count(self, severity, hidden):
+        """Count the records of a given severity and visibility."""
+        return self._scores.get((severity, hidden), 0)
+
+    def _messages(self, severity, hidden):
+        """Get the messages of the records of a given severity and
+        visibility."""
+        return [record.message for record in self.records
+                if record.severity == severity and record.hidden == hidden
+                and record.message is not None]
+
+    @property
+    def scores(self):
+        """Dictionary of the scores of the results."""
+        return {'successes': self.get_successes(),
+                'hidden_successes': self.get_hidden_successes(),
+                'warnings': self.get_warnings(),
+                'hidden_warnings': self.get_hidden_warnings(),
+                'errors': self.get_errors(),
+                'hidden_errors': self.get_hidden_errors(),
+                'failed': self.has_failed()}
+
+    @property
+    def warning_results(self):
+        """Messages of the warnings."""
+        return self._messages(WARNING, False)
+
+    @property
+    def hidden_warning_results(self):
+        """Messages of the hidden warnings."""
+        return self._messages(WARNING, True)
+
+    @property
+    def error_results(self):
+        """Messages of the errors."""
+        return self._messages(ERROR, False)
+
+    @property
+    def hidden_error_results(self):
+        """Messages of the hidden errors."""
+        return self._messages(ERROR, True)
+
+    @property
+    def failure_results(self):
+        """Messages of the failures."""
+        return self._messages(FAILURE, False)
 
     def get_successes(self):
         """Returns the number of successes"""
-        return self.scores['successes']
+        return self._count(SUCCESS, False)
 
     def get_hidden_successes(self):
         """Returns the number of hidden successes"""
-        return self.scores['hidden_successes']
+        return self._count(SUCCESS, True)
 
     def get_all_successes(self):
         """Returns the number of all successes"""
-        return self.scores['successes'] + self.scores['hidden_successes']
+        return self.get_successes() + self.get_hidden_successes()
 
     def get_warnings(self):
         """Returns the number of warnings"""
-        return self.scores['warnings']
+        return self._count(WARNING, False)
 
     def get_hidden_warnings(self):
         """Returns the number of hidden warnings"""
-        return self.scores['hidden_warnings']
+        return self._count(WARNING, True)
 
     def get_all_warnings(self):
         """Returns the number of all warnings"""
-        return self.scores['warnings'] + self.scores['hidden_warnings']
+        return self.get_warnings() + self.get_hidden_warnings()
 
     def get_errors(self):
         """Returns the number of errors"""
-        return self.scores['errors']
+        return self._count(ERROR, False)
 
     def get_hidden_errors(self):
         """Returns the number of hidden errors"""
-        return self.scores['hidden_errors']
+        return self._count(ERROR, True)
 
     def get_all_errors(self):
         """Returns the number of all errors"""
-        return self.scores['errors'] + self.scores['hidden_errors']
+        return self.get_errors() + self.get_hidden_errors()
 
     def has_failed(self):
         """Returns True if a failure occured during the checks"""
-        return self.scores['failed']
+        return self._failed
 
     def full_summary(self):
         """Returns a string with a complete summary of the results"""
@@ -3,41 +3,136 @@
 def import_module(module_path):
     """Import a Python file as a module in the current context.
 
+    The module is named after the whole path of the file (the check
+    modules of different directories may have the same name) and is not
+    registered in C{sys.modules}, so that each file gets its own module.
+
     @param module_path: Path to the Python file.
 
     @return: A reference to the module once loaded.
 
     """
+    from importlib.util import spec_from_file_location, module_from_spec
     import os
-    import sys
+    import re
 
-    module_filename = module_path.split(os.sep)[-1]
-    if int(sys.version[0]) >= 3:
-        if int(sys.version[2]) >= 5:
-            # Running a Python 3.5+ version
-            from importlib.util import spec_from_file_location, module_from_spec
-            spec = spec_from_file_location(module_filename, module_path)
-            module = module_from_spec(spec)
-            spec.loader.exec_module(module)
+    module_path = os.path.abspath(module_path)
+    module_name = 'checkproject_check_' + re.sub(r'\W', '_', module_path)
+    spec = spec_from_file_location(module_name, module_path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
-        else:
-            # Running a Python <= 3.4 version
-            from importlib.machinery import SourceFileLoader
-            module = SourceFileLoader(module_filename, module_path).load_module()
+
+def _module_name(check_module):
+    """Get the name of a check module from its path relative to the
+    checks directory ('project/check_01-runs' for example): the check
+    modules of different directories may have the same file name."""
+    import os
+
+    return os.path.splitext(check_module)[0].replace(os.sep, '/')
+
+
+def _instantiate_check(cls, project_dir, module_name, profiler=None):
+    """Instantiate a check class, measuring it with the profiler if any."""
+    if profiler is None:
+        return cls(project_dir)
+    with profiler.measure('instantiate', module_name + '.' + cls.__name__):
+        return cls(project_dir)
+
+
+def _prepare_check(check, module_name, module_path, snapshot=None,
+                   store=None, reporter=None, profiler=None, timeout=None,
+                   fixtures=None):
+    """Set up a check instance before running it."""
+    check.check_id = module_name + '.' + check.__class__.__name__
+    check.module_path = module_path
+    check.snapshot = snapshot
+    if store is not None:
+        from checkproject.hashcache import default_cache
+        check.store = store
+        check.fingerprint = default_cache().hash_file(module_path)
+    if reporter is not None:
+        check.reporter = reporter
+    check.profiler = profiler
+    check.default_timeout = timeout
+    check.fixtures = fixtures
+
+
+def _report_check(reporter, check_id, result):
+    """Send the events of a check class run in another process."""
+    from checkproject.report import outcome
+
+    reporter.class_start(check_id)
+    methods = []
+    for record in result.records:
+        if not methods or methods[-1][0] != record.check:
+            methods.append((record.check, []))
+        methods[-1][1].append(record)
+    for method, records in methods:
+        reporter.method_start(method)
+        reporter.method_end(method, outcome(records),
+                            max(record.duration or 0 for record in records),
+                            records)
+        if result.has_failed() and method == methods[-1][0]:
+            reporter.failure(method)
+    reporter.class_end(check_id)
+
+
+def _run_check(project_dir, module_name, module_path, class_name, pattern,
+               options):
+    """Run a single check class on a project with a new result (used to
+    run the checks of a stage in a pool of threads or processes).
+
+    @return: The result of the check class.
+
+    """
+    from checkproject.registry import default_registry
+    from checkproject.fixtures import FixtureManager
+    import sys
+
+    for cls in default_registry().classes(module_path, pattern):
+        if cls.__name__ == class_name:
+            break
     else:
-        # Running a Python 2 version
-        import imp
-        module = imp.load_source(module_filename, module_path)
+        raise LookupError('check class not found: ' + class_name)
+
+    # The fixtures of the run cannot be shared with another process:
+    # they are computed for this class only
+    own_fixtures = options.get('fixtures') is None
+    if own_fixtures:
+        options = dict(options, fixtures=FixtureManager(
+            project_dir, 'checks run in worker processes'))
+
+    check = _instantiate_check(cls, project_dir, module_name,
+                               options.get('profiler'))
+    _prepare_check(check, module_name, module_path, **options)
+    try:
+        return check.run()
+    finally:
+        if own_fixtures:
+            for error in options['fixtures'].teardown():
+                sys.stderr.write('warning: fixture teardown failed: %r\n' %
+                                 error)
 
-    return module
 
 class CheckRunner(object):
-    """A class to discover all the checks, run it sequentially and collect
-    all the results.
+    """A class to discover all the checks, run it and collect all the
+    results.
+
+    The checks are run sequentially by default. Otherwise, the checks are
+    grouped into stages: consecutive check modules of the same directory
+    sharing the same numeric prefix (C{check_NN-*.py}) are considered as
+    independent and their classes are run concurrently. The stages are
+    still run in order and a failure stops the following ones. The
+    fixtures (see L{checkproject.fixtures}) cannot be shared by check
+    classes run in worker processes: they are then computed once per
+    class instead of once per run (with a warning).
 
     """
 
-    def __init__(self, project_dir, checks_dir):
+    def __init__(self, project_dir, checks_dir, registry=None, store=None,
+                 reporter=None, profiler=None, timeout=None):
         """Initialize the default runner class.
 
         @param project_dir: Root directory where to find the source
@@ -46,10 +141,36 @@ class CheckRunner(object):
         @param checks_dir: Root directory where to find are all the
         checks.
 
+        @param registry: The L{checkproject.registry.CheckRegistry}
+        caching the check modules (default to the one of the process).
+
+        @param store: The L{checkproject.store.ResultStore} used to
+        replay the results of the unchanged checks (None to always run
+        all the checks).
+
+        @param reporter: The L{checkproject.report.Reporter} receiving the
+        events of the checks.
+
+        @param profiler: The L{checkproject.profiling.Profiler} measuring
+        the steps of the run (no profiling if None).
+
+        @param timeout: Default time budget of the check methods (in
+        seconds, no limit if None).
+
         """
+        from checkproject.registry import default_registry
+
         self.project_dir = project_dir
         self.checks_dir = checks_dir
         self.checks = None
+        self.registry = registry or default_registry()
+        self.store = store
+        if reporter is None:
+            from checkproject.report import Reporter
+            reporter = Reporter()
+        self.reporter = reporter
+        self.profiler = profiler
+        self.timeout = timeout
 
     def discover(self, pattern='check_*.py', top_dir=None):
         """Discover all the checks in the directory 'top_dir' with all methods
@@ -80,65 +201,198 @@ class CheckRunner(object):
         # Update self.checks
         self.checks = sorted(set(self.checks + check_paths))
 
-    def list(self, pattern='Check*'):
-        """List all the checks discovered in the order of execution.
+    def classes(self, pattern='Check*'):
+        """Get all the check classes of the discovered checks in the order
+        of execution.
 
-        @return: A list of all the checks ordered as for executing it.
+        @return: A list of C{(module_name, module_path, class)} tuples.
 
         """
         import os
-        import re
 
         # Initializing self.checks if needed
         if self.checks is None:
             self.discover()
 
-        # Initializing return value
-        checks = []
+        classes = []
 
         # Scanning all the modules
         for check_module in self.checks:
             module_path = os.path.join(self.checks_dir, check_module)
-            module_name = module_path.split(os.sep)[-1].split('.')[0]
-            module = import_module(module_path)
+            module_name = _module_name(check_module)
+            if self.profiler is None:
+                module_classes = self.registry.classes(module_path, pattern)
+            else:
+                with self.profiler.measure('import', check_module):
+                    module_classes = self.registry.classes(module_path,
+                                                           pattern)
+            for cls in module_classes:
+                classes.append((module_name, module_path, cls))
+
+        return classes
+
+    def table(self, pattern='Check*'):
+        """Get the entries of all the check methods discovered in the order
+        of execution (without instantiating the check classes).
 
-            # Extract all the 'Check' classes
-            classes = [cls for cls in dir(module)
-                       if re.compile(pattern).search(cls) and cls is not 'CheckCase']
+        @return: A list of C{(check_name, method)} tuples where C{method}
+        is a L{checkproject.case.CheckMethod} entry.
+
+        """
+        checks = []
 
-            for class_name in classes:
-                cls = getattr(module, class_name)
-                check = cls(self.project_dir)
-                checks += [module_name + '.' + cls.__name__ + '.' + m
-                           for m in check.list()]
+        for module_name, _, cls in self.classes(pattern):
+            checks += [(module_name + '.' + cls.__name__ + '.' + m.name, m)
+                       for m in cls.method_table()]
 
         return checks
 
+    def static_table(self, pattern='Check*'):
+        """Get the entries of all the check methods discovered in the order
+        of execution, without executing the check modules (see
+        L{checkproject.discovery}).
 
-    def run(self, pattern='Check*'):
-        """Execute the checks and collect all the results"""
+        @return: A list of C{(check_name, method)} tuples where C{method}
+        is a L{checkproject.case.CheckMethod} entry.
+
+        """
+        from checkproject.discovery import static_table, save_cache
         import os
-        import re
 
         # Initializing self.checks if needed
         if self.checks is None:
             self.discover()
 
-        # Initializing return value
-        result = None
+        checks = []
 
-        # Scanning all the modules
         for check_module in self.checks:
             module_path = os.path.join(self.checks_dir, check_module)
-            module = import_module(module_path)
+            module_name = _module_name(check_module)
+            for class_name, methods in static_table(module_path, pattern):
+                checks += [(module_name + '.' + class_name + '.' + m.name, m)
+                           for m in methods]
+        save_cache()
+
+        return checks
+
+    def list(self, pattern='Check*'):
+        """List all the checks discovered in the order of execution.
+
+        @return: A list of all the checks ordered as for executing it.
+
+        """
+        return [check for check, _ in self.table(pattern)]
 
-            # Extract all the 'Check' classes
-            classes = [cls for cls in dir(module)
-                       if re.compile(pattern).search(cls) and cls is not 'CheckCase']
+    def stages(self, pattern='Check*'):
+        """Group the check classes into stages of independent checks.
 
-            for class_name in classes:
-                cls = getattr(module, class_name)
-                check = cls(self.project_dir)
-                result = check.run(result)
+        @return: A list of stages, each stage being a list of
+        C{(module_name, module_path, class)} tuples.
 
+        """
+        import os
+        import re
+
+        prefix = re.compile(r'^check_(\d+)')
+
+        stages = []
+        last_key = None
+
+        for module_name, module_path, cls in self.classes(pattern):
+            match = prefix.match(module_name.split('/')[-1])
+            if match:
+                key = (os.path.dirname(module_path), int(match.group(1)))
+            else:
+                key = module_path
+
+            if not stages or key != last_key:
+                stages.append([])
+                last_key = key
+            stages[-1].append((module_name, module_path, cls))
+
+        return stages
+
+    def _run_sequential(self, result, pattern, options):
+        """Run the check classes one after the other."""
+        for module_name, module_path, cls in self.classes(pattern):
+            check = _instantiate_check(cls, self.project_dir, module_name,
+                                       self.profiler)
+            _prepare_check(check, module_name, module_path, **options)
+            check.run(result)
+            if result.has_failed():
+                break
+
+    def _run_stages(self, result, pattern, options, jobs, executor):
+        """Run the check classes of each stage concurrently."""
+        if executor == 'process':
+            from concurrent.futures import ProcessPoolExecutor as Executor
+            # The snapshot, the reporter and the fixtures cannot be shared
+            # between processes (the events are sent once the class is
+            # done), and the checks run in other processes are not
+            # profiled
+            options = dict(options, snapshot=None, reporter=None,
+                           profiler=None, fixtures=None)
+        else:
+            from concurrent.futures import ThreadPoolExecutor as Executor
+
+        with Executor(max_workers=jobs) as pool:
+            for stage in self.stages(pattern):
+                futures = [pool.submit(_run_check, self.project_dir,
+                                       module_name, module_path, cls.__name__,
+                                       pattern, options)
+                           for module_name, module_path, cls in stage]
+
+                # Merge the results in the order of the checks
+                for future, (module_name, _, cls) in zip(futures, stage):
+                    check_result = future.result()
+                    if executor == 'process':
+                        _report_check(self.reporter,
+                                      module_name + '.' + cls.__name__,
+                                      check_result)
+                    result.merge(check_result)
+
+                if result.has_failed():
+                    break
+
+    def run(self, pattern='Check*', jobs=None, executor='thread'):
+        """Execute the checks and collect all the results
+
+        @param pattern: Regular expression searched in the name of the
+        check classes.
+
+        @param jobs: Number of check classes of a stage run concurrently
+        (run sequentially if None or 1).
+
+        @param executor: Either C{'thread'} or C{'process'}, the kind of
+        pool used to run the stages concurrently.
+
+        """
+        from checkproject.files import FileSnapshot
+        from checkproject.fixtures import FixtureManager
+        from checkproject.result import CheckResult
+        import sys
+
+        self.reporter.run_start(self.project_dir)
+        result = CheckResult()
+
+        # Files of the project and fixtures shared by all the checks of
+        # the run
+        fixtures = FixtureManager(self.project_dir)
+        options = {'snapshot': FileSnapshot(self.project_dir),
+                   'store': self.store, 'reporter': self.reporter,
+                   'profiler': self.profiler, 'timeout': self.timeout,
+                   'fixtures': fixtures}
+
+        try:
+            if jobs is None or jobs <= 1:
+                self._run_sequential(result, pattern, options)
+            else:
+                self._run_stages(result, pattern, options, jobs, executor)
+        finally:
+            for error in fixtures.teardown():
+                sys.stderr.write('warning: fixture teardown failed: %r\n' %
+                                 error)
+            options['snapshot'].close()
+
+        self.reporter.run_end(self.project_dir, result)
         return result
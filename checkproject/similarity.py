@@ -0,0 +1,381 @@
+# -*- coding: utf-8
+"""Detection of the copied and nearly copied projects.
+
+The C files of each project are fingerprinted once: the hash of their
+content (finding the identical files), and the winnowed fingerprints of
+their token stream normalized so that renaming the identifiers,
+changing the literals, the layout or the comments does not change them
+(finding the files copied then modified). A fingerprint is the hash of
+K consecutive normalized tokens, and only the smallest hash of each
+window of WINDOW consecutive fingerprints is kept (winnowing): any
+sequence of K + WINDOW - 1 tokens shared by two projects gives at least
+one common fingerprint.
+
+The fingerprints are stored in a persistent inverted index (an SQLite
+database mapping each fingerprint to the projects having it), so that
+adding a project only reads the postings of its own fingerprints to
+find its most similar peers, instead of comparing it with every project
+of the index. The projects compared with each other (a cohort) share
+an index: its path is given explicitly, or is the one of the check
+modules of the cohort (see L{index_path}). For example, in a check
+method::
+
+    index = SimilarityIndex('/path/to/cohort.sqlite')
+    peers = index.add(self.project_path, self.files())
+    report(self, peers)
+
+"""
+
+# Number of normalized tokens of a fingerprint
+K = 12
+
+# Number of consecutive fingerprints of which the smallest is kept
+WINDOW = 8
+
+# Files fingerprinted
+SOURCES = ('*.c', '*.h')
+
+# Fingerprints found in more than this fraction of the other projects
+# (the code given to all the students, for example) are ignored, once
+# the index holds at least COMMON_MIN projects
+COMMON = 0.5
+COMMON_MIN = 10
+
+# Minimum similarity of the peers reported
+THRESHOLD = 0.5
+
+# Maximum number of peers returned
+TOP = 5
+
+# Number of fingerprints queried at once
+_CHUNK = 500
+
+
+def normalize(tokens):
+    """Normalize a token stream: the identifiers and the literals are
+    replaced by their kind, the comments and the preprocessor
+    directives are dropped.
+
+    @param tokens: The L{checkproject.ctokens.Token} of a file.
+
+    @return: A list of C{(text, line)} tuples.
+
+    """
+    normalized = []
+    for token in tokens:
+        kind = token.kind
+        if kind in ('comment', 'preprocessor'):
+            continue
+        if kind in ('identifier', 'number', 'string', 'char'):
+            normalized.append((kind[0].upper(), token.line))
+        else:
+            normalized.append((token.text, token.line))
+    return normalized
+
+
+def _hash(text):
+    """Hash a k-gram on 63 bits (stable across processes)."""
+    import hashlib
+
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+def winnow(tokens, k=K, window=WINDOW):
+    """Compute the winnowed fingerprints of a normalized token stream.
+
+    @param tokens: The C{(text, line)} tuples of L{normalize}.
+
+    @return: A dictionary mapping the fingerprints kept to the line of
+    their first occurrence.
+
+    """
+    hashes = [(_hash(' '.join(text for text, _ in tokens[start:start + k])),
+               tokens[start][1])
+              for start in range(len(tokens) - k + 1)]
+    if not hashes:
+        return {}
+
+    fingerprints = {}
+    selected = None
+    for start in range(max(len(hashes) - window + 1, 1)):
+        # Keep the rightmost minimal hash of the window, only once
+        minimum = start
+        for position in range(start, min(start + window, len(hashes))):
+            if hashes[position][0] <= hashes[minimum][0]:
+                minimum = position
+        if minimum != selected:
+            selected = minimum
+            fingerprint, line = hashes[minimum]
+            fingerprints.setdefault(fingerprint, line)
+    return fingerprints
+
+
+class Peer(object):
+    """Project similar to another one.
+
+    Attributes:
+      - C{name}: the name of the project in the index.
+      - C{similarity}: the fraction of the fingerprints of the smallest
+        of the two projects found in the other one (from 0 to 1).
+      - C{shared}: the number of fingerprints shared.
+      - C{identical}: the list of the C{(path, peer_path)} tuples of the
+        files with the same content.
+
+    """
+
+    __slots__ = ('name', 'similarity', 'shared', 'identical')
+
+    def __init__(self, name, similarity, shared, identical=()):
+        self.name = name
+        self.similarity = similarity
+        self.shared = shared
+        self.identical = list(identical)
+
+    def __reduce__(self):
+        return (Peer, (self.name, self.similarity, self.shared,
+                       self.identical))
+
+    def __repr__(self):
+        return 'Peer(%r, %.2f)' % (self.name, self.similarity)
+
+    def describe(self):
+        """Describe the similarity in one line."""
+        description = 'similar to %s (%d%% of the code)' % (
+            self.name, round(self.similarity * 100))
+        if self.identical:
+            description += ', identical files: %s' % ', '.join(
+                path if path == peer_path else '%s (%s)' % (path, peer_path)
+                for path, peer_path in self.identical)
+        return description
+
+
+def fingerprint_files(files, globs=SOURCES, k=K, window=WINDOW):
+    """Fingerprint the source files of a project.
+
+    @param files: The L{checkproject.files.Files} of the project.
+
+    @param globs: Globbing expressions of the files fingerprinted.
+
+    @return: A tuple C{(hashes, fingerprints)}: a dictionary mapping the
+    path of each file to the hash of its content, and a dictionary
+    mapping the fingerprints to the path of the first file having them.
+
+    """
+    from checkproject.ctokens import read_source
+    from checkproject.files import _compile_globs
+
+    pattern = _compile_globs(globs)
+    hashes = {}
+    fingerprints = {}
+    for _file in files.files:
+        if _file[1] != 'f' or not pattern.match(_file[0]):
+            continue
+        path = _file[0]
+        source = read_source(path, source=files.source)
+        hashes[path] = source.digest
+        for fingerprint in winnow(normalize(source.tokens), k, window):
+            fingerprints.setdefault(fingerprint, path)
+    return hashes, fingerprints
+
+
+def index_path(checks_dir):
+    """Get the path of the index of the projects checked by the check
+    modules of a directory (in L{checkproject.utils.cache_dir}).
+
+    @param checks_dir: The directory of the check modules.
+
+    @return: The path to the SQLite database.
+
+    """
+    import hashlib
+    import os
+    from checkproject.utils import cache_dir
+
+    digest = hashlib.sha1(os.path.abspath(checks_dir).encode('utf-8'))
+    return os.path.join(cache_dir('similarity'),
+                        digest.hexdigest()[:16] + '.sqlite')
+
+
+class SimilarityIndex(object):
+    """Persistent inverted index of the fingerprints of the projects."""
+
+    def __init__(self, path, k=K, window=WINDOW, globs=SOURCES):
+        """Open (or create) an index.
+
+        @param path: Path to the SQLite database (see L{index_path}).
+
+        @param k: Number of normalized tokens of a fingerprint.
+
+        @param window: Size of the winnowing window.
+
+        @param globs: Globbing expressions of the files fingerprinted.
+
+        """
+        import sqlite3
+        import threading
+
+        self.path = path
+        self.k = k
+        self.window = window
+        self.globs = globs
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS projects
+                (id INTEGER PRIMARY KEY, name TEXT UNIQUE, size INTEGER);
+            CREATE TABLE IF NOT EXISTS files
+                (hash TEXT, project INTEGER, path TEXT);
+            CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+            CREATE INDEX IF NOT EXISTS files_project ON files (project);
+            CREATE TABLE IF NOT EXISTS postings
+                (fingerprint INTEGER, project INTEGER, path TEXT,
+                 PRIMARY KEY (fingerprint, project)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_project
+                ON postings (project);
+            CREATE TABLE IF NOT EXISTS frequencies
+                (fingerprint INTEGER PRIMARY KEY, count INTEGER);
+        ''')
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM projects'
+                                    ).fetchone()[0]
+
+    def _remove(self, name):
+        """Remove a project from the index (the lock being held)."""
+        row = self._db.execute('SELECT id FROM projects WHERE name = ?',
+                               (name,)).fetchone()
+        if row is None:
+            return
+        project = row[0]
+        self._db.execute('UPDATE frequencies SET count = count - 1 WHERE '
+                         'fingerprint IN (SELECT fingerprint FROM postings '
+                         'WHERE project = ?)', (project,))
+        self._db.execute('DELETE FROM frequencies WHERE count <= 0')
+        self._db.execute('DELETE FROM postings WHERE project = ?',
+                         (project,))
+        self._db.execute('DELETE FROM files WHERE project = ?', (project,))
+        self._db.execute('DELETE FROM projects WHERE id = ?', (project,))
+
+    def remove(self, name):
+        """Remove a project from the index."""
+        with self._lock:
+            self._remove(name)
+            self._db.commit()
+
+    def _peers(self, project, hashes, fingerprints, top, threshold):
+        """Find the most similar peers of a project (the lock being
+        held)."""
+        from collections import Counter
+
+        others = self._db.execute('SELECT COUNT(*) FROM projects'
+                                  ).fetchone()[0] - 1
+        limit = others
+        if others >= COMMON_MIN:
+            limit = int(others * COMMON)
+
+        shared = Counter()
+        keys = list(fingerprints)
+        for start in range(0, len(keys), _CHUNK):
+            chunk = keys[start:start + _CHUNK]
+            marks = ', '.join('?' * len(chunk))
+            rows = self._db.execute(
+                'SELECT postings.project FROM postings JOIN frequencies '
+                'USING (fingerprint) WHERE postings.fingerprint IN (%s) '
+                'AND postings.project != ? AND frequencies.count - 1 <= ?'
+                % marks, chunk + [project, limit])
+            shared.update(row[0] for row in rows)
+
+        peers = []
+        for peer, number in shared.items():
+            name, size = self._db.execute('SELECT name, size FROM projects '
+                                          'WHERE id = ?', (peer,)).fetchone()
+            similarity = number / float(max(min(size, len(fingerprints)), 1))
+            if similarity >= threshold:
+                peers.append(Peer(name, similarity, number))
+        peers.sort(key=lambda peer: (-peer.similarity, peer.name))
+        peers = peers[:top]
+
+        paths = {}
+        for path, content_hash in hashes.items():
+            paths.setdefault(content_hash, []).append(path)
+        for peer in peers:
+            rows = self._db.execute(
+                'SELECT files.hash, files.path FROM files JOIN projects ON '
+                'files.project = projects.id WHERE projects.name = ? '
+                'ORDER BY files.path', (peer.name,))
+            peer.identical = [(path, peer_path)
+                              for content_hash, peer_path in rows
+                              for path in paths.get(content_hash, ())]
+        return peers
+
+    def add(self, name, files, top=TOP, threshold=THRESHOLD):
+        """Add (or replace) a project in the index and find its most
+        similar peers.
+
+        @param name: The name of the project (its path, for example).
+
+        @param files: The L{checkproject.files.Files} of the project.
+
+        @param top: Maximum number of peers returned.
+
+        @param threshold: Minimum similarity of the peers returned.
+
+        @return: The list of the L{Peer}, the most similar first.
+
+        """
+        hashes, fingerprints = fingerprint_files(files, self.globs, self.k,
+                                                 self.window)
+        with self._lock:
+            try:
+                self._remove(name)
+                project = self._db.execute(
+                    'INSERT INTO projects (name, size) VALUES (?, ?)',
+                    (name, len(fingerprints))).lastrowid
+                self._db.executemany('INSERT INTO files VALUES (?, ?, ?)',
+                                     [(content_hash, project, path)
+                                      for path, content_hash in
+                                      hashes.items()])
+                self._db.executemany('INSERT INTO postings VALUES (?, ?, ?)',
+                                     [(fingerprint, project, path)
+                                      for fingerprint, path in
+                                      fingerprints.items()])
+                self._db.executemany('INSERT OR IGNORE INTO frequencies '
+                                     'VALUES (?, 0)',
+                                     [(fingerprint,)
+                                      for fingerprint in fingerprints])
+                self._db.executemany('UPDATE frequencies SET count = '
+                                     'count + 1 WHERE fingerprint = ?',
+                                     [(fingerprint,)
+                                      for fingerprint in fingerprints])
+                peers = self._peers(project, hashes, fingerprints, top,
+                                    threshold)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return peers
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+
+def report(check, peers, hidden=True):
+    """Record the similar peers of a project as warnings of a check
+    (hidden to the student by default).
+
+    @param check: The running L{checkproject.case.CheckCase}.
+
+    @param peers: The L{Peer} found (see L{SimilarityIndex.add}).
+
+    @param hidden: Tell if the records are hidden to the student.
+
+    @return: True if no peer was recorded.
+
+    """
+    for peer in peers:
+        check.warning(False, peer.describe(), hidden=hidden)
+    return not peers
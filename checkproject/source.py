@@ -0,0 +1,621 @@
+# -*- coding: utf-8
+"""Sources of the projects: directories and archives.
+
+A project is either a directory or an archive (tar, compressed or not,
+or zip). The source of a project lists its files in the format of
+L{checkproject.files.Files} and reads their content, so that the files
+of an archive are scanned, compared and read without extracting it:
+the members of an uncompressed tar archive are read through a memory
+mapping of the archive, and the other members are streamed. An archive
+is extracted into a temporary directory only when a check needs a real
+directory (to run a command or a build, see L{ProjectSource.directory}),
+and this directory is removed with the source.
+
+When all the members of an archive are enclosed in a single top
+directory (as it is usually the case), this directory is the top
+directory of the project.
+
+"""
+import io
+import os
+
+# Suffixes of the archive files
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz',
+                '.txz')
+ZIP_SUFFIXES = ('.zip',)
+ARCHIVE_SUFFIXES = TAR_SUFFIXES + ZIP_SUFFIXES
+
+# Maximum number of symbolic links followed to resolve a link
+MAX_LINKS = 8
+
+
+def is_archive(path):
+    """Tell if a path is the path of an archive (from its suffix)."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def open_source(project):
+    """Get the source of a project.
+
+    @param project: The path of the top directory or of the archive of
+    the project, or a L{ProjectSource} (returned as is).
+
+    @return: A L{ProjectSource} object.
+
+    """
+    if isinstance(project, ProjectSource):
+        return project
+    if is_archive(project):
+        if project.lower().endswith(ZIP_SUFFIXES):
+            return ZipSource(project)
+        return TarSource(project)
+    return DirectorySource(project)
+
+
+class ProjectSource(object):
+    """Base class of the sources of the projects.
+
+    The paths given to the methods are relative to the top directory
+    of the project.
+
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def iterscan(self, ignore=None, max_depth=None, max_entries=None):
+        """Walk through the project and yield its files and directories
+        (not sorted) in the format of L{checkproject.files.Files}.
+
+        @param ignore: Compiled regular expression of the names or paths
+        of the items to skip (with their content).
+
+        @param max_depth: Maximum depth of the scanned directories.
+
+        @param max_entries: Directories with more entries than this are
+        listed but their content is skipped.
+
+        """
+        raise NotImplementedError
+
+    def open(self, path):
+        """Open a file of the project for reading (binary mode)."""
+        raise NotImplementedError
+
+    def read(self, path):
+        """Read the content of a file of the project.
+
+        @return: The content of the file (bytes).
+
+        """
+        with self.open(path) as _file:
+            return _file.read()
+
+    def readlink(self, path):
+        """Get the target of a symbolic link of the project."""
+        raise NotImplementedError
+
+    def hash_file(self, path, cache):
+        """Get the hash of the content of a file of the project.
+
+        @param cache: The L{checkproject.hashcache.HashCache} to use.
+
+        """
+        raise NotImplementedError
+
+    def signature(self, directories):
+        """Compute a signature of the project which changes when files
+        are added, removed or renamed.
+
+        @param directories: The directories found by the last scan.
+
+        @return: The signature, or None if the project cannot be reached.
+
+        """
+        raise NotImplementedError
+
+    def directory(self):
+        """Get a real directory holding the files of the project."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the resources of the source (extracted files, ...)."""
+
+
+class DirectorySource(ProjectSource):
+    """Source of a project in a directory."""
+
+    def iterscan(self, ignore=None, max_depth=None, max_entries=None):
+        """Walk through the directory of the project with C{os.scandir()}.
+
+        Files are classified from the data cached by C{os.scandir()}:
+        a file with any execute permission bit is C{'executable'} and a
+        symbolic link to something else than a directory or an
+        executable file is reported as a link.
+
+        """
+        # Stack of the directories to scan: (path, prefix, depth)
+        directories = [(self.root, '', 0)]
+
+        while directories:
+            path, prefix, depth = directories.pop()
+            try:
+                with os.scandir(path) as scanner:
+                    entries = list(scanner)
+            except OSError:
+                continue
+
+            if max_entries is not None and len(entries) > max_entries:
+                continue
+
+            for entry in entries:
+                relpath = prefix + entry.name
+                if ignore is not None and \
+                   (ignore.match(entry.name) or ignore.match(relpath)):
+                    continue
+
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    yield (relpath, 'd')
+                    # Symbolic links to directories are not followed
+                    if not entry.is_symlink() and \
+                       (max_depth is None or depth < max_depth):
+                        directories.append((entry.path, relpath + '/',
+                                            depth + 1))
+                    continue
+
+                try:
+                    executable = entry.stat().st_mode & 0o111
+                except OSError:
+                    # Broken symbolic link
+                    executable = False
+
+                if executable:
+                    yield (relpath, 'f', 'executable')
+                elif entry.is_symlink():
+                    yield (relpath, 'l', os.path.realpath(entry.path))
+                else:
+                    yield (relpath, 'f')
+
+    def open(self, path):
+        return open(os.path.join(self.root, path), 'rb')
+
+    def readlink(self, path):
+        return os.readlink(os.path.join(self.root, path))
+
+    def hash_file(self, path, cache):
+        return cache.hash_file(os.path.join(self.root, path))
+
+    def signature(self, directories):
+        """The modification times of the directories (adding, removing or
+        renaming an entry updates the modification time of its parent
+        directory)."""
+        try:
+            return tuple(os.stat(os.path.join(self.root, _dir)).st_mtime_ns
+                         for _dir in [''] + list(directories))
+        except OSError:
+            return None
+
+    def directory(self):
+        return self.root
+
+
+class ArchiveSource(ProjectSource):
+    """Base class of the sources of the projects in an archive.
+
+    The members with an absolute path or a path going out of the
+    archive ('..') are ignored, as well as the special files. An archive
+    with members under a symbolic link (or under a file) is rejected.
+
+    """
+
+    def __init__(self, root, strip=None):
+        """Constructor of the source.
+
+        @param root: The path of the archive.
+
+        @param strip: Number of leading directories removed from the
+        paths of the members (default to 1 if all the members are
+        enclosed in a single directory, 0 otherwise).
+
+        """
+        import threading
+
+        ProjectSource.__init__(self, root)
+        self.strip = strip
+        self._lock = threading.RLock()
+        self._handle = None
+        # Members of the archive: path -> (type, mode, target, size, member)
+        self._entries = None
+        # Names of the entries of each directory ('' is the top one)
+        self._tree = None
+        self._directory = None
+        self._finalizer = None
+
+    def __reduce__(self):
+        # Open archives and extracted files are not shared with copies
+        return (self.__class__, (self.root, self.strip))
+
+    def _members(self):
+        """Iterate over the members of the archive as tuples C{(name, type,
+        mode, target, size, member)} (to implement)."""
+        raise NotImplementedError
+
+    def _open_member(self, member):
+        """Open a member of the archive (to implement)."""
+        raise NotImplementedError
+
+    def _load(self):
+        """Read the list of the members of the archive (once).
+
+        @raise IOError: A member is under a symbolic link or a file.
+
+        """
+        import errno
+
+        with self._lock:
+            if self._entries is not None:
+                return self._entries, self._tree
+
+            members = []
+            for name, _type, mode, target, size, member in self._members():
+                parts = [part for part in name.split('/')
+                         if part not in ('', '.')]
+                if not parts or name.startswith('/') or '..' in parts:
+                    continue
+                members.append((parts, (_type, mode, target, size, member)))
+
+            strip = self.strip
+            if strip is None:
+                tops = set(parts[0] for parts, _ in members)
+                strip = int(len(tops) == 1 and
+                            all(len(parts) > 1 or entry[0] == 'd'
+                                for parts, entry in members))
+
+            entries = {}
+            tree = {'': []}
+            for parts, entry in members:
+                parts = parts[strip:]
+                if not parts:
+                    continue
+                # Parent directories may not have their own member
+                for index in range(1, len(parts) + 1):
+                    path = '/'.join(parts[:index])
+                    if path not in entries:
+                        parent = '/'.join(parts[:index - 1])
+                        tree[parent].append(parts[index - 1])
+                        entries[path] = ('d', 0o755, None, 0, None)
+                        tree[path] = []
+                    elif index < len(parts) and entries[path][0] != 'd':
+                        raise IOError(errno.ENOTDIR, 'member under a '
+                                      'symbolic link or a file in the '
+                                      'archive', '/'.join(parts))
+                if entry[0] != 'd':
+                    if tree[path]:
+                        raise IOError(errno.ENOTDIR, 'member under a '
+                                      'symbolic link or a file in the '
+                                      'archive', path)
+                    entries[path] = entry
+
+            self._entries = entries
+            self._tree = tree
+            return entries, tree
+
+    def _resolve(self, path):
+        """Follow the symbolic links of a path in the archive.
+
+        @return: The path and the entry of the final target, or None if
+        the link is broken.
+
+        """
+        import posixpath
+
+        entries = self._load()[0]
+        for _ in range(MAX_LINKS):
+            entry = entries.get(path)
+            if entry is None or entry[0] != 'l':
+                return path, entry
+            if entry[2].startswith('/'):
+                return path, None
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(path),
+                                                     entry[2]))
+        return path, None
+
+    def _item(self, path, entry):
+        """Get the item of a member in the format of the scans."""
+        _type = entry[0]
+        if _type == 'l':
+            target, target_entry = self._resolve(path)
+            if target_entry is not None and target_entry[0] == 'd':
+                return (path, 'd')
+            if target_entry is None or not target_entry[1] & 0o111:
+                return (path, 'l', target)
+            entry = target_entry
+        if _type == 'd':
+            return (path, 'd')
+        if entry[1] & 0o111:
+            return (path, 'f', 'executable')
+        return (path, 'f')
+
+    def iterscan(self, ignore=None, max_depth=None, max_entries=None):
+        """Walk through the members of the archive (symbolic links are
+        reported with their target relative to the top directory)."""
+        entries, tree = self._load()
+
+        # Stack of the directories to scan: (path, depth)
+        directories = [('', 0)]
+
+        while directories:
+            directory, depth = directories.pop()
+            names = tree[directory]
+            if max_entries is not None and len(names) > max_entries:
+                continue
+
+            for name in names:
+                relpath = directory + '/' + name if directory else name
+                if ignore is not None and \
+                   (ignore.match(name) or ignore.match(relpath)):
+                    continue
+
+                entry = entries[relpath]
+                item = self._item(relpath, entry)
+                yield item
+                # Symbolic links to directories are not followed
+                if entry[0] == 'd' and \
+                   (max_depth is None or depth < max_depth):
+                    directories.append((relpath, depth + 1))
+
+    def _file_entry(self, path):
+        """Get the entry of a regular file, following the links."""
+        import errno
+
+        path, entry = self._resolve(path)
+        if entry is None:
+            raise IOError(errno.ENOENT, 'no such file in the archive', path)
+        if entry[0] != 'f':
+            raise IOError(errno.EISDIR, 'not a file', path)
+        return entry
+
+    def open(self, path):
+        return self._open_member(self._file_entry(path)[4])
+
+    def readlink(self, path):
+        import errno
+
+        entry = self._load()[0].get(path)
+        if entry is None or entry[0] != 'l':
+            raise OSError(errno.EINVAL, 'not a symbolic link', path)
+        return entry[2]
+
+    def hash_file(self, path, cache):
+        from checkproject.hashcache import hash_stream
+
+        entry = self._file_entry(path)
+        status = os.stat(self.root)
+
+        def compute():
+            with self._open_member(entry[4]) as _file:
+                return hash_stream(_file)
+
+        return cache.hash_entry('%s!/%s' % (os.path.abspath(self.root), path),
+                                entry[3], status.st_mtime_ns, compute)
+
+    def signature(self, directories):
+        """The modification time and the size of the archive."""
+        try:
+            status = os.stat(self.root)
+        except OSError:
+            return None
+        return (status.st_mtime_ns, status.st_size)
+
+    def directory(self):
+        """Extract the archive into a temporary directory (once).
+
+        Symbolic links going out of the project are not extracted: the
+        links are checked once all of them are created, as a link may go
+        through the others (C{w -> q/..} with C{q -> .}), and the files
+        are only written in the directories of the project.
+
+        """
+        import posixpath
+        import shutil
+        import tempfile
+        import weakref
+
+        with self._lock:
+            if self._directory is not None:
+                return self._directory
+
+            entries = self._load()[0]
+            target = tempfile.mkdtemp(prefix='checkproject-')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, target,
+                                               True)
+            top = os.path.realpath(target)
+
+            def inside(path):
+                path = os.path.realpath(path)
+                return path == top or path.startswith(top + os.sep)
+
+            links = []
+            for path in sorted(entries):
+                _type, mode, link, _, member = entries[path]
+                destination = os.path.join(target, path)
+                if _type == 'd':
+                    os.makedirs(destination, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                if _type == 'l':
+                    resolved = posixpath.normpath(posixpath.join(
+                        posixpath.dirname(path), link))
+                    if not link.startswith('/') and \
+                       not resolved.startswith('../') and resolved != '..':
+                        os.symlink(link, destination)
+                        links.append(destination)
+                    continue
+                if not inside(os.path.dirname(destination)):
+                    continue
+                with self._open_member(member) as source, \
+                        open(destination, 'wb') as _file:
+                    shutil.copyfileobj(source, _file)
+                os.chmod(destination, (mode & 0o777) | 0o600)
+
+            # Removing a link may change where the other ones lead
+            escaping = True
+            while escaping:
+                escaping = [link for link in links if not inside(link)]
+                for link in escaping:
+                    os.unlink(link)
+                    links.remove(link)
+
+            self._directory = target
+            return target
+
+    def close(self):
+        with self._lock:
+            if self._finalizer is not None:
+                self._finalizer()
+                self._finalizer = None
+                self._directory = None
+            if self._handle is not None:
+                self._close_handle()
+                self._handle = None
+
+    def _close_handle(self):
+        """Close the archive."""
+        self._handle.close()
+
+
+class TarSource(ArchiveSource):
+    """Source of a project in a tar archive (compressed or not)."""
+
+    # Magic numbers of the compressed archives
+    COMPRESSED_MAGICS = (b'\x1f\x8b', b'BZh', b'\xfd7zXZ')
+
+    def _archive(self):
+        """Open the archive (once) and map it in memory if it is not
+        compressed."""
+        import mmap
+        import tarfile
+
+        with self._lock:
+            if self._handle is None:
+                _file = open(self.root, 'rb')
+                mapping = None
+                if not _file.read(6).startswith(self.COMPRESSED_MAGICS):
+                    try:
+                        mapping = mmap.mmap(_file.fileno(), 0,
+                                            access=mmap.ACCESS_READ)
+                    except (ValueError, OSError):
+                        mapping = None
+                _file.seek(0)
+                self._handle = (_file, tarfile.open(fileobj=_file), mapping)
+            return self._handle
+
+    def _close_handle(self):
+        _file, tar, mapping = self._handle
+        tar.close()
+        if mapping is not None:
+            mapping.close()
+        _file.close()
+
+    def _members(self):
+        tar = self._archive()[1]
+        with self._lock:
+            members = tar.getmembers()
+        for member in members:
+            if member.isdir():
+                yield member.name, 'd', member.mode, None, 0, member
+            elif member.issym():
+                yield member.name, 'l', member.mode, member.linkname, 0, member
+            elif member.isfile() or member.islnk():
+                yield member.name, 'f', member.mode, None, member.size, member
+
+    def _open_member(self, member):
+        _, tar, mapping = self._archive()
+        if mapping is not None and member.isfile() and \
+           not member.issparse():
+            return io.BufferedReader(_MappedMember(
+                mapping, member.offset_data, member.size))
+        # The readers of a compressed archive share its stream
+        with self._lock:
+            stream = tar.extractfile(member)
+        return io.BufferedReader(_LockedReader(stream, self._lock))
+
+
+class _MappedMember(io.RawIOBase):
+    """Reader of a member of an archive mapped in memory (the readers of
+    the members share the mapping, but not a position in a file)."""
+
+    def __init__(self, mapping, offset, size):
+        io.RawIOBase.__init__(self)
+        self._mapping = mapping
+        self._position = offset
+        self._end = offset + size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self._end - self._position)
+        buffer[:count] = self._mapping[self._position:self._position + count]
+        self._position += count
+        return count
+
+
+class _LockedReader(io.RawIOBase):
+    """Reader of a member of an archive whose stream is shared: each read
+    holds the lock of the archive (the member seeks its position in the
+    stream before reading)."""
+
+    def __init__(self, stream, lock):
+        io.RawIOBase.__init__(self)
+        self._stream = stream
+        self._lock = lock
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        with self._lock:
+            return self._stream.readinto(buffer)
+
+    def close(self):
+        with self._lock:
+            self._stream.close()
+        io.RawIOBase.close(self)
+
+
+class ZipSource(ArchiveSource):
+    """Source of a project in a zip archive."""
+
+    def _archive(self):
+        """Open the archive (once)."""
+        import zipfile
+
+        with self._lock:
+            if self._handle is None:
+                self._handle = zipfile.ZipFile(self.root)
+            return self._handle
+
+    def _members(self):
+        import stat
+
+        archive = self._archive()
+        for info in archive.infolist():
+            mode = info.external_attr >> 16
+            if info.is_dir():
+                yield info.filename, 'd', mode or 0o755, None, 0, info
+            elif stat.S_ISLNK(mode):
+                target = archive.read(info).decode('utf-8', 'surrogateescape')
+                yield info.filename, 'l', mode, target, 0, info
+            else:
+                # Archives made on Windows have no permissions
+                yield (info.filename, 'f', mode or 0o644, None,
+                       info.file_size, info)
+
+    def _open_member(self, member):
+        return self._archive().open(member)
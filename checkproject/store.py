@@ -0,0 +1,116 @@
+# -*- coding: utf-8
+"""Persistent store of the results of the checks.
+
+The result of each check method is recorded in a SQLite database with
+two fingerprints: the one of the check (hash of the source file of the
+check module) and the one of the inputs of the check (hash of the files
+of the project the check depends on). When the checks are run again,
+a check whose fingerprints did not change is not executed, its stored
+result is replayed instead.
+
+"""
+
+
+class ResultStore(object):
+    """Store of the results of the check methods."""
+
+    def __init__(self, path=None):
+        """Open (or create) a result store.
+
+        @param path: Path to the SQLite database (default to
+        C{results.sqlite} in L{checkproject.utils.cache_dir}).
+
+        """
+        import os
+        import sqlite3
+        import threading
+        from checkproject.utils import cache_dir
+
+        if path is None:
+            path = os.path.join(cache_dir(), 'results.sqlite')
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS results '
+                         '(project TEXT, check_id TEXT, check_hash TEXT, '
+                         'inputs_hash TEXT, result BLOB, '
+                         'PRIMARY KEY (project, check_id))')
+        self._db.commit()
+
+    def __getstate__(self):
+        # Only the path is sent to other processes, which open their own
+        # connection to the database
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def get(self, project, check_id, check_hash, inputs_hash):
+        """Get the stored result of a check method.
+
+        @param project: The top directory of the project.
+
+        @param check_id: The name of the check method.
+
+        @param check_hash: Fingerprint of the check.
+
+        @param inputs_hash: Fingerprint of the inputs of the check.
+
+        @return: The stored L{checkproject.result.CheckResult} or None if
+        there is no result with these fingerprints.
+
+        """
+        import os
+        import pickle
+
+        with self._lock:
+            row = self._db.execute('SELECT check_hash, inputs_hash, result '
+                                   'FROM results WHERE project = ? AND '
+                                   'check_id = ?',
+                                   (os.path.abspath(project),
+                                    check_id)).fetchone()
+
+        if row is None or row[0] != check_hash or row[1] != inputs_hash:
+            return None
+
+        try:
+            return pickle.loads(row[2])
+        except Exception:
+            return None
+
+    def put(self, project, check_id, check_hash, inputs_hash, result):
+        """Record the result of a check method.
+
+        @param project: The top directory of the project.
+
+        @param check_id: The name of the check method.
+
+        @param check_hash: Fingerprint of the check.
+
+        @param inputs_hash: Fingerprint of the inputs of the check.
+
+        @param result: The L{checkproject.result.CheckResult} of the
+        check method only.
+
+        """
+        import os
+        import pickle
+        import sqlite3
+
+        try:
+            blob = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Results holding data that cannot be stored are not recorded
+            return
+
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO results VALUES '
+                             '(?, ?, ?, ?, ?)',
+                             (os.path.abspath(project), check_id, check_hash,
+                              inputs_hash, sqlite3.Binary(blob)))
+            self._db.commit()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
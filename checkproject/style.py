@@ -0,0 +1,445 @@
+# -*- coding: utf-8
+"""Checking the coding style of C source files.
+
+Each C file is read and tokenized once (see L{checkproject.ctokens}),
+then all the style rules visit the same token stream in a single pass.
+A rule is a subclass of L{StyleRule} declared with the L{style_rule}
+decorator; it receives every token with the L{Context} of the token
+(brace and parenthesis depths, previous tokens, kind of the brace
+opened or closed) computed once for all the rules.
+
+The files are checked by the worker processes shared by the checks
+(see L{checkproject.utils.process_pool}) when there are enough of them
+and the rules can be sent to the workers (the rules declared in a check
+module are applied in the current process). For example, in a check
+method::
+
+    engine = StyleEngine([('line_length', {'limit': 100}), 'naming'])
+    for path, violations in engine.run_files(self.files()).items():
+        for violation in violations:
+            self.warning(False, violation.describe())
+
+"""
+
+# Rules declared in the process: name -> class
+_RULES = {}
+
+# Number of files from which the files are checked by worker processes
+PARALLEL_THRESHOLD = 16
+
+# Default globbing expressions of the C source files
+C_SOURCES = ('*.c', '*.h')
+
+
+def style_rule(cls):
+    """Class decorator declaring a style rule under its C{name}."""
+    _RULES[cls.name] = cls
+    return cls
+
+
+class Violation(object):
+    """Violation of a style rule."""
+
+    __slots__ = ('path', 'line', 'rule', 'message')
+
+    def __init__(self, path, line, rule, message):
+        self.path = path
+        self.line = line
+        self.rule = rule
+        self.message = message
+
+    def __reduce__(self):
+        return (Violation, (self.path, self.line, self.rule, self.message))
+
+    def __repr__(self):
+        return 'Violation(%r, %d, %r)' % (self.path, self.line, self.rule)
+
+    def describe(self):
+        """Describe the violation in one line ('path:line: message')."""
+        return '%s:%d: %s [%s]' % (self.path, self.line, self.message,
+                                   self.rule)
+
+
+class Context(object):
+    """Syntactic context of a token, shared by all the rules.
+
+    Attributes:
+      - C{depth}: the number of braces opened before the token.
+      - C{parens}: the number of parentheses opened before the token.
+      - C{previous}: the previous token (comments excluded), or None.
+      - C{before}: the token before C{previous}, or None.
+      - C{brace}: for a brace, the kind of block it opens or closes
+        (C{'function'}, C{'block'} or C{'initializer'}), else None.
+      - C{function}: the name of the last function declared or defined.
+      - C{function_line}: the line of the opening brace of the body of
+        the current function (None outside of a function).
+
+    """
+
+    __slots__ = ('depth', 'parens', 'previous', 'before', 'brace',
+                 'function', 'function_line', '_braces', '_declarator')
+
+    # Tokens after which a brace opens an initializer
+    INITIALIZER_PREFIXES = frozenset(['=', ',', '{', '(', '[', 'return'])
+
+    def __init__(self):
+        self.depth = 0
+        self.parens = 0
+        self.previous = None
+        self.before = None
+        self.brace = None
+        self.function = None
+        self.function_line = None
+        self._braces = []
+        self._declarator = None
+
+    def enter(self, token):
+        """Compute the context of a token before it is visited."""
+        self.brace = None
+        text = token.text
+        if token.kind != 'operator':
+            return
+
+        if text == '{':
+            previous = self.previous
+            if self.depth == 0 and previous is not None and \
+               previous.text == ')' and self._declarator is not None:
+                self.brace = 'function'
+                self.function = self._declarator
+                self.function_line = token.line
+            elif previous is not None and \
+                    previous.text in self.INITIALIZER_PREFIXES:
+                self.brace = 'initializer'
+            else:
+                self.brace = 'block'
+        elif text == '}':
+            self.brace = self._braces[-1] if self._braces else 'block'
+        elif text == '(' and self.depth == 0 and self.parens == 0:
+            previous = self.previous
+            if previous is not None and previous.kind == 'identifier':
+                self._declarator = previous.text
+            else:
+                self._declarator = None
+
+    def leave(self, token):
+        """Update the context after a token was visited."""
+        if token.kind == 'comment':
+            return
+        if token.kind == 'operator':
+            text = token.text
+            if text == '{':
+                self._braces.append(self.brace)
+                self.depth += 1
+            elif text == '}':
+                if self._braces:
+                    self._braces.pop()
+                self.depth = max(self.depth - 1, 0)
+                if self.depth == 0:
+                    self.function_line = None
+            elif text == '(':
+                self.parens += 1
+            elif text == ')':
+                self.parens = max(self.parens - 1, 0)
+            elif text == ';' and self.depth == 0:
+                self._declarator = None
+        self.before = self.previous
+        self.previous = token
+
+
+class StyleRule(object):
+    """Base class of the style rules.
+
+    A rule is instantiated for each file with its options (given as
+    keyword arguments), then the engine calls C{begin()}, C{visit()} on
+    each token and C{end()}. The violations are recorded with
+    C{report()}.
+
+    """
+
+    # Name of the rule
+    name = None
+
+    def __init__(self, source):
+        self.source = source
+        self.violations = []
+
+    def report(self, line, message):
+        """Record a violation of the rule.
+
+        @param line: The line of the violation (from 1).
+
+        @param message: The description of the violation.
+
+        """
+        self.violations.append(Violation(self.source.path, line, self.name,
+                                         message))
+
+    def begin(self):
+        """Method called before the first token of the file."""
+
+    def visit(self, token, context):
+        """Method called on each token of the file (spaces and newlines
+        excluded), in the order of the file."""
+
+    def end(self):
+        """Method called after the last token of the file."""
+
+
+@style_rule
+class LineLength(StyleRule):
+    """Lines must not be longer than C{limit} columns (tabs expanded)."""
+
+    name = 'line_length'
+
+    def __init__(self, source, limit=79, tab_size=8):
+        StyleRule.__init__(self, source)
+        self.limit = limit
+        self.tab_size = tab_size
+
+    def begin(self):
+        for number, line in enumerate(self.source.lines, 1):
+            length = len(line.expandtabs(self.tab_size)) if '\t' in line \
+                else len(line)
+            if length > self.limit:
+                self.report(number, 'line too long (%d > %d)'
+                            % (length, self.limit))
+
+
+@style_rule
+class Indentation(StyleRule):
+    """Indentation must not mix a space followed by a tab, must not use
+    tabs if C{tabs} is False, and lines must not end with spaces."""
+
+    name = 'indentation'
+
+    def __init__(self, source, tabs=True):
+        StyleRule.__init__(self, source)
+        self.tabs = tabs
+
+    def begin(self):
+        for number, line in enumerate(self.source.lines, 1):
+            stripped = line.lstrip(' \t')
+            indent = line[:len(line) - len(stripped)]
+            if ' \t' in indent:
+                self.report(number, 'space before tab in indentation')
+            elif not self.tabs and '\t' in indent:
+                self.report(number, 'tab in indentation')
+            if stripped and line[-1] in ' \t':
+                self.report(number, 'trailing whitespace')
+
+
+@style_rule
+class BracePlacement(StyleRule):
+    """Placement of the braces of the functions and blocks.
+
+    The brace opening the body of a function is always on its own line.
+    With the C{'gnu'} and C{'allman'} styles, the braces of the blocks
+    are on their own line too; with the C{'kr'} style, the opening brace
+    of a block ends the line of its statement. A closing brace never
+    follows a statement on the same line.
+
+    """
+
+    name = 'brace_placement'
+
+    def __init__(self, source, style='gnu'):
+        StyleRule.__init__(self, source)
+        self.style = style
+
+    def visit(self, token, context):
+        if context.brace is None or context.brace == 'initializer':
+            return
+
+        previous = context.previous
+        own_line = previous is None or previous.line < token.line
+        if token.text == '{':
+            if context.brace == 'function' or self.style != 'kr':
+                if not own_line:
+                    self.report(token.line, "'{' of %s not on its own line"
+                                % ('function %s' % context.function
+                                   if context.brace == 'function'
+                                   else 'block'))
+            elif own_line and previous.text not in ('{', '}', ';'):
+                self.report(token.line, "'{' of block on its own line")
+        elif not own_line and previous.text not in ('{', '}'):
+            self.report(token.line, "'}' not on its own line")
+
+
+@style_rule
+class Naming(StyleRule):
+    """Names of the functions must be in lower case (snake_case) and names
+    of the macros in upper case."""
+
+    name = 'naming'
+
+    def __init__(self, source, functions=r'^_*[a-z][a-z0-9_]*$',
+                 macros=r'^_*[A-Z][A-Z0-9_]*$'):
+        import re
+
+        StyleRule.__init__(self, source)
+        self.functions = re.compile(functions)
+        self.macros = re.compile(macros)
+        self.define = re.compile(r'^\s*#\s*define\s+(\w+)')
+
+    def visit(self, token, context):
+        if token.kind == 'preprocessor':
+            match = self.define.match(token.text)
+            if match and not self.macros.match(match.group(1)):
+                self.report(token.line, "macro name '%s' not in upper case"
+                            % match.group(1))
+        elif token.text == '(' and context.depth == 0 and \
+                context.parens == 0:
+            previous, before = context.previous, context.before
+            if previous is not None and previous.kind == 'identifier' and \
+               before is not None and \
+               (before.kind in ('identifier', 'keyword') or
+                before.text == '*') and \
+               not self.functions.match(previous.text):
+                self.report(previous.line, "function name '%s' not in lower"
+                            " case" % previous.text)
+
+
+@style_rule
+class FunctionLength(StyleRule):
+    """Bodies of the functions must not be longer than C{limit} lines."""
+
+    name = 'function_length'
+
+    def __init__(self, source, limit=50):
+        StyleRule.__init__(self, source)
+        self.limit = limit
+
+    def visit(self, token, context):
+        if context.brace == 'function' and token.text == '}' and \
+           context.depth == 1 and context.function_line is not None:
+            length = token.line - context.function_line - 1
+            if length > self.limit:
+                self.report(context.function_line,
+                            'function %s too long (%d > %d lines)'
+                            % (context.function, length, self.limit))
+
+
+def _resolve_rules(rules):
+    """Turn a list of rule names, classes or C{(rule, options)} tuples into
+    a list of C{(class, options)} tuples."""
+    resolved = []
+    for rule in rules:
+        options = {}
+        if isinstance(rule, tuple):
+            rule, options = rule
+        if not isinstance(rule, type):
+            try:
+                rule = _RULES[rule]
+            except KeyError:
+                raise LookupError('unknown style rule: %s' % rule)
+        resolved.append((rule, dict(options)))
+    return resolved
+
+
+def check_source(source, rules):
+    """Run style rules over a tokenized source file in a single pass.
+
+    @param source: The L{checkproject.ctokens.SourceFile}.
+
+    @param rules: A list of C{(class, options)} tuples.
+
+    @return: The list of the L{Violation}, sorted by line.
+
+    """
+    visitors = [cls(source, **options) for cls, options in rules]
+    context = Context()
+
+    for visitor in visitors:
+        visitor.begin()
+    for token in source.tokens:
+        context.enter(token)
+        for visitor in visitors:
+            visitor.visit(token, context)
+        context.leave(token)
+    violations = []
+    for visitor in visitors:
+        visitor.end()
+        violations.extend(visitor.violations)
+
+    violations.sort(key=lambda violation: violation.line)
+    return violations
+
+
+def _check_path(path, rules, disk_cache, source=None):
+    """Read, tokenize and check a file (executed by the workers)."""
+    from checkproject.ctokens import read_source
+
+    return check_source(read_source(path, disk_cache, source), rules)
+
+
+class StyleEngine(object):
+    """Engine running the style rules over C source files."""
+
+    def __init__(self, rules=None, jobs=None, disk_cache=True):
+        """Constructor of the engine.
+
+        @param rules: The rules to apply: a list of rule names, rule
+        classes or C{(rule, options)} tuples (default to all the
+        declared rules with their default options).
+
+        @param jobs: Number of worker processes (default to the number
+        of processors, 1 to check the files in the current process).
+
+        @param disk_cache: Cache the token streams on disk.
+
+        """
+        self.rules = _resolve_rules(sorted(_RULES) if rules is None
+                                    else rules)
+        self.jobs = jobs
+        self.disk_cache = disk_cache
+
+    def run(self, paths, source=None):
+        """Check the style of files.
+
+        @param paths: The paths of the files.
+
+        @param source: The L{checkproject.source.ProjectSource} holding
+        the files (the paths are then relative to the project), or None
+        to read the files from the file system.
+
+        @return: A dictionary mapping each path to its list of
+        L{Violation}.
+
+        """
+        from checkproject.utils import picklable, process_pool
+
+        paths = list(paths)
+        # The rules declared in a check module cannot be sent to the
+        # workers, they are applied in the current process
+        if self.jobs == 1 or len(paths) < PARALLEL_THRESHOLD or \
+           not picklable((self.rules, source)):
+            return dict((path, _check_path(path, self.rules,
+                                           self.disk_cache, source))
+                        for path in paths)
+
+        results = process_pool(self.jobs).map(
+            _check_path, paths, [self.rules] * len(paths),
+            [self.disk_cache] * len(paths), [source] * len(paths),
+            chunksize=max(len(paths) // 64, 1))
+        return dict(zip(paths, results))
+
+    def run_files(self, files, globs=C_SOURCES):
+        """Check the style of the C files of a project (a directory or an
+        archive).
+
+        @param files: The L{checkproject.files.Files} of the project.
+
+        @param globs: Globbing expressions of the files to check
+        (matched against their path).
+
+        @return: A dictionary mapping the path of each file in the
+        project to its list of L{Violation} (whose paths are relative to
+        the project too).
+
+        """
+        from checkproject.files import _compile_globs
+
+        pattern = _compile_globs(globs)
+        return self.run((_file[0] for _file in files.files
+                         if _file[1] == 'f' and pattern.match(_file[0])),
+                        files.source)
@@ -1,4 +1,6 @@
 """Utility functions for this module"""
+import threading
+
 
 def remove_prefix(path, prefix):
     """Remove a given prefix from a path
@@ -20,3 +22,89 @@ def remove_prefix(path, prefix):
         raise ValueError('path and prefix do not match')
 
     return str(path[len(prefix) + 1:])
+
+def cache_dir(*subdirs):
+    """Get (and create if needed) a directory where to store cached data.
+
+    The top cache directory is given by the C{CHECKPROJECT_CACHE_DIR}
+    environment variable and default to C{~/.cache/checkproject}.
+
+    @param subdirs: Names of the sub-directories inside the top cache
+    directory.
+
+    @return: The path to the cache directory.
+
+    """
+    import os
+
+    top_dir = os.environ.get('CHECKPROJECT_CACHE_DIR')
+    if not top_dir:
+        top_dir = os.path.join(os.path.expanduser('~'), '.cache',
+                               'checkproject')
+
+    path = os.path.join(top_dir, *subdirs)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    return path
+
+def picklable(obj):
+    """Tell if an object can be sent to a worker process (the classes
+    defined in the check modules cannot, their modules not being
+    importable).
+
+    @param obj: The object.
+
+    @return: True if the object can be pickled.
+
+    """
+    import pickle
+
+    try:
+        pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False
+    return True
+
+
+# Pools of worker processes shared in the process: jobs -> pool
+_PROCESS_POOLS = {}
+_PROCESS_POOLS_PID = None
+_POOLS_LOCK = threading.Lock()
+
+
+def process_pool(jobs=None):
+    """Get a pool of worker processes shared by all the checks run by the
+    process, created the first time it is needed (and shut down when
+    the process exits).
+
+    @param jobs: Number of worker processes (default to the number of
+    processors).
+
+    @return: A C{concurrent.futures.ProcessPoolExecutor}.
+
+    """
+    global _PROCESS_POOLS_PID
+    from concurrent.futures import ProcessPoolExecutor
+    import atexit
+    import os
+
+    with _POOLS_LOCK:
+        if _PROCESS_POOLS_PID != os.getpid():
+            # The pools of the parent process are not usable
+            _PROCESS_POOLS.clear()
+            _PROCESS_POOLS_PID = os.getpid()
+            atexit.register(_shutdown_pools)
+        pool = _PROCESS_POOLS.get(jobs)
+        # A pool whose worker died cannot be used anymore
+        if pool is None or getattr(pool, '_broken', False):
+            pool = ProcessPoolExecutor(max_workers=jobs)
+            _PROCESS_POOLS[jobs] = pool
+        return pool
+
+
+def _shutdown_pools():
+    """Shut down the pools of worker processes of the process."""
+    for pool in list(_PROCESS_POOLS.values()):
+        pool.shutdown(wait=True)
+    _PROCESS_POOLS.clear()
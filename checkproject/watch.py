@@ -0,0 +1,504 @@
+# -*- coding: utf-8
+"""Watching a project and re-running the checks affected by its changes.
+
+The project tree is watched with inotify (through ctypes, on Linux) or,
+when inotify is not available, by polling the modification times of
+its files. The changes arriving in a burst (an editor saving several
+files, a 'git checkout', ...) are gathered until the tree is quiet for
+DEBOUNCE seconds, then only the check classes depending on a changed
+file run again: the classes whose C{inputs} globbing expressions match
+a changed path (all the classes without C{inputs} depend on the whole
+project). The results of the other classes are kept from the
+previous run. The check modules stay loaded in the registry, and the
+classes of a check module edited in the meantime run again as well.
+
+The changes made by the checks themselves (the files built in the
+project, for example) are ignored: a path changed while the checks run
+is taken for an output of the checks when the previous run wrote the
+same content to it, and for an edit of the project otherwise, the
+checks then running again. So the outputs of the checks are learnt
+after their first run (which may be followed by a second one), and
+outputs which differ from one run to the next always run the checks
+again.
+
+"""
+
+# Seconds of quiet closing a burst of changes
+DEBOUNCE = 0.3
+
+# Seconds between two scans of the polling watcher
+POLL_INTERVAL = 1.0
+
+# Events of inotify (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Events watched on each directory
+IN_WATCHED = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+              IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+              IN_MOVE_SELF)
+
+# Path reported when the whole tree may have changed
+EVERYTHING = ''
+
+
+class Watcher(object):
+    """Interface of the watchers of a tree of files."""
+
+    def read(self, timeout=None):
+        """Wait for changes in the tree.
+
+        @param timeout: Maximum time to wait (in seconds, forever if
+        None).
+
+        @return: The set of the changed paths, relative to the root of
+        the tree (empty if no change happened before the timeout,
+        L{EVERYTHING} if the changes are unknown).
+
+        """
+        raise NotImplementedError
+
+    def drain(self):
+        """Drop the changes received so far."""
+        while self.read(0):
+            pass
+
+    def close(self):
+        """Stop watching the tree."""
+
+
+class PollingWatcher(Watcher):
+    """Watcher comparing the modification times of the files of a tree
+    (or of a single file, an archive for example) between two scans."""
+
+    def __init__(self, root, interval=POLL_INTERVAL, ignore=None):
+        from checkproject.files import VCS_DIRECTORIES
+
+        self.root = root
+        self.interval = interval
+        self.ignore = VCS_DIRECTORIES if ignore is None else ignore
+        self._state = self._scan()
+
+    def _scan(self):
+        """Stat all the files of the tree.
+
+        @return: A dictionary mapping the paths to C{(mtime, size,
+        mode)} tuples.
+
+        """
+        import os
+
+        state = {}
+        if not os.path.isdir(self.root):
+            try:
+                stat = os.stat(self.root)
+                state[EVERYTHING] = (stat.st_mtime_ns, stat.st_size,
+                                     stat.st_mode)
+            except OSError:
+                pass
+            return state
+
+        for directory, directories, files in os.walk(self.root):
+            directories[:] = [name for name in directories
+                              if name not in self.ignore]
+            relative = os.path.relpath(directory, self.root)
+            for name in directories + files:
+                path = name if relative == '.' else \
+                    os.path.join(relative, name)
+                try:
+                    stat = os.lstat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size, stat.st_mode)
+        return state
+
+    def read(self, timeout=None):
+        import time
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._scan()
+            changed = set(path for path in set(state) | set(self._state)
+                          if state.get(path) != self._state.get(path))
+            self._state = state
+            if changed:
+                return changed
+
+            if deadline is None:
+                delay = self.interval
+            else:
+                delay = min(self.interval, deadline - time.monotonic())
+                if delay <= 0:
+                    return changed
+            time.sleep(delay)
+
+    def drain(self):
+        self._state = self._scan()
+
+
+class InotifyWatcher(Watcher):
+    """Watcher of a tree of directories through inotify (Linux only)."""
+
+    def __init__(self, root, ignore=None):
+        """Watch all the directories of a tree.
+
+        @raise OSError: If inotify is not available.
+
+        """
+        from checkproject.files import VCS_DIRECTORIES
+        import ctypes
+        import ctypes.util
+        import os
+
+        self.root = root
+        self.ignore = VCS_DIRECTORIES if ignore is None else ignore
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                 use_errno=True)
+        try:
+            self._add_watch = self._libc.inotify_add_watch
+        except AttributeError:
+            raise OSError('inotify is not available')
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32]
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # Watched directories: watch descriptor -> relative path
+        self._watches = {}
+        try:
+            self._watch_tree('')
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, path):
+        """Watch a directory and all its subdirectories.
+
+        @return: The paths of the entries found in the tree.
+
+        """
+        import ctypes
+        import os
+
+        found = []
+        top = os.path.join(self.root, path)
+        for directory, directories, files in os.walk(top):
+            directories[:] = [name for name in directories
+                              if name not in self.ignore]
+            relative = os.path.relpath(directory, self.root)
+            if relative == '.':
+                relative = ''
+            descriptor = self._add_watch(self._fd, os.fsencode(directory),
+                                         IN_WATCHED)
+            if descriptor < 0:
+                errno = ctypes.get_errno()
+                if directory == top and not path:
+                    raise OSError(errno, os.strerror(errno), directory)
+                continue
+            self._watches[descriptor] = relative
+            found.extend(os.path.join(relative, name)
+                         for name in directories + files)
+        return found
+
+    def read(self, timeout=None):
+        import os
+        import select
+        import struct
+
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        header = struct.Struct('iIII')
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                descriptor, mask, _, length = header.unpack_from(data,
+                                                                 offset)
+                offset += header.size
+                name = os.fsdecode(data[offset:offset + length]
+                                   .rstrip(b'\0'))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    changed.add(EVERYTHING)
+                    continue
+                if mask & IN_IGNORED:
+                    self._watches.pop(descriptor, None)
+                    continue
+                directory = self._watches.get(descriptor)
+                if directory is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    changed.add(directory or EVERYTHING)
+                    continue
+                if name in self.ignore:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                changed.add(path)
+                # Watch the new directories, their files may have been
+                # created before the watch
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self._watch_tree(path))
+        return changed
+
+    def close(self):
+        import os
+
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def watcher(root, poll=False):
+    """Get the best watcher available for a project.
+
+    @param root: The directory (or the archive) of the project.
+
+    @param poll: Force the polling watcher.
+
+    @return: A L{Watcher} object.
+
+    """
+    import os
+
+    if not poll and os.path.isdir(root):
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root)
+
+
+def debounce(source, delay=DEBOUNCE, changed=()):
+    """Wait for a burst of changes and gather them.
+
+    @param source: The L{Watcher} of the tree.
+
+    @param delay: Seconds of quiet closing the burst.
+
+    @param changed: The paths already known to be changed (the burst is
+    then not waited for).
+
+    @return: The set of the changed paths.
+
+    """
+    changed = set(changed)
+    while not changed:
+        changed = source.read()
+    while True:
+        more = source.read(delay)
+        if not more:
+            return changed
+        changed |= more
+
+
+def _contents(root, paths):
+    """Get the hashes of the content of files of a tree.
+
+    @return: A dictionary mapping the paths to the hashes of their
+    content (None for the directories and the missing files).
+
+    """
+    from checkproject.hashcache import hash_stream
+    import os
+
+    contents = {}
+    for path in paths:
+        try:
+            with open(os.path.join(root, path) if path else root,
+                      'rb') as _file:
+                contents[path] = hash_stream(_file)
+        except (IOError, OSError):
+            contents[path] = None
+    return contents
+
+
+def affected(cls, changed):
+    """Tell if a check class depends on changed paths of the project.
+
+    @param cls: The check class (see L{checkproject.case.CheckCase}).
+
+    @param changed: The set of the changed paths.
+
+    """
+    from checkproject.files import _compile_globs
+
+    if EVERYTHING in changed or cls.inputs is None:
+        return bool(changed)
+    pattern = _compile_globs(cls.inputs)
+    return any(pattern.match(path) for path in changed)
+
+
+class WatchRunner(object):
+    """Runner checking a project again each time it changes."""
+
+    def __init__(self, project_dir, checks_dir, store=None, reporter=None,
+                 timeout=None, delay=DEBOUNCE, poll=False):
+        """Constructor of the runner.
+
+        @param project_dir: The directory (or the archive) of the project.
+
+        @param checks_dir: Root directory of the check modules.
+
+        @param store: The L{checkproject.store.ResultStore} used to
+        replay the results of the unchanged checks.
+
+        @param reporter: The L{checkproject.report.Reporter} receiving the
+        events of the checks run.
+
+        @param timeout: Default time budget of the check methods (in
+        seconds, no limit if None).
+
+        @param delay: Seconds of quiet closing a burst of changes.
+
+        @param poll: Poll the project instead of using inotify.
+
+        """
+        from checkproject.files import FileSnapshot
+        from checkproject.runner import CheckRunner
+
+        self.project_dir = project_dir
+        self.checks_dir = checks_dir
+        self.runner = CheckRunner(project_dir, checks_dir, store=store,
+                                  reporter=reporter, timeout=timeout)
+        self.delay = delay
+        self.poll = poll
+        # Files of the project kept between the runs
+        self.snapshot = FileSnapshot(project_dir)
+        # Results of the check classes of the last run: check id -> result
+        self.results = {}
+        # Signatures of the check modules of the last run
+        self._modules = {}
+
+    def _outdated(self, module_path, cls, changed):
+        """Tell if the result of a check class must be computed again."""
+        from checkproject.registry import CheckRegistry
+
+        check_id = '%s.%s' % (module_path, cls.__name__)
+        return check_id not in self.results or \
+            self._modules.get(module_path) != \
+            CheckRegistry._signature(module_path) or \
+            affected(cls, changed)
+
+    def run_once(self, changed=(EVERYTHING,), pattern='Check*'):
+        """Run the check classes depending on changed paths.
+
+        @param changed: The changed paths of the project (all the checks
+        run by default).
+
+        @return: A tuple C{(result, run)}: the L{CheckResult} of all the
+        checks (the results of the classes not run being kept from the
+        previous run), and the ids of the check classes run.
+
+        """
+        from checkproject.files import FileSnapshot
+        from checkproject.fixtures import FixtureManager
+        from checkproject.registry import CheckRegistry
+        from checkproject.result import CheckResult
+        from checkproject.runner import _instantiate_check, _prepare_check
+        import os
+        import sys
+
+        changed = set(changed)
+        reporter = self.runner.reporter
+        reporter.run_start(self.project_dir)
+        if os.path.isdir(self.snapshot.root):
+            self.snapshot.refresh()
+        else:
+            # An archive changes as a whole, open it again
+            self.snapshot.close()
+            self.snapshot = FileSnapshot(self.project_dir)
+        fixtures = FixtureManager(self.project_dir)
+        options = {'snapshot': self.snapshot, 'store': self.runner.store,
+                   'reporter': reporter, 'timeout': self.runner.timeout,
+                   'fixtures': fixtures}
+
+        # Discover the checks again (new or removed modules), the modules
+        # loaded being kept by the registry
+        self.runner.checks = None
+        result = CheckResult()
+        results = {}
+        run = []
+        modules = {}
+        try:
+            for module_name, module_path, cls in \
+                    self.runner.classes(pattern):
+                key = '%s.%s' % (module_path, cls.__name__)
+                if self._outdated(module_path, cls, changed):
+                    check = _instantiate_check(cls, self.project_dir,
+                                               module_name)
+                    _prepare_check(check, module_name, module_path,
+                                   **options)
+                    check_result = CheckResult()
+                    check.run(check_result)
+                    run.append(check.check_id)
+                else:
+                    check_result = self.results[key]
+                results[key] = check_result
+                modules[module_path] = CheckRegistry._signature(module_path)
+                result.merge(check_result)
+                # The classes after a failure are run again next time
+                if result.has_failed():
+                    break
+        finally:
+            for error in fixtures.teardown():
+                sys.stderr.write('warning: fixture teardown failed: %r\n' %
+                                 error)
+
+        self.results = results
+        self._modules = modules
+        reporter.run_end(self.project_dir, result)
+        return result, run
+
+    def run(self, pattern='Check*'):
+        """Check the project, then check it again after each change.
+
+        @return: An endless iterator over C{(changed, result, run)}
+        tuples: the changed paths (L{EVERYTHING} for the first run) and
+        the results of L{run_once}.
+
+        """
+        source = watcher(self.snapshot.root, self.poll)
+        # Content of the paths changed during the last run
+        written = {}
+        try:
+            changed = set([EVERYTHING])
+            while True:
+                result, run = self.run_once(changed, pattern)
+                during = set()
+                more = source.read(0)
+                while more:
+                    during |= more
+                    more = source.read(0)
+                # The checks write the same content at each run, the
+                # other changes are edits made while they were running
+                contents = _contents(self.snapshot.root, during)
+                edits = set(path for path in during
+                            if path not in written or
+                            contents[path] != written[path])
+                written = contents
+                yield changed, result, run
+                changed = debounce(source, self.delay, edits)
+        finally:
+            source.close()
+            self.snapshot.close()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8
+"""Watchdog interrupting the code running for too long.
+
+In the main thread, the code is interrupted by a SIGALRM signal (which
+also interrupts the blocking system calls). In the other threads, the
+exception is raised asynchronously in the thread, which interrupts
+Python code but not a blocking call (the exception is raised when the
+call returns): the commands run with L{checkproject.command.run_command}
+get the time left before the deadline as timeout (see L{remaining}),
+but the other blocking calls of a check (C{time.sleep()}, reading a
+pipe, ...) can overrun the budget in a thread. The checks depending on
+them should be run in the main thread or in processes
+(C{--stage-executor process}).
+
+"""
+import contextlib
+import threading
+
+# Deadlines of the current thread (a stack of monotonic times)
+_LOCAL = threading.local()
+
+
+class Timeout(Exception):
+    """Timeout exception is raised in code which ran out of time."""
+
+
+def remaining():
+    """Get the time left before the closest deadline of the current
+    thread.
+
+    @return: The time left (in seconds, 0 if a deadline passed) or None
+    if no deadline is set.
+
+    """
+    import time
+
+    deadlines = getattr(_LOCAL, 'deadlines', None)
+    if not deadlines:
+        return None
+    return max(min(deadlines) - time.monotonic(), 0)
+
+
+@contextlib.contextmanager
+def _pushed(seconds):
+    """Record a deadline of the current thread during a 'with' block."""
+    import time
+
+    deadlines = getattr(_LOCAL, 'deadlines', None)
+    if deadlines is None:
+        deadlines = _LOCAL.deadlines = []
+    deadlines.append(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        deadlines.pop()
+
+
+def _raise_in_thread(thread_id, exception):
+    """Raise an exception asynchronously in a thread (or clear the pending
+    exception if C{exception} is None)."""
+    import ctypes
+
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id),
+        ctypes.py_object(exception) if exception is not None else None)
+
+
+@contextlib.contextmanager
+def _signal_deadline(seconds):
+    """Deadline implemented with SIGALRM (main thread only). A deadline
+    nested in another one cannot go beyond it, and the timer of the
+    outer deadline is restored (minus the time elapsed) on exit."""
+    import signal
+    import time
+
+    def expire(signum, frame):
+        raise Timeout('timed out after %gs' % seconds)
+
+    start = time.monotonic()
+    previous = signal.signal(signal.SIGALRM, expire)
+    outer, interval = signal.getitimer(signal.ITIMER_REAL)
+    # The closer outer deadline is kept
+    signal.setitimer(signal.ITIMER_REAL,
+                     min(seconds, outer) if outer else seconds)
+    try:
+        with _pushed(seconds):
+            yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        if outer:
+            # Restart the outer timer, expiring at once if it is due
+            left = outer - (time.monotonic() - start)
+            signal.setitimer(signal.ITIMER_REAL, max(left, 1e-6), interval)
+
+
+@contextlib.contextmanager
+def _thread_deadline(seconds):
+    """Deadline implemented with an asynchronous exception."""
+    thread_id = threading.current_thread().ident
+    lock = threading.Lock()
+    state = {'active': True, 'fired': False}
+
+    def expire():
+        with lock:
+            if state['active']:
+                state['fired'] = True
+                _raise_in_thread(thread_id, Timeout)
+
+    timer = threading.Timer(seconds, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        with _pushed(seconds):
+            yield
+    finally:
+        timer.cancel()
+        with lock:
+            state['active'] = False
+            if state['fired']:
+                # Clear the exception if it has not been raised yet
+                _raise_in_thread(thread_id, None)
+
+
+def deadline(seconds):
+    """Interrupt the code of a 'with' statement running for too long by
+    raising a L{Timeout} exception.
+
+    @param seconds: The time budget (no deadline if None).
+
+    """
+    import signal
+
+    if seconds is None:
+        return contextlib.nullcontext()
+    if threading.current_thread() is threading.main_thread() and \
+       hasattr(signal, 'setitimer'):
+        return _signal_deadline(seconds)
+    return _thread_deadline(seconds)
@@ -1,4 +1,5 @@
 #!/bin/sh
 
 export PYTHONPATH=../
+python3 -m unittest discover -s unit -t unit || exit 1
 python3 ../checkproject example/project example/checks
@@ -1,13 +1,12 @@
 # Checking project files and directories
 
 from checkproject.case import CheckCase
-from checkproject.files import Files
 
 class CheckProjectFiles(CheckCase):
     """Checking the content of the projet."""
 
     def check_required(self):
-        files = Files(self.project_path)
+        files = self.files()
 
         # Check required files
         print("* Missing files:")
@@ -36,7 +35,7 @@ class CheckProjectFiles(CheckCase):
         # Check unwanted files
         print("* Unwanted files:")
 
-        files = Files(self.project_path)
+        files = self.files()
         unwanted_files = [('*', 'f', 'executable'), ('*~', 'f'),
                           ('.*', 'f'),('_*', 'd'), ('._*', 'd')]
         unwanted = files.unwanted(unwanted_files)
@@ -1,4 +1,30 @@
+# Checking the coding style of the C files
+
 from checkproject.case import CheckCase
+from checkproject.style import StyleEngine
 
 class CheckProjectFiles3(CheckCase):
     """Checking the content of the projet."""
+
+    def check_codingstyle(self):
+        """Checking the coding style of the C files."""
+        print("* Coding style:")
+
+        engine = StyleEngine([('line_length', {'limit': 80}),
+                              ('indentation', {'tabs': True}),
+                              ('brace_placement', {'style': 'gnu'}),
+                              'naming',
+                              ('function_length', {'limit': 50})])
+        violations = engine.run_files(self.files())
+
+        found = False
+        for path, file_violations in sorted(violations.items()):
+            for violation in file_violations:
+                print(violation.describe())
+                self.warning(False, violation.describe())
+                found = True
+
+        if not found:
+            print('No coding style violation found!')
+            self.warning(True)
+        print('')
@@ -0,0 +1,12 @@
+# Static analysis of the C files of the module
+
+from checkproject.case import CheckCase
+
+class CheckModuleStaticAnalysis(CheckCase):
+    """Static analysis of the module."""
+
+    def check_unsafe_functions(self):
+        """Checking the calls of unsafe functions."""
+        findings = self.analyze(['unsafe_functions'], hidden=True)
+        if not any(findings.values()):
+            self.warning(True)
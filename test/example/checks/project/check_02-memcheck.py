@@ -0,0 +1,36 @@
+# Checking the memory errors of the program with valgrind
+
+import os
+import shutil
+
+from checkproject.case import CheckCase
+
+# Reports of memcheck recorded for the tests (used without valgrind)
+RECORDED = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'memcheck')
+
+# Tests of the program: (name, arguments, standard input)
+TESTS = [('hello', ['3'], None),
+         ('version', ['-v'], None),
+         ('interactive-eof', ['-i'], b'')]
+
+class CheckMemcheck(CheckCase):
+    """Checking the memory errors of the program."""
+
+    def check_memcheck(self):
+        """Checking the memory errors of the program with valgrind."""
+        print("* Memcheck:")
+
+        if shutil.which('valgrind'):
+            build = self.build()
+            self.failure(build.succeeded(), build.describe())
+
+        # The memory errors are recorded as hidden errors and warnings
+        results = self.memcheck(['./project'], TESTS, hidden=True,
+                                recorded=RECORDED, timeout=60)
+
+        for result in results:
+            print(result)
+            for error in result.errors:
+                print('  ' + error.describe())
+        print('')
@@ -0,0 +1,27 @@
+# Static analysis of the C files of the project
+
+from checkproject.case import CheckCase
+
+class CheckStaticAnalysis(CheckCase):
+    """Static analysis of the project."""
+
+    # Only the C files are analyzed
+    inputs = ('*.c', '*.h')
+
+    def check_static_analysis(self):
+        """Checking the findings of the static analyzers."""
+        print("* Static analysis:")
+
+        findings = self.analyze([('gcc', {'include_dirs': ('include',)}),
+                                 'unsafe_functions'])
+
+        found = False
+        for path, file_findings in sorted(findings.items()):
+            for finding in file_findings:
+                print(finding.describe())
+                found = True
+
+        if not found:
+            print('No finding of the static analyzers!')
+            self.warning(True)
+        print('')
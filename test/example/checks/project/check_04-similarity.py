@@ -0,0 +1,25 @@
+# Detection of the copied projects
+
+import os
+import tempfile
+
+from checkproject.case import CheckCase
+
+# Index of the projects checked with the example (not shared with the
+# real cohorts)
+INDEX = os.path.join(tempfile.gettempdir(),
+                     'checkproject-example-similarity.sqlite')
+
+class CheckSimilarity(CheckCase):
+    """Similarity with the other projects."""
+
+    def check_similarity(self):
+        """Looking for the projects similar to this one."""
+        print("* Similar projects:")
+
+        peers = self.similar_projects(INDEX, threshold=0.8)
+        for peer in peers:
+            print(peer.describe())
+        if not peers:
+            print('No similar project.')
+        print('')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8
+"""Tests of the runner interleaving the checks on an event loop."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from checkproject.aiorunner import AsyncRunner
+
+CHECK_MODULE = '''
+import threading
+
+from checkproject.case import CheckCase
+
+THREADS = []
+
+class CheckAsync(CheckCase):
+    def setup_class(self):
+        THREADS.append(('setup_class', threading.current_thread().name))
+
+    async def check_coroutine(self):
+        THREADS.append(('coroutine', threading.current_thread().name))
+
+    def teardown_class(self):
+        THREADS.append(('teardown_class', threading.current_thread().name))
+'''
+
+
+class AsyncRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.checks_dir = os.path.join(self.root, 'checks')
+        os.makedirs(self.checks_dir)
+        with open(os.path.join(self.checks_dir, 'check_01-async.py'),
+                  'w') as _file:
+            _file.write(CHECK_MODULE)
+        self.projects = []
+        for name in ('first', 'second'):
+            self.projects.append(os.path.join(self.root, name))
+            os.makedirs(self.projects[-1])
+
+    def test_run(self):
+        from checkproject.registry import default_registry
+
+        runner = AsyncRunner(self.projects, self.checks_dir, jobs=2)
+        results = runner.run()
+        self.assertFalse(isinstance(results, list))
+        self.assertEqual(sorted(project for project, _ in results),
+                         self.projects)
+
+        module = default_registry().module(os.path.join(self.checks_dir,
+                                                        'check_01-async.py'))
+        loop_thread = threading.current_thread().name
+        self.assertEqual(len(module.THREADS), 6)
+        for step, thread in module.THREADS:
+            # Only the coroutines run on the thread of the loop
+            self.assertEqual(thread == loop_thread, step == 'coroutine',
+                             step)
+
+    def test_process_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(1) as executor:
+            self.assertRaises(TypeError, AsyncRunner, self.projects,
+                              self.checks_dir, executor=executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
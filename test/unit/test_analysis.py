@@ -0,0 +1,99 @@
+# -*- coding: utf-8
+"""Tests of the analysis runner: the cache of the findings and the
+analyzers run in the current process."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from checkproject.analysis import (PARALLEL_THRESHOLD, AnalysisCache,
+                                   AnalysisRunner, Analyzer, Finding)
+from checkproject.files import Files
+from checkproject.hashcache import HashCache
+
+
+class IncludesAnalyzer(Analyzer):
+    """Analyzer reporting the lines of the C files including a header
+    which declares 'deprecated'."""
+
+    name = 'includes'
+    globs = ('*.c',)
+    depends = ('*.h',)
+    needs_directory = True
+
+    # Number of files analyzed (in the current process)
+    analyzed = 0
+
+    def analyze(self, path, content, directory=None):
+        IncludesAnalyzer.analyzed += 1
+        findings = []
+        for number, line in enumerate(content.split(b'\n'), 1):
+            if not line.startswith(b'#include "'):
+                continue
+            header = os.path.join(directory, os.path.dirname(path),
+                                  line.split(b'"')[1].decode())
+            with open(header, 'rb') as _file:
+                if b'deprecated' in _file.read():
+                    findings.append(Finding(self.name, path, number,
+                                            'warning', 'deprecated header'))
+        return findings
+
+
+class AnalysisRunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.hash_cache = HashCache()
+        self.cache = AnalysisCache(':memory:')
+        self.addCleanup(self.cache.close)
+        for number in range(PARALLEL_THRESHOLD + 2):
+            self.write('file%d.c' % number, '#include "module.h"\n')
+        self.write('module.h', 'int f(void);\n')
+
+    def write(self, path, content):
+        with open(os.path.join(self.root, path), 'w') as _file:
+            _file.write(content)
+
+    def run_analyzer(self, analyzer):
+        runner = AnalysisRunner([analyzer], jobs=1, cache=self.cache)
+        return runner.run_files(Files(self.root), self.hash_cache)
+
+    def test_depends(self):
+        IncludesAnalyzer.analyzed = 0
+        results = self.run_analyzer(IncludesAnalyzer())
+        self.assertEqual(sum(map(len, results.values())), 0)
+        self.assertEqual(IncludesAnalyzer.analyzed, PARALLEL_THRESHOLD + 2)
+
+        # Nothing changed: the findings are cached
+        self.run_analyzer(IncludesAnalyzer())
+        self.assertEqual(IncludesAnalyzer.analyzed, PARALLEL_THRESHOLD + 2)
+
+        # A header changed: the files are analyzed again
+        self.write('module.h', 'int f(void); /* deprecated */\n')
+        os.utime(os.path.join(self.root, 'module.h'), (0, 0))
+        results = self.run_analyzer(IncludesAnalyzer())
+        self.assertEqual(IncludesAnalyzer.analyzed,
+                         2 * (PARALLEL_THRESHOLD + 2))
+        self.assertEqual(results['file0.c'][0].line, 1)
+
+    def test_unpicklable_analyzer(self):
+        class LocalAnalyzer(Analyzer):
+            name = 'local'
+            globs = ('*.c',)
+
+            def analyze(self, path, content, directory=None):
+                return [Finding(self.name, path, None, 'warning', 'seen')]
+
+        # Enough files for the worker processes, but the analyzer cannot
+        # be sent to them
+        runner = AnalysisRunner([LocalAnalyzer()], jobs=2, cache=self.cache)
+        results = runner.run_files(Files(self.root), self.hash_cache)
+        self.assertEqual(len(results), PARALLEL_THRESHOLD + 2)
+        self.assertTrue(all(findings[0].message == 'seen'
+                            for findings in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8
+"""Tests of the scans, the searches and the comparisons of Files."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from checkproject.files import Files
+from checkproject.hashcache import HashCache
+
+
+def make_tree(root, entries):
+    """Create files in a directory: path -> content (None for a
+    directory)."""
+    for path, content in entries.items():
+        path = os.path.join(root, path)
+        if content is None:
+            os.makedirs(path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as _file:
+            _file.write(content)
+
+
+class FilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        make_tree(self.root, {
+            'Makefile': 'all:\n',
+            'src/main.c': 'int main(void) { return 0; }\n',
+            'src/main.o': '',
+            'src/module.c': 'int f(void) { return 1; }\n',
+            'include/module.h': 'int f(void);\n',
+            '.git/HEAD': 'ref: refs/heads/master\n',
+            'build/deep/a/b/c.txt': 'x\n',
+        })
+        os.chmod(os.path.join(self.root, 'Makefile'), 0o644)
+        script = os.path.join(self.root, 'run.sh')
+        with open(script, 'w') as _file:
+            _file.write('#!/bin/sh\n')
+        os.chmod(script, 0o755)
+
+
+class TestSearches(FilesTestCase):
+
+    def test_required(self):
+        files = Files(self.root)
+        missing = files.required([('Makefile', 'f'), ('src', 'd'),
+                                  ('run.sh', 'f', 'executable'),
+                                  ['src/main.c', 'f'],
+                                  ('README', 'f'), ('Makefile', 'd')])
+        self.assertEqual(missing, [('README', 'f'), ('Makefile', 'd')])
+
+    def test_required_executable(self):
+        files = Files(self.root)
+        self.assertEqual(files.required([('run.sh', 'f')]),
+                         [('run.sh', 'f')])
+
+    def test_unwanted(self):
+        files = Files(self.root)
+        unwanted = files.unwanted([('*.o', 'f'), ('*/main.*', 'f'),
+                                   ('*.sh', 'f', 'executable'),
+                                   ('build', 'd'), ('*.h', 'd')])
+        self.assertEqual(unwanted, [('build', 'd'),
+                                    ('run.sh', 'f', 'executable'),
+                                    ('src/main.c', 'f'),
+                                    ('src/main.o', 'f')])
+
+    def test_lookup_and_children(self):
+        files = Files(self.root)
+        self.assertEqual(files.lookup('src/main.c', 'f'), ('src/main.c', 'f'))
+        self.assertIsNone(files.lookup('src/main.c', 'd'))
+        self.assertEqual(sorted(files.children('src')),
+                         [('src/main.c', 'f'), ('src/main.o', 'f'),
+                          ('src/module.c', 'f')])
+        self.assertIsNone(files.children('missing'))
+
+
+class TestScan(FilesTestCase):
+
+    def paths(self, **options):
+        return [_file[0] for _file in Files(self.root, **options).files]
+
+    def test_sorted(self):
+        files = Files(self.root).files
+        self.assertEqual(files, sorted(files))
+
+    def test_ignore_prunes(self):
+        paths = self.paths(ignore=('.git', 'build', '*.o'))
+        self.assertNotIn('.git', paths)
+        self.assertNotIn('.git/HEAD', paths)
+        self.assertNotIn('build/deep', paths)
+        self.assertNotIn('src/main.o', paths)
+        self.assertIn('src/main.c', paths)
+
+    def test_ignore_by_path(self):
+        paths = self.paths(ignore=('src/main.*',))
+        self.assertNotIn('src/main.c', paths)
+        self.assertIn('src/module.c', paths)
+
+    def test_max_depth(self):
+        self.assertEqual(sorted(self.paths(max_depth=0)),
+                         ['.git', 'Makefile', 'build', 'include', 'run.sh',
+                          'src'])
+        paths = self.paths(max_depth=2)
+        self.assertIn('build/deep/a', paths)
+        self.assertNotIn('build/deep/a/b', paths)
+
+    def test_max_entries(self):
+        paths = self.paths(max_entries=2)
+        # The top directory has too many entries to be listed
+        self.assertEqual(paths, [])
+        make_tree(self.root, dict(('src/extra%d.c' % number, '')
+                                  for number in range(4)))
+        paths = self.paths(max_entries=6)
+        self.assertIn('src', paths)
+        self.assertNotIn('src/main.c', paths)
+        self.assertIn('include/module.h', paths)
+
+    def test_iterscan_is_lazy(self):
+        files = Files(self.root)
+        scanner = files.iterscan()
+        self.assertTrue(hasattr(scanner, '__next__'))
+        self.assertEqual(sorted(scanner), files.files)
+
+
+class TestDiff(FilesTestCase):
+
+    def setUp(self):
+        FilesTestCase.setUp(self)
+        self.reference = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.reference)
+        shutil.rmtree(self.reference)
+        shutil.copytree(self.root, self.reference, symlinks=True)
+        self.cache = HashCache()
+        self.addCleanup(self.cache.close)
+
+    def test_identical(self):
+        self.assertEqual(Files(self.root).diff(self.reference, self.cache),
+                         ([], [], []))
+
+    def test_changes(self):
+        with open(os.path.join(self.root, 'src/main.c'), 'a') as _file:
+            _file.write('/* changed */\n')
+        os.remove(os.path.join(self.root, 'src/module.c'))
+        make_tree(self.root, {'src/new.c': '', 'doc/README': 'doc\n'})
+        shutil.rmtree(os.path.join(self.root, 'build'))
+
+        added, removed, modified = Files(self.root).diff(self.reference,
+                                                         self.cache)
+        self.assertEqual(added, [('doc', 'd'), ('doc/README', 'f'),
+                                 ('src/new.c', 'f')])
+        self.assertEqual(removed, [('build', 'd'), ('build/deep', 'd'),
+                                   ('build/deep/a', 'd'),
+                                   ('build/deep/a/b', 'd'),
+                                   ('build/deep/a/b/c.txt', 'f'),
+                                   ('src/module.c', 'f')])
+        self.assertEqual(modified, [('src/main.c', 'f')])
+
+    def test_type_change(self):
+        os.remove(os.path.join(self.root, 'Makefile'))
+        os.mkdir(os.path.join(self.root, 'Makefile'))
+        added, removed, modified = Files(self.root).diff(
+            Files(self.reference), self.cache)
+        self.assertEqual(added, [('Makefile', 'd')])
+        self.assertEqual(removed, [('Makefile', 'f')])
+        self.assertEqual(modified, [])
+
+    def test_mode_change(self):
+        os.chmod(os.path.join(self.root, 'Makefile'), 0o755)
+        added, removed, modified = Files(self.root).diff(self.reference,
+                                                         self.cache)
+        self.assertEqual(modified, [('Makefile', 'f', 'executable')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8
+"""Tests of the parsing, the merging and the reporting of the memcheck
+errors."""
+
+import io
+import os
+import unittest
+
+from checkproject.memcheck import (MemcheckError, MemcheckResult,
+                                   merge_errors, parse_xml, report)
+
+# Reports of memcheck recorded for the example project
+REPORTS = os.path.join(os.path.dirname(__file__), os.pardir, 'example',
+                       'checks', 'project', 'memcheck')
+
+
+def read_report(name):
+    """Read a recorded report (bytes)."""
+    with open(os.path.join(REPORTS, name + '.xml'), 'rb') as _file:
+        return _file.read()
+
+
+class FakeCheck(object):
+    """Check recording the errors and the warnings reported."""
+
+    def __init__(self):
+        self.records = []
+
+    def error(self, condition, message, hidden=False):
+        self.records.append(('error', message, hidden))
+
+    def warning(self, condition, message, hidden=False):
+        self.records.append(('warning', message, hidden))
+
+
+def leak(kind, leaked=16, function='main', tests=()):
+    """Create a leak error allocated in a function of project.c."""
+    return MemcheckError(kind, '', (('malloc', 'vg_replace_malloc.c', 381,
+                                     '/usr/lib/valgrind/vgpreload.so'),
+                                    (function, 'project.c', 10,
+                                     '/tmp/project')),
+                         leaked=leaked, tests=tests)
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def test_clean_reports(self):
+        for name in ('hello', 'version'):
+            self.assertEqual(list(parse_xml(os.path.join(REPORTS,
+                                                         name + '.xml'))),
+                             [])
+
+    def test_error(self):
+        errors = list(parse_xml(os.path.join(REPORTS,
+                                             'interactive-eof.xml'),
+                                'interactive-eof'))
+        self.assertEqual(len(errors), 1)
+        error = errors[0]
+        self.assertEqual(error.kind, 'UninitCondition')
+        self.assertFalse(error.is_leak())
+        self.assertEqual(error.tests, ['interactive-eof'])
+        self.assertEqual(len(error.frames), 4)
+        self.assertEqual(error.frames[2],
+                         ('print_message', 'module.c', 39,
+                          '/tmp/checkproject-3kq0n2/project'))
+        # The frames in the C library are skipped
+        self.assertEqual(error.location(), 'module.c:39 (print_message)')
+        self.assertTrue(error.describe().endswith(
+            'at module.c:39 (print_message) [tests: interactive-eof]'))
+
+    def test_truncated_report(self):
+        content = read_report('interactive-eof')
+        end = content.index(b'</error>') + len(b'</error>')
+        errors = list(parse_xml(io.BytesIO(content[:end + 20])))
+        self.assertEqual([error.kind for error in errors],
+                         ['UninitCondition'])
+        # Killed in the middle of the error: nothing complete is found
+        errors = list(parse_xml(io.BytesIO(content[:end - 100])))
+        self.assertEqual(errors, [])
+
+
+class MergeTestCase(unittest.TestCase):
+
+    def test_same_error(self):
+        path = os.path.join(REPORTS, 'interactive-eof.xml')
+        errors = merge_errors(list(parse_xml(path, 'first')) +
+                              list(parse_xml(path, 'second')) +
+                              list(parse_xml(path, 'first')))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].count, 3)
+        self.assertEqual(errors[0].tests, ['first', 'second'])
+
+    def test_leaks(self):
+        errors = merge_errors([leak('Leak_DefinitelyLost', 16, tests=['a']),
+                               leak('Leak_DefinitelyLost', 64, tests=['b']),
+                               leak('Leak_DefinitelyLost', 8, 'parse'),
+                               leak('Leak_PossiblyLost', 8)])
+        self.assertEqual([(error.kind, error.frames[1][0], error.leaked,
+                           error.count) for error in errors],
+                         [('Leak_DefinitelyLost', 'main', 64, 2),
+                          ('Leak_DefinitelyLost', 'parse', 8, 1),
+                          ('Leak_PossiblyLost', 'main', 8, 1)])
+
+    def test_results(self):
+        first = leak('Leak_DefinitelyLost', tests=['a'])
+        results = [MemcheckResult('a', None, [first, first]),
+                   MemcheckResult('b', None,
+                                  [leak('Leak_DefinitelyLost', tests=['b'])])]
+        errors = merge_errors(results)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].count, 3)
+        self.assertEqual(errors[0].tests, ['a', 'b'])
+        # The merged errors are copies
+        self.assertEqual(first.count, 1)
+        self.assertEqual(first.tests, ['a'])
+
+
+class ReportTestCase(unittest.TestCase):
+
+    def test_severities(self):
+        check = FakeCheck()
+        errors = [leak('Leak_DefinitelyLost'), leak('Leak_IndirectlyLost'),
+                  leak('Leak_PossiblyLost'), leak('Leak_StillReachable'),
+                  MemcheckError('InvalidRead', 'Invalid read of size 4', ())]
+        self.assertFalse(report(check, errors, hidden=True))
+        self.assertEqual(check.records, [
+            ('error', 'DefinitelyLost: 16 bytes at project.c:10 (main)',
+             True),
+            ('warning', 'IndirectlyLost: 16 bytes at project.c:10 (main)',
+             True),
+            ('warning', 'PossiblyLost: 16 bytes at project.c:10 (main)',
+             True),
+            ('error', 'Invalid read of size 4', True)])
+
+    def test_overridden_severities(self):
+        check = FakeCheck()
+        errors = [leak('Leak_DefinitelyLost'), leak('Leak_PossiblyLost')]
+        self.assertFalse(report(check, errors,
+                                severities={'Leak_DefinitelyLost': 'warning',
+                                            'Leak_PossiblyLost': None}))
+        self.assertEqual([severity for severity, _, _ in check.records],
+                         ['warning'])
+
+    def test_clean(self):
+        check = FakeCheck()
+        self.assertTrue(report(check, [leak('Leak_StillReachable')]))
+        self.assertEqual(check.records, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
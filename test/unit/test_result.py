@@ -0,0 +1,115 @@
+# -*- coding: utf-8
+"""Tests of the records, the merges and the pickling of CheckResult."""
+
+import pickle
+import unittest
+
+from checkproject.result import CheckRecord, CheckResult
+
+
+def result_of(check, *severities):
+    result = CheckResult()
+    for severity in severities:
+        result.add(severity, check=check)
+    return result
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_indexes(self):
+        result = CheckResult()
+        result.add_success(check='a')
+        result.add_warning('w', check='a')
+        result.add_error('e', check='b')
+        self.assertEqual([(record.check, record.index)
+                          for record in result.records],
+                         [('a', 0), ('a', 1), ('b', 0)])
+
+    def test_counts(self):
+        result = CheckResult()
+        result.add_success()
+        result.add_success(hidden=True)
+        result.add_warning('w')
+        result.add_warning('hw', hidden=True)
+        result.add_error('e')
+        self.assertEqual(result.get_successes(), 1)
+        self.assertEqual(result.get_all_successes(), 2)
+        self.assertEqual(result.warning_results, ['w'])
+        self.assertEqual(result.hidden_warning_results, ['hw'])
+        self.assertEqual(result.error_results, ['e'])
+        self.assertFalse(result.has_failed())
+        result.add_failure('f')
+        self.assertTrue(result.has_failed())
+
+
+class TestMerge(unittest.TestCase):
+
+    def test_execution_order(self):
+        result = CheckResult()
+        for check in ('z', 'b', 'm'):
+            result.merge(result_of(check, 'success', 'error'))
+        self.assertEqual([record.check for record in result.records],
+                         ['z', 'z', 'b', 'b', 'm', 'm'])
+
+    def test_merged_counts(self):
+        result = CheckResult()
+        result.merge(result_of('a', 'success', 'warning'))
+        result.merge(result_of('b', 'error', 'success'))
+        self.assertEqual(result.scores, {
+            'successes': 2, 'hidden_successes': 0, 'warnings': 1,
+            'hidden_warnings': 0, 'errors': 1, 'hidden_errors': 0,
+            'failed': False})
+
+    def test_associative(self):
+        parts = [result_of('a', 'success'), result_of('b', 'warning'),
+                 result_of('c', 'error', 'success')]
+        left = CheckResult().merge(parts[0]).merge(parts[1]).merge(parts[2])
+        right = CheckResult().merge(parts[0]).merge(
+            CheckResult().merge(parts[1]).merge(parts[2]))
+        self.assertEqual(left.records, right.records)
+
+    def test_same_check(self):
+        first = CheckResult()
+        first.add_success(check='a')
+        second = CheckResult([CheckRecord('a', 'error', index=1)])
+        third = CheckResult([CheckRecord('a', 'warning', index=2)])
+        merged = CheckResult().merge(third).merge(first).merge(second)
+        self.assertEqual([record.index for record in merged.records],
+                         [0, 1, 2])
+        merged.add_success(check='a')
+        self.assertEqual(merged.records[-1].index, 3)
+
+    def test_failure(self):
+        result = CheckResult().merge(result_of('a', 'success'))
+        self.assertFalse(result.has_failed())
+        result.merge(result_of('b', 'failure'))
+        self.assertTrue(result.has_failed())
+
+    def test_source_unchanged(self):
+        other = result_of('a', 'success')
+        CheckResult().merge(other).add_success(check='a')
+        self.assertEqual(len(other.records), 1)
+
+
+class TestPickle(unittest.TestCase):
+
+    def test_round_trip(self):
+        result = CheckResult()
+        result.add_warning('w', hidden=True, check='a', duration=0.5)
+        result.add_failure('f', check='b')
+        copy = pickle.loads(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.records, result.records)
+        self.assertTrue(copy.has_failed())
+        copy.add_success(check='a')
+        self.assertEqual(copy.records[1].index, 1)
+
+    def test_record(self):
+        record = CheckRecord('a', 'error', True, 'message', 1.5, 3)
+        copy = pickle.loads(pickle.dumps(record))
+        self.assertEqual(copy, record)
+        self.assertEqual(hash(copy), hash(record))
+        self.assertEqual(copy.as_dict()['message'], 'message')
+
+
+if __name__ == '__main__':
+    unittest.main()
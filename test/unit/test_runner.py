@@ -0,0 +1,98 @@
+# -*- coding: utf-8
+"""Tests of the loading and the discovery of the check modules."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from checkproject.registry import CheckRegistry
+from checkproject.report import Reporter
+from checkproject.runner import CheckRunner, import_module
+
+CHECK_MODULE = '''
+from checkproject.case import CheckCase
+
+RUNS = []
+
+class Check%s(CheckCase):
+    def check_run(self):
+        RUNS.append(self.check_id)
+'''
+
+
+class MethodsReporter(Reporter):
+    """Reporter recording the check methods started."""
+
+    def __init__(self):
+        self.classes = []
+        self.methods = []
+
+    def class_start(self, check_id):
+        self.classes.append(check_id)
+
+    def method_start(self, check):
+        self.methods.append(check)
+
+
+class RunnerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.checks_dir = os.path.join(self.root, 'checks')
+        self.project_dir = os.path.join(self.root, 'project')
+        os.makedirs(self.project_dir)
+        # Modules with the same name in two directories
+        for directory in ('first', 'second'):
+            self.write(os.path.join(directory, 'check_01-same.py'),
+                       CHECK_MODULE % directory.capitalize())
+
+    def write(self, path, content):
+        path = os.path.join(self.checks_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as _file:
+            _file.write(content)
+
+    def test_import_module(self):
+        modules = set(sys.modules)
+        first = import_module(os.path.join(self.checks_dir, 'first',
+                                           'check_01-same.py'))
+        second = import_module(os.path.join(self.checks_dir, 'second',
+                                            'check_01-same.py'))
+        self.assertIsNot(first, second)
+        self.assertTrue(hasattr(first, 'CheckFirst'))
+        self.assertFalse(hasattr(first, 'CheckSecond'))
+        self.assertTrue(hasattr(second, 'CheckSecond'))
+        self.assertEqual(set(sys.modules), modules)
+
+    def test_classes(self):
+        runner = CheckRunner(self.project_dir, self.checks_dir,
+                             registry=CheckRegistry())
+        self.assertEqual([cls.__name__ for _, _, cls in runner.classes()],
+                         ['CheckFirst', 'CheckSecond'])
+
+    def test_run_each_class_once(self):
+        reporter = MethodsReporter()
+        runner = CheckRunner(self.project_dir, self.checks_dir,
+                             registry=CheckRegistry(), reporter=reporter)
+        runner.run()
+        self.assertEqual(len(reporter.methods), 2)
+        self.assertEqual(len(set(reporter.methods)), 2)
+
+    def test_check_ids(self):
+        # The same class name in modules of the same name
+        self.write(os.path.join('second', 'check_01-same.py'),
+                   CHECK_MODULE % 'First')
+        reporter = MethodsReporter()
+        runner = CheckRunner(self.project_dir, self.checks_dir,
+                             registry=CheckRegistry(), reporter=reporter)
+        runner.run()
+        self.assertEqual(reporter.classes,
+                         ['first/check_01-same.CheckFirst',
+                          'second/check_01-same.CheckFirst'])
+
+
+if __name__ == '__main__':
+    unittest.main()
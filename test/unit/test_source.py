@@ -0,0 +1,81 @@
+# -*- coding: utf-8
+"""Tests of the sources of the projects in an archive."""
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from checkproject.source import TarSource
+
+
+def make_tar(path, members, mode='w'):
+    """Create a tar archive from C{(name, content)} tuples (C{('->',
+    target)} as content for a symbolic link)."""
+    with tarfile.open(path, mode) as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            if isinstance(content, tuple):
+                info.type = tarfile.SYMTYPE
+                info.linkname = content[1]
+                tar.addfile(info)
+                continue
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+class TarSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'project.tar')
+
+    def source(self, members):
+        make_tar(self.path, members)
+        source = TarSource(self.path, strip=0)
+        self.addCleanup(source.close)
+        return source
+
+    def test_scan(self):
+        source = self.source([('src/main.c', b'int x;\n'),
+                              ('main', ('->', 'src/main.c'))])
+        self.assertEqual(sorted(source.iterscan()),
+                         [('main', 'l', 'src/main.c'), ('src', 'd'),
+                          ('src/main.c', 'f')])
+        self.assertEqual(source.read('main'), b'int x;\n')
+
+    def test_interleaved_reads(self):
+        content = bytes(range(256)) * 4096
+        for mode in ('w', 'w:gz'):
+            make_tar(self.path, [('a.bin', content), ('b.txt', b'text\n')],
+                     mode)
+            source = TarSource(self.path, strip=0)
+            self.addCleanup(source.close)
+            with source.open('a.bin') as first, \
+                    source.open('b.txt') as second:
+                start = first.read(1000)
+                self.assertEqual(second.read(2), b'te')
+                self.assertEqual(start + first.read(), content)
+                self.assertEqual(second.read(), b'xt\n')
+
+    def test_member_under_link(self):
+        for members in ([('lnk', ('->', 'src')), ('lnk/x.c', b'')],
+                        [('lnk/x.c', b''), ('lnk', ('->', 'src'))],
+                        [('file', b''), ('file/x.c', b'')]):
+            source = self.source(members)
+            self.assertRaises(IOError, list, source.iterscan())
+
+    def test_chained_links(self):
+        source = self.source([('q', ('->', '.')), ('w', ('->', 'q/..')),
+                              ('x', ('->', 'w/q/..')),
+                              ('ok', ('->', 'a.c')), ('a.c', b'')])
+        directory = source.directory()
+        self.assertEqual(sorted(os.listdir(directory)), ['a.c', 'ok', 'q'])
+        self.assertEqual(sorted(os.listdir(self.root)), ['project.tar'])
+
+
+if __name__ == '__main__':
+    unittest.main()